@@ -9,7 +9,13 @@ import copy
 from enum import IntEnum
 from enum import Enum
 import logger
+import config_watcher
+import payload_codec
+import signal_filters
+import platform
+import tempfile
 from os.path import abspath
+from types import MappingProxyType
 
 class ConfigManager:
 
@@ -19,6 +25,7 @@ class ConfigManager:
 
     # Private Class Members
     active_config = None
+    config_file_path = None
 
     '''
     Construction - create empty active config
@@ -49,6 +56,7 @@ class ConfigManager:
             self._app_logger.write(self._log_key, "Default config loaded.", logger.MessageLevel.INFO)
             default_file_path = os.path.join(os.getcwd(), self._CONFIG_FOLDER, "default.json")
             self.save_to_disk_filepath(default_file_path, True)
+            self.config_file_path = default_file_path
             self._app_logger.write(self._log_key, f"Default config saved as: {default_file_path}", logger.MessageLevel.INFO)
             
     '''
@@ -57,6 +65,7 @@ class ConfigManager:
     def load_from_disk_by_path(self, config_file_name : str) -> tuple:
         base_dir = os.getcwd() 
         full_config_file_path = os.path.join(base_dir, self._CONFIG_FOLDER, config_file_name)   
+        self.config_file_path = full_config_file_path
         json_string = ""
         self._app_logger.write(self._log_key, "Loading config...", logger.MessageLevel.INFO)
         try:
@@ -76,7 +85,50 @@ class ConfigManager:
             return (False, f"Error decoding JSON in '{full_config_file_path}' not found.")
 
         return (True, json_string)
+
+    '''
+    Re-read and validate the config file without changing the active config; returns
+    (True, (AppConfig, config dict)) or (False, error message). The dict becomes the
+    active config through activate() once the service has applied the snapshot.
+    '''
+    def reload_from_disk(self) -> tuple:
+        try:
+            with open(self.config_file_path, 'r') as file:
+                new_config = json.loads(file.read())
+            snapshot = AppConfig(new_config)
+        except (OSError, json.JSONDecodeError, ConfigError) as e:
+            return (False, f"Config {self.config_file_path} not reloaded: {e}")
+        self._app_logger.write(self._log_key, f"Config {self.config_file_path} changed.", logger.MessageLevel.INFO)
+        return (True, (snapshot, new_config))
+
+    '''
+    Make a reloaded config dict the active one (used by compile() and the save functions)
+    '''
+    def activate(self, config_dict : dict) -> None:
+        self.active_config = config_dict
+
+    '''
+    Watch the config file; each time it changes to a valid config, on_reload(AppConfig,
+    config dict) is called on the watcher thread. Invalid edits are logged and ignored.
+    '''
+    def watch(self, on_reload, poll_interval_seconds : float = 2.0) -> config_watcher.FileWatcher:
+        def reload():
+            (reload_ok, result) = self.reload_from_disk()
+            if reload_ok:
+                on_reload(*result)
+            else:
+                self._app_logger.write(self._log_key, result, logger.MessageLevel.ERROR)
+        watcher = config_watcher.FileWatcher(self.config_file_path, reload, self._app_logger, poll_interval_seconds)
+        watcher.start()
+        return watcher
     
+    '''
+    Validate the active config and compile it into a frozen AppConfig snapshot.
+    Raises ConfigError on unknown keys, missing required keys or wrong types.
+    '''
+    def compile(self) -> 'AppConfig':
+        return AppConfig(self.active_config)
+
     '''
     Provides a deep copy of the active config
     '''
@@ -84,14 +136,15 @@ class ConfigManager:
         return copy.deepcopy(self.active_config)
     
     '''
-    Save the config to disk with a specified filepath
+    Save the config to disk with a specified filepath. The config is written to a
+    temporary file in the same folder, synced, then renamed over the target, so a
+    crash leaves either the old or the new file - never a partial one. The file keeps
+    the mode of the one it replaces (a new file gets the default mode under the umask).
     '''
     def save_to_disk_filepath(self, filepath, overwrite : bool) -> bool:
         # Check if the file exists; append is not supported.
         if exists(filepath):
-            if (overwrite):
-                os.remove(filepath)
-            else:
+            if not overwrite:
                 raise Exception("File already exists and overwrite disabled: {0}".format(filepath))
         else:
             # Create folder if it doesn't exist
@@ -100,9 +153,41 @@ class ConfigManager:
                 os.makedirs(folder_path)
             
         # Write to disk
-        with open(filepath, 'w') as file:
-            file.write(self.to_json_string())
+        folder_path = os.path.dirname(os.path.abspath(filepath))
+        (temp_fd, temp_path) = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=folder_path)
+        try:
+            # mkstemp creates the file 0600; the rename would carry that over the target
+            os.fchmod(temp_fd, self._file_mode(filepath))
+            with os.fdopen(temp_fd, 'w') as file:
+                file.write(self.to_json_string())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, filepath)
+        except BaseException:
+            if exists(temp_path):
+                os.remove(temp_path)
+            raise
+        # Persist the rename itself
+        folder_fd = os.open(folder_path, os.O_RDONLY)
+        try:
+            os.fsync(folder_fd)
+        finally:
+            os.close(folder_fd)
+        return True
     
+    '''
+    Permission bits for a saved config: the existing file's, else 0666 less the umask
+    '''
+    @staticmethod
+    def _file_mode(filepath) -> int:
+        try:
+            return os.stat(filepath).st_mode & 0o7777
+        except FileNotFoundError:
+            # The umask can only be read by setting it
+            umask = os.umask(0)
+            os.umask(umask)
+            return 0o666 & ~umask
+
     '''
     Save the config to disk based on the config's name (useful for 'Save' function)
     '''
@@ -111,15 +196,8 @@ class ConfigManager:
             raise Exception("Config does not have a name; cannot save to disk.")
         # Build file path based on name
         full_file_path = self._config_name_to_filepath(self.active_config['Name'])
-        # Check if the file exists; append is not supported.
-        if exists(full_file_path):
-            if (overwrite):
-                os.remove(full_file_path)
-            else:
-                raise Exception("File already exists and overwrite disabled: {0}".format(self._filename))
-            
-        # Write to disk
-        self.save_to_disk_filepath(full_file_path, overwrite)
+        # Write to disk (replaces an existing file atomically if overwrite is enabled)
+        return self.save_to_disk_filepath(full_file_path, overwrite)
 
     '''
     Create a full file path based on the config name
@@ -141,16 +219,51 @@ class ConfigManager:
         self.active_config['mqtt']['report_period_seconds'] = 60
         self.active_config['mqtt']['server_url'] = "debian-openhab"
         self.active_config['mqtt']['server_port'] = 1883
+        self.active_config['mqtt']['reconnect_min_seconds'] = 1
+        self.active_config['mqtt']['reconnect_max_seconds'] = 60
         self.active_config['mqtt']['base_topic'] = "hydro_tank_monitor"
         self.active_config['mqtt']['use_host_name_in_mqtt_topic'] = False
         self.active_config['mqtt']['not_host_hame'] = "hydrofarm_tank1"
         self.active_config['mqtt']['sensor_topic'] = "last_sensor_data"
         self.active_config['mqtt']['status_topic'] = "status"
+        self.active_config['mqtt']['offline_buffer_file'] = "data/mqtt_offline_buffer.bin"
+        self.active_config['mqtt']['offline_buffer_bytes'] = 1048576
+        self.active_config['mqtt']['replay_messages_per_second'] = 2
+        # Sensor payload codec: "json", "cbor" or "struct"
+        self.active_config['mqtt']['payload_codecs']['sensor_topic'] = "json"
+        self.active_config['mqtt']['publish_policy']['heartbeat_seconds'] = 300
+        self.active_config['mqtt']['publish_policy']['min_interval_seconds'] = 5
+        self.active_config['mqtt']['publish_policy']['deadbands']['water_depth'] = {"absolute": 0.1}
+        self.active_config['mqtt']['publish_policy']['deadbands']['water_depth_offset'] = {"absolute": 0}
+        self.active_config['mqtt']['publish_policy']['deadbands']['env_temperature_f'] = {"absolute": 0.5}
+        self.active_config['mqtt']['publish_policy']['deadbands']['env_humidity'] = {"absolute": 1.0}
+        self.active_config['mqtt']['publish_policy']['deadbands']['water_temperature_f'] = {"absolute": 0.3}
+        self.active_config['logging']['console'] = True
+        self.active_config['logging']['file'] = "logs/hydro_tank_monitor.log"
+        self.active_config['logging']['max_bytes'] = 1048576
+        self.active_config['logging']['rotate_interval_seconds'] = 86400
+        self.active_config['logging']['backup_count'] = 5
+        self.active_config['logging']['compress'] = True
+        self.active_config['logging']['duplicate_window_seconds'] = 300
+        self.active_config['logging']['max_messages_per_key'] = 120
+        self.active_config['logging']['rate_window_seconds'] = 60
         self.active_config['i2c']['bus'] = 1
         self.active_config["sensors"]["water_depth"]["i2c_addr"] = 0x29
+        self.active_config["sensors"]["water_depth"]["sample_period_seconds"] = 0.2
+        self.active_config["sensors"]["water_depth"]["continuous_ranging"] = True
+        self.active_config["sensors"]["water_depth"]["distance_mode"] = "short"
+        self.active_config["sensors"]["water_depth"]["timing_budget_ms"] = 50
+        self.active_config["sensors"]["water_depth"]["inter_measurement_ms"] = 50
         self.active_config["sensors"]["env_temp_humidity"]["i2c_addr"] = 0x45
+        self.active_config["sensors"]["env_temp_humidity"]["sample_period_seconds"] = 5
         self.active_config["sensors"]["water_temperature"]["i2c_addr"] = 0x68
+        self.active_config["sensors"]["water_temperature"]["sample_period_seconds"] = 10
         self.active_config["zero_button_pin"] = 17
+        # Signal conditioning per published field (applied in order)
+        self.active_config["filters"]["water_depth"] = [{"type": "hampel", "window": 7, "n_sigmas": 3.0},
+                                                        {"type": "kalman", "process_variance": 0.001, "measurement_variance": 0.01}]
+        self.active_config["filters"]["water_temperature_f"] = [{"type": "median", "window": 5},
+                                                                {"type": "ema", "alpha": 0.3}]
 
     '''
     Build a default configuration - useful for first time run in a new environment
@@ -164,11 +277,28 @@ class ConfigManager:
         self.active_config['mqtt']['report_period_seconds'] = 60
         self.active_config['mqtt']['server_url'] = "debian-openhab"
         self.active_config['mqtt']['server_port'] = 1883
+        self.active_config['mqtt']['reconnect_min_seconds'] = 1
+        self.active_config['mqtt']['reconnect_max_seconds'] = 60
         self.active_config['mqtt']['base_topic'] = "hydro_system_monitor"
         self.active_config['mqtt']['use_host_name_in_mqtt_topic'] = False
         self.active_config['mqtt']['not_host_hame'] = "hydro_system_monitor"
         self.active_config['mqtt']['sensor_topic'] = "last_sensor_data"
         self.active_config['mqtt']['status_topic'] = "status"
+        # Sensor payload codec: "json", "cbor" or "struct"
+        self.active_config['mqtt']['payload_codecs']['sensor_topic'] = "json"
+        self.active_config['mqtt']['publish_policy']['heartbeat_seconds'] = 300
+        self.active_config['mqtt']['publish_policy']['min_interval_seconds'] = 5
+        self.active_config['mqtt']['publish_policy']['deadbands']['env_temperature_f'] = {"absolute": 0.5}
+        self.active_config['mqtt']['publish_policy']['deadbands']['env_humidity'] = {"absolute": 1.0}
+        self.active_config['logging']['console'] = True
+        self.active_config['logging']['file'] = "logs/hydro_system_monitor.log"
+        self.active_config['logging']['max_bytes'] = 1048576
+        self.active_config['logging']['rotate_interval_seconds'] = 86400
+        self.active_config['logging']['backup_count'] = 5
+        self.active_config['logging']['compress'] = True
+        self.active_config['logging']['duplicate_window_seconds'] = 300
+        self.active_config['logging']['max_messages_per_key'] = 120
+        self.active_config['logging']['rate_window_seconds'] = 60
         self.active_config['i2c']['bus'] = 1
         self.active_config["sensors"]["env_temp_humidity"]["i2c_addr"] = 0x45
 
@@ -198,4 +328,321 @@ class ConfigManager:
         json_string = json.dumps(config_dict)
         return json_string
 
-def tree(): return defaultdict(tree)
\ No newline at end of file
+def tree(): return defaultdict(tree)
+
+
+class ConfigError(ValueError):
+    pass
+
+
+_REQUIRED = object()
+_NUMBER = (int, float)
+
+
+'''
+Read-only copy of a config value: objects become mapping proxies, lists tuples
+'''
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class _FrozenConfigSection:
+    '''
+    Base of the compiled config sections: typed attributes in __slots__,
+    validated once from a config dict and read-only afterwards.
+    _FIELDS is a tuple of (key, accepted types, default or _REQUIRED).
+    '''
+    __slots__ = ("_path",)
+    _FIELDS = ()
+    _SECTIONS = ()
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    # Equal sections mean the subsystem they configure does not need re-initializing
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__ if not name.startswith("_"))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if not name.startswith("_"))
+        return f"{type(self).__name__}({fields})"
+
+    def _set(self, name : str, value) -> None:
+        object.__setattr__(self, name, value)
+
+    def _compile_fields(self, section, path : str) -> None:
+        if not isinstance(section, dict):
+            raise ConfigError(f"Config section '{path}' must be an object, not {type(section).__name__}")
+        self._set("_path", path)
+        known_keys = {key for (key, _, _) in self._FIELDS} | set(self._SECTIONS)
+        for key in section:
+            if key not in known_keys:
+                raise ConfigError(f"Unknown config key '{path}.{key}'")
+        for (key, types, default) in self._FIELDS:
+            if key in section:
+                value = section[key]
+                # bool is an int subclass; only accept it where bool is expected
+                if value is not None and (not isinstance(value, types) or (isinstance(value, bool) and bool not in types)):
+                    raise ConfigError(f"Config key '{path}.{key}' must be {'/'.join(t.__name__ for t in types)}, not {type(value).__name__}")
+            elif default is _REQUIRED:
+                raise ConfigError(f"Missing required config key '{path}.{key}'")
+            else:
+                value = default
+            self._set(self._attribute_name(key), _freeze(value))
+
+    def _attribute_name(self, key : str) -> str:
+        return key
+
+    def _require_positive(self, name : str) -> None:
+        value = getattr(self, name)
+        if value is not None and value <= 0:
+            raise ConfigError(f"Config key '{self._path}.{name}' must be positive: {value}")
+
+    def _require_non_negative(self, name : str) -> None:
+        value = getattr(self, name)
+        if value is not None and value < 0:
+            raise ConfigError(f"Config key '{self._path}.{name}' must not be negative: {value}")
+
+    '''
+    Sub-section dict of the section being compiled ({} if absent)
+    '''
+    def _subsection(self, section : dict, key : str) -> dict:
+        subsection = section.get(key, dict())
+        if not isinstance(subsection, dict):
+            path = key if isinstance(self, AppConfig) else f"{self._path}.{key}"
+            raise ConfigError(f"Config section '{path}' must be an object, not {type(subsection).__name__}")
+        return subsection
+
+
+class MqttConfig(_FrozenConfigSection):
+    '''
+    Broker, topics and publish settings; full topics are precomputed
+    '''
+    __slots__ = ("report_period_seconds", "server_url", "server_port",
+                 "reconnect_min_seconds", "reconnect_max_seconds",
+                 "base_topic", "use_host_name_in_mqtt_topic", "host_topic_name",
+                 "sensor_topic", "status_topic",
+                 "offline_buffer_file", "offline_buffer_bytes", "replay_messages_per_second",
+                 "publish_policy", "payload_codecs",
+                 "sensor_topic_full", "status_topic_full", "sensor_payload_codec")
+    _FIELDS = (("report_period_seconds", _NUMBER, _REQUIRED),
+               ("server_url", (str,), _REQUIRED),
+               ("server_port", (int,), _REQUIRED),
+               ("reconnect_min_seconds", _NUMBER, 1.0),
+               ("reconnect_max_seconds", _NUMBER, 60.0),
+               ("base_topic", (str,), _REQUIRED),
+               ("use_host_name_in_mqtt_topic", (bool,), False),
+               ("not_host_hame", (str,), _REQUIRED),
+               ("sensor_topic", (str,), _REQUIRED),
+               ("status_topic", (str,), "status"),
+               ("offline_buffer_file", (str,), "data/mqtt_offline_buffer.bin"),
+               ("offline_buffer_bytes", (int,), 1048576),
+               ("replay_messages_per_second", _NUMBER, 2),
+               ("payload_codecs", (dict,), dict()))
+    _SECTIONS = ("publish_policy",)
+    # Topics whose payload codec is selectable (keys of payload_codecs)
+    _CODEC_TOPICS = ("sensor_topic",)
+
+    def __init__(self, section : dict, path : str = "mqtt") -> None:
+        self._compile_fields(section, path)
+        for name in ("report_period_seconds", "reconnect_min_seconds", "offline_buffer_bytes", "replay_messages_per_second"):
+            self._require_positive(name)
+        self._set("publish_policy", PublishPolicyConfig(self._subsection(section, "publish_policy"), f"{path}.publish_policy"))
+        host_part = platform.node() if self.use_host_name_in_mqtt_topic else self.host_topic_name
+        self._set("sensor_topic_full", mqtt_topic_join([self.base_topic, host_part, self.sensor_topic]))
+        self._set("status_topic_full", mqtt_topic_join([self.base_topic, host_part, self.status_topic]))
+        for (topic_key, codec_name) in self.payload_codecs.items():
+            if topic_key not in self._CODEC_TOPICS:
+                raise ConfigError(f"Config key '{path}.payload_codecs.{topic_key}' is not a topic with a selectable codec {list(self._CODEC_TOPICS)}")
+            if codec_name not in payload_codec.CODEC_NAMES:
+                raise ConfigError(f"Config key '{path}.payload_codecs.{topic_key}' must be one of {list(payload_codec.CODEC_NAMES)}: {codec_name!r}")
+        self._set("sensor_payload_codec", self.payload_codecs.get("sensor_topic", "json"))
+
+    def _attribute_name(self, key : str) -> str:
+        # The stored key keeps its historical spelling
+        return "host_topic_name" if key == "not_host_hame" else key
+
+
+class DeadbandConfig(_FrozenConfigSection):
+    '''
+    Publish deadband of one field (see publish_policy.FieldDeadband)
+    '''
+    __slots__ = ("absolute", "percent")
+    _FIELDS = (("absolute", _NUMBER, None),
+               ("percent", _NUMBER, None))
+
+    def __init__(self, section : dict, path : str) -> None:
+        self._compile_fields(section, path)
+        for name in ("absolute", "percent"):
+            self._require_non_negative(name)
+
+
+class PublishPolicyConfig(_FrozenConfigSection):
+    '''
+    Report-by-exception settings of the sensor topic (see publish_policy.PublishPolicy);
+    heartbeat_seconds of None falls back to the report period
+    '''
+    __slots__ = ("heartbeat_seconds", "min_interval_seconds", "deadbands")
+    _FIELDS = (("heartbeat_seconds", _NUMBER, None),
+               ("min_interval_seconds", _NUMBER, 0.0))
+    _SECTIONS = ("deadbands",)
+
+    def __init__(self, section : dict, path : str = "mqtt.publish_policy") -> None:
+        self._compile_fields(section, path)
+        self._require_positive("heartbeat_seconds")
+        self._require_non_negative("min_interval_seconds")
+        deadbands = {field: DeadbandConfig(band, f"{path}.deadbands.{field}")
+                     for field, band in self._subsection(section, "deadbands").items()}
+        self._set("deadbands", MappingProxyType(deadbands))
+
+
+class LoggingConfig(_FrozenConfigSection):
+    '''
+    Log sinks and flood suppression (see logger.Logger.create_sinks())
+    '''
+    __slots__ = ("console", "file", "max_bytes", "rotate_interval_seconds", "backup_count", "compress",
+                 "duplicate_window_seconds", "max_messages_per_key", "rate_window_seconds")
+    _FIELDS = (("console", (bool,), True),
+               ("file", (str,), None),
+               ("max_bytes", (int,), 1048576),
+               ("rotate_interval_seconds", _NUMBER, None),
+               ("backup_count", (int,), 5),
+               ("compress", (bool,), True),
+               ("duplicate_window_seconds", _NUMBER, 0),
+               ("max_messages_per_key", (int,), None),
+               ("rate_window_seconds", _NUMBER, 60.0))
+
+    def __init__(self, section : dict, path : str = "logging") -> None:
+        self._compile_fields(section, path)
+        for name in ("max_bytes", "rotate_interval_seconds", "max_messages_per_key", "rate_window_seconds"):
+            self._require_positive(name)
+        for name in ("backup_count", "duplicate_window_seconds"):
+            self._require_non_negative(name)
+
+
+class FilterConfig(_FrozenConfigSection):
+    '''
+    One filter of a field's chain (see signal_filters.build_filter_chain());
+    only the parameters of its type may be set, unset ones keep the filter's default
+    '''
+    __slots__ = ("type", "window", "n_sigmas", "alpha", "process_variance", "measurement_variance")
+    _FIELDS = (("type", (str,), _REQUIRED),
+               ("window", (int,), None),
+               ("n_sigmas", _NUMBER, None),
+               ("alpha", _NUMBER, None),
+               ("process_variance", _NUMBER, None),
+               ("measurement_variance", _NUMBER, None))
+
+    def __init__(self, section : dict, path : str) -> None:
+        self._compile_fields(section, path)
+        if self.type not in signal_filters.FILTER_PARAMETERS:
+            raise ConfigError(f"Config key '{path}.type' must be one of {list(signal_filters.FILTER_PARAMETERS)}: {self.type!r}")
+        parameter_names = signal_filters.FILTER_PARAMETERS[self.type]
+        for key in section:
+            if key != "type" and key not in parameter_names:
+                raise ConfigError(f"Config key '{path}.{key}' is not a parameter of a {self.type} filter {list(parameter_names)}")
+        for name in parameter_names:
+            self._require_positive(name)
+
+
+class SensorConfig(_FrozenConfigSection):
+    '''
+    One sensor; sample_period_seconds falls back to the app-wide period
+    '''
+    __slots__ = ("name", "i2c_addr", "sample_period_seconds",
+                 "continuous_ranging", "distance_mode", "timing_budget_ms", "inter_measurement_ms",
+                 "periodic_mps",
+                 "resolution", "oversample_count", "latency_budget_ms", "steinhart_hart")
+    _FIELDS = (("i2c_addr", (int,), _REQUIRED),
+               ("sample_period_seconds", _NUMBER, None),
+               ("continuous_ranging", (bool,), False),
+               ("distance_mode", (str,), None),
+               ("timing_budget_ms", (int,), None),
+               ("inter_measurement_ms", (int,), None),
+               ("periodic_mps", _NUMBER, None),
+               ("resolution", (int,), None),
+               ("oversample_count", (int,), None),
+               ("latency_budget_ms", _NUMBER, None),
+               ("steinhart_hart", (list,), None))
+
+    def __init__(self, name : str, section : dict, default_sample_period_seconds : float) -> None:
+        self._compile_fields(section, f"sensors.{name}")
+        self._set("name", name)
+        if self.sample_period_seconds is None:
+            self._set("sample_period_seconds", default_sample_period_seconds)
+        self._require_positive("sample_period_seconds")
+        if not 0 <= self.i2c_addr <= 0x7F:
+            raise ConfigError(f"Config key '{self._path}.i2c_addr' is not a 7-bit I2C address: {self.i2c_addr}")
+        for name in ("oversample_count", "latency_budget_ms"):
+            self._require_positive(name)
+        if self.steinhart_hart is not None:
+            if len(self.steinhart_hart) != 3 or not all(isinstance(value, _NUMBER) and not isinstance(value, bool) for value in self.steinhart_hart):
+                raise ConfigError(f"Config key '{self._path}.steinhart_hart' must be the three coefficients [A, B, C]: {self.steinhart_hart}")
+            self._set("steinhart_hart", tuple(self.steinhart_hart))
+
+
+class I2CConfig(_FrozenConfigSection):
+    __slots__ = ("bus",)
+    _FIELDS = (("bus", (int,), 1),)
+
+    def __init__(self, section : dict, path : str = "i2c") -> None:
+        self._compile_fields(section, path)
+
+
+class AppConfig(_FrozenConfigSection):
+    '''
+    Compiled, read-only snapshot of a monitor config (see ConfigManager.compile())
+    '''
+    __slots__ = ("name", "sensor_sample_period_seconds", "zero_button_pin",
+                 "filters", "logging", "mqtt", "i2c", "sensors")
+    _FIELDS = (("Name", (str,), "default"),
+               ("sensor_sample_period_seconds", _NUMBER, _REQUIRED),
+               ("zero_button_pin", (int,), None))
+    _SECTIONS = ("filters", "logging", "mqtt", "i2c", "sensors")
+
+    def __init__(self, config_dict : dict) -> None:
+        self._compile_fields(config_dict, "config")
+        self._require_positive("sensor_sample_period_seconds")
+        if "mqtt" not in config_dict:
+            raise ConfigError("Missing required config section 'mqtt'")
+        self._set("mqtt", MqttConfig(config_dict["mqtt"]))
+        self._set("i2c", I2CConfig(self._subsection(config_dict, "i2c")))
+        self._set("logging", LoggingConfig(self._subsection(config_dict, "logging")))
+        sensors = {name: SensorConfig(name, sensor_section, self.sensor_sample_period_seconds)
+                   for name, sensor_section in self._subsection(config_dict, "sensors").items()}
+        self._set("sensors", MappingProxyType(sensors))
+        # field -> chain of filters, applied in order
+        filters = dict()
+        for field, chain_config in self._subsection(config_dict, "filters").items():
+            if not isinstance(chain_config, list):
+                raise ConfigError(f"Config key 'filters.{field}' must be a list of filters, not {type(chain_config).__name__}")
+            filters[field] = tuple(FilterConfig(filter_config, f"filters.{field}[{index}]")
+                                   for index, filter_config in enumerate(chain_config))
+        self._set("filters", MappingProxyType(filters))
+
+    def _attribute_name(self, key : str) -> str:
+        return "name" if key == "Name" else key
+
+    '''
+    Config of a sensor the monitor cannot run without
+    '''
+    def require_sensor(self, name : str) -> SensorConfig:
+        if name not in self.sensors:
+            raise ConfigError(f"Missing required config section 'sensors.{name}'")
+        return self.sensors[name]
+
+
+'''
+Join MQTT topic parts into a single string with single slashes
+'''
+def mqtt_topic_join(topic_parts : list) -> str:
+    topic_parts = [part.strip("/") for part in topic_parts]
+    return "/".join(topic_parts)
\ No newline at end of file
@@ -0,0 +1,111 @@
+'''
+All-or-nothing application of a reloaded config to a running monitor.
+
+Each changed subsystem is staged as (build, commit, discard). apply() first builds
+every staged subsystem without touching the running ones; only if all builds
+succeed are the new config and objects committed. If any build fails, whatever was
+already built is discarded, the monitor keeps its current config and objects, and
+one error is logged.
+'''
+import logger
+import payload_codec
+import publish_policy
+
+
+class _Stage:
+    def __init__(self, name : str, build_fn, commit_fn, discard_fn=None) -> None:
+        self.name = name
+        self.build_fn = build_fn
+        self.commit_fn = commit_fn
+        self.discard_fn = discard_fn
+
+
+class ConfigReload:
+    '''
+    One reload from old_config to new_config. Stages run in the order they were added.
+    '''
+    def __init__(self, old_config, new_config, app_logger : logger.Logger, log_key : str = "main") -> None:
+        self.old_config = old_config
+        self.new_config = new_config
+        self._app_logger = app_logger
+        self._log_key = log_key
+        self._stages = list()
+        # Applied on commit whether or not any subsystem changed (e.g. task periods)
+        self._always_fns = list()
+
+    '''
+    Stage a subsystem: build_fn() -> new object (no side effects on the running one),
+    commit_fn(new object) installs it, discard_fn(new object) releases it after a failed reload
+    '''
+    def stage(self, name : str, build_fn, commit_fn, discard_fn=None) -> None:
+        self._stages.append(_Stage(name, build_fn, commit_fn, discard_fn))
+
+    '''
+    Run fn() on commit (cheap, infallible updates such as scheduler task periods)
+    '''
+    def on_commit(self, fn) -> None:
+        self._always_fns.append(fn)
+
+    '''
+    Stage the subsystems every monitor has when their settings changed: logging sinks,
+    the MQTT supervisor, the publish policy and the sensor payload codec.
+    The monitor provides _app_logger, _mqtt_connection, _publish_policy, _sensor_payload_codec
+    and _create_mqtt_connection(mqtt_config) (returns a supervisor that is not started yet).
+    '''
+    def stage_service_changes(self, monitor, sensor_schema : payload_codec.StructSchema) -> None:
+        (old_config, new_config) = (self.old_config, self.new_config)
+        (old_mqtt, new_mqtt) = (old_config.mqtt, new_config.mqtt)
+        if new_config.logging != old_config.logging:
+            self.stage("logging",
+                       lambda: logger.Logger.create_sinks(new_config.logging),
+                       lambda built: monitor._app_logger.set_sinks(*built),
+                       lambda built: logger.close_sinks(built[0]))
+        if (new_mqtt.server_url, new_mqtt.server_port, new_mqtt.reconnect_min_seconds, new_mqtt.reconnect_max_seconds) != \
+           (old_mqtt.server_url, old_mqtt.server_port, old_mqtt.reconnect_min_seconds, old_mqtt.reconnect_max_seconds):
+            self.stage("mqtt",
+                       lambda: monitor._create_mqtt_connection(new_mqtt),
+                       lambda connection: self._replace_mqtt_connection(monitor, connection))
+        if new_mqtt.publish_policy != old_mqtt.publish_policy or new_mqtt.report_period_seconds != old_mqtt.report_period_seconds:
+            self.stage("publish_policy",
+                       lambda: publish_policy.PublishPolicy.from_config(new_mqtt.publish_policy, new_mqtt.report_period_seconds),
+                       lambda policy: setattr(monitor, "_publish_policy", policy))
+        if new_mqtt.sensor_payload_codec != old_mqtt.sensor_payload_codec:
+            self.stage("payload_codec",
+                       lambda: payload_codec.create_codec(new_mqtt.sensor_payload_codec, sensor_schema),
+                       lambda codec: setattr(monitor, "_sensor_payload_codec", codec))
+
+    '''
+    Build every staged subsystem, then commit them all (and the new config via
+    commit_config_fn) or none; returns True if the new config was applied
+    '''
+    def apply(self, commit_config_fn) -> bool:
+        built = list()
+        for stage in self._stages:
+            try:
+                built.append((stage, stage.build_fn()))
+            except Exception as e:
+                self._discard(built)
+                self._app_logger.write(self._log_key, f"Config change not applied ({stage.name} failed: {e}); keeping the running config", logger.MessageLevel.ERROR)
+                return False
+        commit_config_fn(self.new_config)
+        for (stage, new_object) in built:
+            stage.commit_fn(new_object)
+        for fn in self._always_fns:
+            fn()
+        self._app_logger.write(self._log_key, f"Config change applied; re-initialized: {', '.join(stage.name for stage in self._stages) or 'nothing'}", logger.MessageLevel.INFO)
+        return True
+
+    @staticmethod
+    def _discard(built : list) -> None:
+        for (stage, new_object) in reversed(built):
+            if stage.discard_fn is not None:
+                try:
+                    stage.discard_fn(new_object)
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _replace_mqtt_connection(monitor, connection) -> None:
+        monitor._mqtt_connection.stop()
+        monitor._mqtt_connection = connection
+        connection.start()
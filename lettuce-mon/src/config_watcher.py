@@ -0,0 +1,179 @@
+'''
+Config file watcher: calls back when a file is rewritten or replaced.
+
+Uses Linux inotify (through ctypes, no extra dependency) on the file's folder,
+so atomic write-and-rename saves are seen as well as in-place edits. Where
+inotify is not available it falls back to polling the file's mtime / size / inode.
+'''
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+import logger
+
+# inotify event masks (linux/inotify.h)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_IGNORED = 0x00008000
+_IN_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    '''
+    Minimal inotify binding; raises OSError if inotify is not available
+    '''
+    def __init__(self, folder_path : str) -> None:
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify not supported")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder_path), _IN_WATCH_MASK | _IN_DELETE_SELF) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder_path}")
+
+    '''
+    Names of the entries that changed, plus a flag set when the watched folder went away
+    '''
+    def read_events(self) -> tuple:
+        names = set()
+        folder_gone = False
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return (names, folder_gone)
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            (_, mask, _, name_length) = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if mask & (_IN_DELETE_SELF | _IN_IGNORED):
+                folder_gone = True
+            elif name:
+                names.add(os.fsdecode(name))
+        return (names, folder_gone)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FileWatcher:
+    '''
+    Watches one file on a daemon thread and calls on_change() (no arguments)
+    after it was written or replaced. Bursts of events are coalesced: the
+    callback runs once the file has been quiet for settle_seconds.
+    '''
+    def __init__(self,
+                 file_path : str,
+                 on_change,
+                 app_logger : logger.Logger = None,
+                 poll_interval_seconds : float = 2.0,
+                 settle_seconds : float = 0.2,
+                 use_inotify : bool = True) -> None:
+        self._file_path = os.path.abspath(file_path)
+        self._on_change = on_change
+        self._app_logger = app_logger
+        self._log_key = "config"
+        self._poll_interval_seconds = poll_interval_seconds
+        self._settle_seconds = settle_seconds
+        self._use_inotify = use_inotify
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._signature = self._file_signature()
+        self.change_count = 0
+        self.using_inotify = False
+
+    '''
+    Start the watcher thread; returns immediately
+    '''
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watcher_thread, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout : float = 5.0) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    ''' ------ Private Functions ------'''
+    def _watcher_thread(self) -> None:
+        inotify = None
+        if self._use_inotify:
+            try:
+                inotify = _Inotify(os.path.dirname(self._file_path))
+            except (OSError, AttributeError) as e:
+                self._log(f"inotify unavailable ({e}); polling {self._file_path} every {self._poll_interval_seconds}s", logger.MessageLevel.INFO)
+        self.using_inotify = inotify is not None
+        try:
+            if inotify is not None:
+                self._watch_inotify(inotify)
+            if not self._stop_event.is_set():
+                self._watch_polling()
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    '''
+    Returns when stopped or when the watched folder disappears (then polling takes over)
+    '''
+    def _watch_inotify(self, inotify : _Inotify) -> None:
+        file_name = os.path.basename(self._file_path)
+        while not self._stop_event.is_set():
+            (readable, _, _) = select.select([inotify.fd], [], [], 1.0)
+            if not readable:
+                continue
+            (names, folder_gone) = inotify.read_events()
+            if folder_gone:
+                self._log("Config folder removed; falling back to polling.", logger.MessageLevel.WARN)
+                return
+            if file_name not in names:
+                continue
+            # Coalesce the burst of events of one save
+            while select.select([inotify.fd], [], [], self._settle_seconds)[0]:
+                inotify.read_events()
+            self._changed(self._file_signature())
+
+    def _watch_polling(self) -> None:
+        while not self._stop_event.wait(self._poll_interval_seconds):
+            signature = self._file_signature()
+            if signature is not None and signature != self._signature:
+                # Wait for the writer to finish before reading
+                self._stop_event.wait(self._settle_seconds)
+                self._changed(self._file_signature())
+
+    def _changed(self, signature) -> None:
+        if signature is None:
+            return
+        self._signature = signature
+        self.change_count += 1
+        try:
+            self._on_change()
+        except Exception as e:
+            self._log(f"Config change handler failed: {e}", logger.MessageLevel.ERROR)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self._file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _log(self, msg : str, level) -> None:
+        if self._app_logger is not None:
+            self._app_logger.write(self._log_key, msg, level)
@@ -1,7 +1,8 @@
-import smbus2
 import time                         # Time access and conversion package
 import math                         # Basic math package
-import qwiic_vl53l1x
+import collections
+import device_backend
+import i2c_bus
 
 class TCT40Sensor:
     '''
@@ -16,17 +17,40 @@ class TCT40Sensor:
     _WRITE_READ_DELAY_SECS = 0.10
 
     def __init__(self, bus_number=1, address=0x2F):
-        self.bus = smbus2.SMBus(bus_number)
+        self.bus = i2c_bus.get_smbus(bus_number)
         self.address = address
+        self._ready_at = None
 
     def read_distance_inches(self):
         try:
-            # Write to initiate measurement
-            self.bus.write_byte(self.address, 0x01)
-            time.sleep(self._WRITE_READ_DELAY_SECS)  # Wait for measurement to complete
+            self.start_conversion()
+        except Exception as e:
+            print(f"Error reading distance: {e}")
+            return None
+        return self.fetch_result()
+
+    '''
+    Trigger a measurement without waiting for it
+    '''
+    def start_conversion(self) -> None:
+        # Write to initiate measurement
+        self.bus.write_byte(self.address, 0x01)
+        self._ready_at = time.monotonic() + self._WRITE_READ_DELAY_SECS
 
-            # Read 2 bytes of data
-            data = self.bus.read_i2c_block_data(self.address, 0x01, 2)
+    '''
+    Wait for the triggered measurement and return the distance in inches (None on error)
+    '''
+    def fetch_result(self):
+        try:
+            if self._ready_at is None:
+                self.start_conversion()
+            remaining = self._ready_at - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)  # Wait for measurement to complete
+            self._ready_at = None
+
+            # Read 2 bytes of data (register select and read in one I2C_RDWR transaction)
+            data = self.bus.write_then_read(self.address, [0x01], 2)
             distance = ((data[0] & 0x7F) << 8) + data[1]
             distance_cm = distance / 10
             distance_in = distance_cm / 2.54
@@ -61,19 +85,126 @@ class VL53L4CD:
     Dimensions: 1.75" x 0.85"
     '''
     _WRITE_READ_DELAY_SECS = 0.10
+    _DATA_READY_POLL_SECS = 0.005
+    _RANGING_TIMEOUT_SECS = 0.5
+    # qwiic_vl53l1x distance mode codes
+    DISTANCE_MODES = {"short": 1, "long": 2}
+
+    '''
+    Single shot mode (default) starts and stops ranging for every measurement.
+    Continuous mode keeps the sensor ranging every inter-measurement period;
+    poll() collects each new range into a history ring and fetch_result()
+    returns the newest one, waiting only when none arrived since the last fetch.
+    '''
+    def __init__(self, i2c_address = 0x29,
+                 continuous : bool = False,
+                 distance_mode : str = None,
+                 timing_budget_ms : int = None,
+                 inter_measurement_ms : int = None,
+                 history_size : int = 64,
+                 i2c_bus_number : int = 1):
+        # Data-ready / read / clear sequences must not interleave with other threads on the bus
+        self._bus_lock = i2c_bus.get_bus_manager().transaction(i2c_bus_number)
+        self.sensor = device_backend.get_backend().create_vl53l1x(i2c_address, i2c_bus.get_i2c(i2c_bus_number))
+        with self._bus_lock:
+            self.sensor.init_sensor(i2c_address)
+        self._ranging = False
+        self._continuous = False
+        self._history = collections.deque(maxlen=history_size)
+        self._new_since_fetch = False
+        self.invalid_range_count = 0
+        if distance_mode is not None:
+            self.set_distance_mode(distance_mode)
+        if timing_budget_ms is not None:
+            self.set_timing_budget_ms(timing_budget_ms)
+        if inter_measurement_ms is not None:
+            self.set_inter_measurement_ms(inter_measurement_ms)
+        if continuous:
+            self.start_continuous()
 
-    def __init__(self, i2c_address = 0x29):
-        self.sensor = qwiic_vl53l1x.QwiicVL53L1X(i2c_address)
-        self.sensor.init_sensor(i2c_address)
+    '''
+    "short" (up to ~1.3 m, better ambient immunity) or "long" (up to ~4 m)
+    '''
+    def set_distance_mode(self, distance_mode : str) -> None:
+        if distance_mode not in self.DISTANCE_MODES:
+            raise ValueError(f"Unknown distance mode '{distance_mode}' (use one of {list(self.DISTANCE_MODES)})")
+        self.sensor.set_distance_mode(self.DISTANCE_MODES[distance_mode])
 
-    def read_distance_inches(self):
-        try:
+    '''
+    Time the sensor integrates each range; longer is less noisy but slower
+    '''
+    def set_timing_budget_ms(self, timing_budget_ms : int) -> None:
+        self.sensor.set_timing_budget_in_ms(timing_budget_ms)
+
+    '''
+    Period between continuous ranges; must be at least the timing budget
+    '''
+    def set_inter_measurement_ms(self, inter_measurement_ms : int) -> None:
+        self.sensor.set_inter_measurement_in_ms(inter_measurement_ms)
 
-            self.sensor.start_ranging()						 # Write configuration bytes to initiate measurement
-            time.sleep(.005)
-            distance = self.sensor.get_distance()	 # Get the result of the measurement from the sensor
-            time.sleep(.005)
-            self.sensor.stop_ranging()
+    def start_continuous(self) -> None:
+        self.sensor.start_ranging()
+        self._ranging = True
+        self._continuous = True
+        self._new_since_fetch = False
+
+    def stop_continuous(self) -> None:
+        self.sensor.stop_ranging()
+        self._ranging = False
+        self._continuous = False
+
+    '''
+    Collect a new range if the sensor has one; returns True if a valid range was added
+    '''
+    def poll(self) -> bool:
+        with self._bus_lock:
+            if not self.sensor.check_for_data_ready():
+                return False
+            distance = self.sensor.get_distance()
+            range_status = self.sensor.get_range_status()
+            self.sensor.clear_interrupt()
+        if range_status != 0:
+            self.invalid_range_count += 1
+            return False
+        self._history.append((time.monotonic(), distance / 10 / 2.54))
+        self._new_since_fetch = True
+        return True
+
+    '''
+    Returns up to n of the most recent (monotonic timestamp, inches) ranges, oldest first
+    '''
+    def read_last_ranges(self, n : int) -> list:
+        if self._continuous:
+            self.poll()
+        if n <= 0:
+            return list()
+        return list(self._history)[-n:]
+
+    '''
+    Start a ranging measurement without waiting for it (no-op while ranging continuously)
+    '''
+    def start_conversion(self) -> None:
+        if self._continuous:
+            return
+        self.sensor.start_ranging()						 # Write configuration bytes to initiate measurement
+        self._ranging = True
+
+    '''
+    Wait for the measurement started by start_conversion() and return it in inches (None on error).
+    In continuous mode returns the newest range, waiting only if none arrived since the last fetch.
+    '''
+    def fetch_result(self):
+        try:
+            if self._continuous:
+                return self._fetch_continuous()
+            if not self._ranging:
+                self.start_conversion()
+            self._wait_for_data_ready()
+            with self._bus_lock:
+                distance = self.sensor.get_distance()	 # Get the result of the measurement from the sensor
+                self.sensor.clear_interrupt()
+                self.sensor.stop_ranging()
+            self._ranging = False
 
             distance_cm = distance / 10
             distance_in = distance_cm / 2.54
@@ -81,6 +212,30 @@ class VL53L4CD:
         except Exception as e:
             print(f"Error reading distance: {e}")
             return None
+
+    def read_distance_inches(self):
+        try:
+            self.start_conversion()
+        except Exception as e:
+            print(f"Error reading distance: {e}")
+            return None
+        return self.fetch_result()
+
+    def _fetch_continuous(self):
+        deadline = time.monotonic() + self._RANGING_TIMEOUT_SECS
+        while not self.poll() and not self._new_since_fetch:
+            if time.monotonic() > deadline:
+                raise TimeoutError("VL53L4CD continuous ranging timed out")
+            time.sleep(self._DATA_READY_POLL_SECS)
+        self._new_since_fetch = False
+        return self._history[-1][1]
+
+    def _wait_for_data_ready(self) -> None:
+        deadline = time.monotonic() + self._RANGING_TIMEOUT_SECS
+        while not self.sensor.check_for_data_ready():
+            if time.monotonic() > deadline:
+                raise TimeoutError("VL53L4CD ranging timed out")
+            time.sleep(self._DATA_READY_POLL_SECS)
     
     def print_distance(self, include_bar=True):
         distance_in = self.read_distance_inches()
@@ -0,0 +1,268 @@
+'''
+Pluggable device backend: the drivers obtain their buses, device library
+objects and GPIO from here instead of binding straight to busio / board /
+smbus2 / RPi.GPIO.
+
+Select the backend with the LETTUCE_DEVICE_BACKEND environment variable
+("hardware" - default, or "sim") or programmatically with set_backend().
+Hardware PWM is used only when enabled with LETTUCE_HARDWARE_PWM=1 (see pwm_output).
+'''
+import os
+import threading
+
+BACKEND_ENV_VAR = "LETTUCE_DEVICE_BACKEND"
+HARDWARE_PWM_ENV_VAR = "LETTUCE_HARDWARE_PWM"
+
+
+class DeviceBackend:
+    '''
+    Factory interface used by the drivers.
+    '''
+    name = "base"
+
+    '''
+    Raw bus handles - drivers should use i2c_bus.get_i2c() / get_smbus(), which
+    keep one shared, locked handle per bus
+    '''
+    def create_i2c(self, bus_number : int = 1):
+        raise NotImplementedError
+
+    def create_i2c_device(self, i2c, i2c_addr : int):
+        raise NotImplementedError
+
+    def create_smbus(self, bus_number : int):
+        raise NotImplementedError
+
+    '''
+    Returns the smbus2.i2c_msg compatible message factory used with i2c_rdwr()
+    '''
+    def get_i2c_msg(self):
+        raise NotImplementedError
+
+    def create_hts221(self, i2c, i2c_addr : int):
+        raise NotImplementedError
+
+    def create_vl53l1x(self, i2c_addr : int, i2c=None):
+        raise NotImplementedError
+
+    def create_ht16k33_segment14(self, i2c, i2c_addr : int):
+        raise NotImplementedError
+
+    def create_ssd1305(self, width : int, height : int, i2c, i2c_addr : int, reset_pin):
+        raise NotImplementedError
+
+    '''
+    Returns an RPi.GPIO compatible module / object
+    '''
+    def get_gpio(self):
+        raise NotImplementedError
+
+    def create_button(self, gpio_pin : int):
+        raise NotImplementedError
+
+    '''
+    Falling-edge event source for BOARD numbered pins (see gpio_edge_events):
+    read_events(timeout_seconds) -> [(pin, timestamp_ns), ...] and close()
+    '''
+    def open_edge_events(self, pins : list):
+        raise NotImplementedError
+
+    '''
+    PWM output on a BOARD numbered pin (see pwm_output): set_duty_cycle(percent),
+    duty_cycle and close(). The caller has set the GPIO BOARD mode.
+    '''
+    def create_pwm(self, pin : int, frequency : float, duty_cycle : float = 0.0):
+        raise NotImplementedError
+
+
+class HardwareBackend(DeviceBackend):
+    '''
+    Raspberry Pi hardware. Libraries are imported on first use so that importing
+    the drivers does not require them.
+    hardware_pwm: use the PWM peripheral on pins routed to it (None: from LETTUCE_HARDWARE_PWM);
+    otherwise PWM outputs are software PWM.
+    '''
+    name = "hardware"
+
+    def __init__(self, hardware_pwm : bool = None) -> None:
+        if hardware_pwm is None:
+            hardware_pwm = os.environ.get(HARDWARE_PWM_ENV_VAR, "").strip().lower() in ("1", "true", "yes", "on")
+        self.hardware_pwm = hardware_pwm
+
+    def create_i2c(self, bus_number : int = 1):
+        if bus_number != 1:
+            raise ValueError(f"busio only exposes I2C bus 1 (SCL / SDA), not bus {bus_number}")
+        from board import SCL, SDA
+        from busio import I2C
+        return I2C(SCL, SDA)
+
+    def create_i2c_device(self, i2c, i2c_addr : int):
+        from adafruit_bus_device import i2c_device
+        return i2c_device.I2CDevice(i2c, i2c_addr)
+
+    def create_smbus(self, bus_number : int):
+        import smbus2
+        return smbus2.SMBus(bus_number)
+
+    def get_i2c_msg(self):
+        from smbus2 import i2c_msg
+        return i2c_msg
+
+    def create_hts221(self, i2c, i2c_addr : int):
+        import adafruit_hts221
+        return adafruit_hts221.HTS221(i2c)
+
+    '''
+    The qwiic driver opens its own handle through qwiic_i2c; callers serialize
+    multi-step sequences with i2c_bus.get_bus_manager().transaction()
+    '''
+    def create_vl53l1x(self, i2c_addr : int, i2c=None):
+        import qwiic_vl53l1x
+        return qwiic_vl53l1x.QwiicVL53L1X(i2c_addr)
+
+    def create_ht16k33_segment14(self, i2c, i2c_addr : int):
+        from ht16k33 import HT16K33Segment14
+        return HT16K33Segment14(i2c, i2c_address=i2c_addr, board=HT16K33Segment14.SPARKFUN_ALPHA)
+
+    def create_ssd1305(self, width : int, height : int, i2c, i2c_addr : int, reset_pin):
+        import adafruit_ssd1305
+        return adafruit_ssd1305.SSD1305_I2C(width, height, i2c, addr=i2c_addr, reset=reset_pin)
+
+    def get_gpio(self):
+        import RPi.GPIO as GPIO
+        return GPIO
+
+    def create_button(self, gpio_pin : int):
+        from gpiozero import Button
+        return Button(gpio_pin)
+
+    '''
+    Kernel-timestamped events from the gpiochip character device; falls back to
+    RPi.GPIO edge callbacks where the v2 GPIO uAPI is not available
+    '''
+    def open_edge_events(self, pins : list):
+        import gpio_edge_events
+        try:
+            return gpio_edge_events.GpioChipEdgeEvents(pins)
+        except OSError:
+            return gpio_edge_events.CallbackEdgeEvents(self.get_gpio(), pins)
+
+    '''
+    Hardware PWM (sysfs pwmchip) when enabled and the pin is routed to the PWM
+    peripheral; RPi.GPIO software PWM otherwise
+    '''
+    def create_pwm(self, pin : int, frequency : float, duty_cycle : float = 0.0):
+        import pwm_output
+        if self.hardware_pwm and pin in pwm_output.BOARD_PIN_TO_PWM_CHANNEL:
+            # The sysfs export succeeds whichever pin the overlay routed the channel to
+            if pwm_output.pin_routed_to_pwm(pin) is False:
+                print(f"Board pin {pin} is not routed to the PWM peripheral (needs '{pwm_output.BOARD_PIN_PWM_OVERLAYS[pin]}' in /boot/config.txt); using software PWM")
+            else:
+                (chip, channel) = pwm_output.BOARD_PIN_TO_PWM_CHANNEL[pin]
+                try:
+                    return pwm_output.SysfsPwm(chip, channel, frequency, duty_cycle)
+                except OSError as e:
+                    print(f"Hardware PWM unavailable on board pin {pin} ({e}); using software PWM")
+        return pwm_output.GpioSoftwarePwm(self.get_gpio(), pin, frequency, duty_cycle)
+
+
+class SimulatedBackend(DeviceBackend):
+    '''
+    Register-level simulated devices on a simulated I2C bus (see sim_devices).
+    The default device set matches the addresses used by the monitors; device
+    models can be reached through self.i2c.get_device(addr) to change their
+    measured values, profiles or to inject faults at runtime.
+    '''
+    name = "sim"
+
+    def __init__(self, device_profiles : dict = None, bus_frequency : int = 100000) -> None:
+        import sim_devices
+        self._sim = sim_devices
+        profiles = device_profiles if device_profiles is not None else dict()
+        self.i2c = sim_devices.SimI2CBus(1, bus_frequency)
+        for device in (sim_devices.SimSHT31(0x44, 22.0, 60.0),
+                       sim_devices.SimSHT31(0x45, 21.0, 50.0),
+                       sim_devices.SimHTS221(0x5F),
+                       sim_devices.SimMCP3421(0x68),
+                       sim_devices.SimVL53L1X(0x29),
+                       sim_devices.SimTCT40(0x2F),
+                       sim_devices.SimHT16K33(0x70),
+                       sim_devices.SimSSD1305(0x3C)):
+            if device.i2c_addr in profiles:
+                device.profile = profiles[device.i2c_addr]
+            self.i2c.attach(device)
+        # Fan controller default wiring: PWM on board pin 32, tach on 15 / 13 / 11
+        self.gpio = sim_devices.SimGPIO()
+        for tach_pin in (15, 13, 11):
+            self.gpio.attach_fan(sim_devices.SimFan(32, tach_pin))
+        self.buttons = dict()
+
+    def create_i2c(self, bus_number : int = 1):
+        if bus_number != self.i2c.bus_number:
+            raise ValueError(f"Simulated I2C bus {bus_number} does not exist")
+        return self.i2c
+
+    def create_i2c_device(self, i2c, i2c_addr : int):
+        return self._sim.SimI2CDevice(i2c, i2c_addr)
+
+    def create_smbus(self, bus_number : int):
+        if bus_number != self.i2c.bus_number:
+            raise ValueError(f"Simulated I2C bus {bus_number} does not exist")
+        return self._sim.SimSMBus(self.i2c)
+
+    def get_i2c_msg(self):
+        return self._sim.SimI2CMsg
+
+    def create_hts221(self, i2c, i2c_addr : int):
+        return self._sim.SimHTS221Driver(i2c)
+
+    def create_vl53l1x(self, i2c_addr : int, i2c=None):
+        return self._sim.SimVL53L1XDriver(i2c if i2c is not None else self.i2c, i2c_addr)
+
+    def create_ht16k33_segment14(self, i2c, i2c_addr : int):
+        return self._sim.SimHT16K33Segment14(i2c, i2c_addr)
+
+    def create_ssd1305(self, width : int, height : int, i2c, i2c_addr : int, reset_pin):
+        return self._sim.SimSSD1305Driver(width, height, i2c, i2c_addr)
+
+    def get_gpio(self):
+        return self.gpio
+
+    def create_button(self, gpio_pin : int):
+        button = self._sim.SimButton(gpio_pin)
+        self.buttons[gpio_pin] = button
+        return button
+
+    def open_edge_events(self, pins : list):
+        return self.gpio.open_edge_events(pins)
+
+    def create_pwm(self, pin : int, frequency : float, duty_cycle : float = 0.0):
+        return self._sim.SimHardwarePwm(self.gpio, pin, frequency, duty_cycle)
+
+
+_active_backend = None
+_backend_lock = threading.Lock()
+
+'''
+Returns the process-wide backend, creating it from the environment on first use
+'''
+def get_backend() -> DeviceBackend:
+    global _active_backend
+    with _backend_lock:
+        if _active_backend is None:
+            backend_name = os.environ.get(BACKEND_ENV_VAR, "hardware").strip().lower()
+            if backend_name in ("sim", "simulated"):
+                _active_backend = SimulatedBackend()
+            elif backend_name in ("hardware", "hw", "pi", ""):
+                _active_backend = HardwareBackend()
+            else:
+                raise ValueError(f"Unknown device backend '{backend_name}' in {BACKEND_ENV_VAR}")
+        return _active_backend
+
+'''
+Replace the process-wide backend (call before constructing any driver)
+'''
+def set_backend(backend : DeviceBackend) -> None:
+    global _active_backend
+    with _backend_lock:
+        _active_backend = backend
@@ -1,33 +1,82 @@
 import time
 
-from busio import I2C
-from adafruit_bus_device import i2c_device
-from board import SCL, SDA
-
-from ht16k33 import HT16K33Segment14
+import device_backend
+from i2c_bus import get_i2c
 
 class FourDigitDisplay:
+    '''
+    HT16K33 four-digit 14-segment display with a cached frame.
+    A frame is rendered into the driver buffer (no I/O) and compared with the
+    last frame sent: an unchanged frame costs no I2C traffic, and drivers
+    that can write display RAM directly (write_ram) get only the changed
+    digit registers. Brightness and blink rate are single commands, sent only
+    when they change and without a redraw.
+    '''
+    _DIGITS = 4
+    _BYTES_PER_DIGIT = 2
 
     '''
     Initialize I2C bus and display
     '''
     def __init__(self, i2c_bus : int = 1, i2c_address : int = 0x70):
-        self.display = HT16K33Segment14(I2C(SCL, SDA),
-                                        board=HT16K33Segment14.SPARKFUN_ALPHA)
-        self.display.set_brightness(2)
+        self.display = device_backend.get_backend().create_ht16k33_segment14(get_i2c(i2c_bus), i2c_address)
+        # Partial RAM writes need the buffer to be the RAM image (two bytes per digit)
+        self._write_ram = getattr(self.display, "write_ram", None)
+        self._brightness = None
+        self._blink_rate = None
+        self.set_brightness(2)
         self.display.clear()
+        self.display.draw()
+        self._sent_frame = bytes(self.display.buffer)
+        self.draw_count = 0
+        self.skipped_count = 0
 
     def write_digit(self, position, digit):
         if position < 0 or position > 3:
             return
         self.display.set_character(digit, position)
-        
+
     def display_number(self, number):
         str_number = f"{number:04d}"  # Ensure the number is 4 digits with leading zeros
         self.display.clear()
         for position, c in enumerate(str_number):
             self.write_digit(position, c)
-        self.display.draw()
+        self.commit()
+
+    '''
+    Send the rendered frame: nothing if unchanged, else only the changed digits when supported
+    '''
+    def commit(self) -> None:
+        frame = bytes(self.display.buffer)
+        if frame == self._sent_frame:
+            self.skipped_count += 1
+            return
+        if self._write_ram is None:
+            self.display.draw()
+        else:
+            # One RAM write per run of adjacent changed digits (the address auto-increments)
+            run_start = None
+            for digit in range(self._DIGITS + 1):
+                start = digit * self._BYTES_PER_DIGIT
+                end = start + self._BYTES_PER_DIGIT
+                changed = digit < self._DIGITS and frame[start:end] != self._sent_frame[start:end]
+                if changed and run_start is None:
+                    run_start = start
+                elif not changed and run_start is not None:
+                    self._write_ram(run_start, frame[run_start:start])
+                    run_start = None
+        self._sent_frame = frame
+        self.draw_count += 1
+
+    def set_brightness(self, brightness : int) -> None:
+        if brightness != self._brightness:
+            self.display.set_brightness(brightness)
+            self._brightness = brightness
+
+    def set_blink_rate(self, rate : int) -> None:
+        if rate != self._blink_rate:
+            self.display.set_blink_rate(rate)
+            self._blink_rate = rate
 
 if __name__ == "__main__":
     display = FourDigitDisplay()
@@ -0,0 +1,167 @@
+'''
+Fan tach capture: edge timestamps in fixed-size rings, RPM from the median
+edge period, and stall detection.
+
+Counting edges over a reporting interval is coarse at low speed (a few edges
+per interval) and costs a Python callback per edge at high speed. Here edges
+arrive in timestamped batches from an edge event source (see
+gpio_edge_events / DeviceBackend.open_edge_events) and the RPM is computed
+from the time between edges, so one revolution is enough for a reading.
+'''
+import array
+import statistics
+import threading
+import time
+
+import device_backend
+
+
+class TachChannel:
+    '''
+    Edge timestamps (ns) of one fan in a ring of ring_size entries.
+    The fan counts as stalled when no edge arrived within stall_timeout_seconds
+    (measured from the last edge or the last rearm(), whichever is later).
+    Not thread-safe; TachCapture serializes access.
+    '''
+    def __init__(self,
+                 pin : int,
+                 pulses_per_rev : int = 1,
+                 ring_size : int = 64,
+                 median_window : int = 5,
+                 stall_timeout_seconds : float = 2.0) -> None:
+        if ring_size < median_window + 1:
+            raise ValueError(f"Ring size {ring_size} cannot hold {median_window} edge periods")
+        self.pin = pin
+        self.pulses_per_rev = pulses_per_rev
+        self.median_window = median_window
+        self.stall_timeout_ns = int(stall_timeout_seconds * 1e9)
+        self._edges = array.array('q', bytes(8 * ring_size))
+        self._size = ring_size
+        self._index = 0
+        self._count = 0
+        self._armed_ns = None
+        self.edge_count = 0
+
+    def add_edge(self, timestamp_ns : int) -> None:
+        # A gap longer than the stall timeout is a stop / restart, not a period
+        if self._count > 0 and timestamp_ns - self.last_edge_ns() > self.stall_timeout_ns:
+            self._count = 0
+        self._edges[self._index] = timestamp_ns
+        self._index = (self._index + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+        self.edge_count += 1
+
+    def last_edge_ns(self) -> int:
+        if self._count == 0:
+            return None
+        return self._edges[self._index - 1]
+
+    '''
+    The newest n edge timestamps, oldest first
+    '''
+    def latest_edges(self, n : int) -> list:
+        n = min(n, self._count)
+        start = self._index - n
+        if start >= 0:
+            return self._edges[start:self._index].tolist()
+        return self._edges[start:].tolist() + self._edges[:self._index].tolist()
+
+    '''
+    Restart the stall timeout, e.g. after changing the fan set point
+    '''
+    def rearm(self, now_ns : int) -> None:
+        self._armed_ns = now_ns
+
+    def is_stalled(self, now_ns : int) -> bool:
+        reference_ns = self.last_edge_ns()
+        if self._armed_ns is not None and (reference_ns is None or self._armed_ns > reference_ns):
+            reference_ns = self._armed_ns
+        if reference_ns is None:
+            return True
+        return now_ns - reference_ns > self.stall_timeout_ns
+
+    '''
+    RPM from the median of the last median_window edge periods; 0 when stalled
+    '''
+    def rpm(self, now_ns : int) -> float:
+        if self._count < 2 or now_ns - self.last_edge_ns() > self.stall_timeout_ns:
+            return 0.0
+        edges = self.latest_edges(self.median_window + 1)
+        period_ns = statistics.median([later - earlier for earlier, later in zip(edges, edges[1:])])
+        # Slowing down: the next edge is overdue by more than a period (margin covers read latency)
+        if now_ns - edges[-1] > 2 * period_ns:
+            period_ns = now_ns - edges[-1]
+        if period_ns <= 0:
+            return 0.0
+        return 60e9 / (period_ns * self.pulses_per_rev)
+
+
+class TachCapture:
+    '''
+    Reads batches of edge events on a background thread into one TachChannel per pin.
+    The lock is taken once per batch, not once per edge.
+    '''
+    def __init__(self,
+                 pins : list,
+                 edge_source=None,
+                 pulses_per_rev : int = 1,
+                 ring_size : int = 64,
+                 median_window : int = 5,
+                 stall_timeout_seconds : float = 2.0,
+                 clock_ns=time.monotonic_ns) -> None:
+        self._pins = list(pins)
+        self._edge_source = edge_source if edge_source is not None else device_backend.get_backend().open_edge_events(self._pins)
+        self._clock_ns = clock_ns
+        self._channels = {pin: TachChannel(pin, pulses_per_rev, ring_size, median_window, stall_timeout_seconds) for pin in self._pins}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.rearm()
+        self._thread = threading.Thread(target=self._capture_thread, name="fan-tach", daemon=True)
+        self._thread.start()
+
+    '''
+    RPM of every pin, in the order the pins were given
+    '''
+    def get_rpms(self) -> tuple:
+        now_ns = self._clock_ns()
+        with self._lock:
+            return tuple(self._channels[pin].rpm(now_ns) for pin in self._pins)
+
+    '''
+    Stall flag of every pin, in the order the pins were given
+    '''
+    def get_stalled(self) -> tuple:
+        now_ns = self._clock_ns()
+        with self._lock:
+            return tuple(self._channels[pin].is_stalled(now_ns) for pin in self._pins)
+
+    def get_edge_counts(self) -> tuple:
+        with self._lock:
+            return tuple(self._channels[pin].edge_count for pin in self._pins)
+
+    '''
+    Restart every stall timeout (fans get that long to spin up after a set point change)
+    '''
+    def rearm(self) -> None:
+        now_ns = self._clock_ns()
+        with self._lock:
+            for channel in self._channels.values():
+                channel.rearm(now_ns)
+
+    def stop(self, timeout : float = 2.0) -> None:
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._edge_source.close()
+
+    ''' ------ Private Functions ------'''
+    def _capture_thread(self) -> None:
+        while not self._stop_event.is_set():
+            events = self._edge_source.read_events(0.2)
+            if len(events) == 0:
+                continue
+            with self._lock:
+                for (pin, timestamp_ns) in events:
+                    channel = self._channels.get(pin)
+                    if channel is not None:
+                        channel.add_edge(timestamp_ns)
@@ -0,0 +1,130 @@
+'''
+Batched, timestamped GPIO edge events.
+
+GpioChipEdgeEvents requests the lines from the Linux GPIO character device
+(v2 uAPI) with falling-edge detection. The kernel timestamps every edge in its
+interrupt handler (CLOCK_MONOTONIC, same clock as time.monotonic_ns()) and
+queues it, so one read() returns a whole batch of events and no Python code
+runs per edge. CallbackEdgeEvents is the fallback for RPi.GPIO compatible
+modules: each edge is stamped in the library callback and queued.
+
+Both provide read_events(timeout_seconds) -> [(pin, timestamp_ns), ...] and close().
+'''
+import collections
+import fcntl
+import os
+import select
+import struct
+import threading
+import time
+
+# Raspberry Pi 40-pin header: BOARD pin -> BCM GPIO (gpiochip line offset)
+BOARD_TO_BCM = {3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27,
+                15: 22, 16: 23, 18: 24, 19: 10, 21: 9, 22: 25, 23: 11, 24: 8,
+                26: 7, 27: 0, 28: 1, 29: 5, 31: 6, 32: 12, 33: 13, 35: 19,
+                36: 16, 37: 26, 38: 20, 40: 21}
+
+# linux/gpio.h (v2 uAPI)
+_GPIO_V2_LINES_MAX = 64
+_GPIO_V2_LINE_FLAG_INPUT = 1 << 2
+_GPIO_V2_LINE_FLAG_EDGE_FALLING = 1 << 5
+_GPIO_V2_LINE_EVENT_FALLING_EDGE = 2
+_GPIO_V2_GET_LINE_IOCTL = 0xC250B407
+# struct gpio_v2_line_request: offsets[64], consumer[32], config, num_lines, event_buffer_size, padding[5], fd
+_LINE_REQUEST_SIZE = 592
+_LINE_REQUEST_CONSUMER_OFFSET = 256
+_LINE_REQUEST_CONFIG_OFFSET = 288
+_LINE_REQUEST_NUM_LINES_OFFSET = 560
+_LINE_REQUEST_FD_OFFSET = 588
+_LINE_EVENT = struct.Struct("<QIIII24x")
+
+
+class GpioChipEdgeEvents:
+    '''
+    Falling edges of several lines of one gpiochip, kernel timestamped and read in batches.
+    Raises OSError if the chip or the lines cannot be requested.
+    '''
+    def __init__(self,
+                 pins : list,
+                 chip_path : str = "/dev/gpiochip0",
+                 board_numbering : bool = True,
+                 event_buffer_size : int = 256,
+                 consumer : str = "lettuce-mon") -> None:
+        if len(pins) == 0 or len(pins) > _GPIO_V2_LINES_MAX:
+            raise ValueError(f"Between 1 and {_GPIO_V2_LINES_MAX} pins can be requested, not {len(pins)}")
+        offsets = [BOARD_TO_BCM[pin] if board_numbering else pin for pin in pins]
+        self._offset_to_pin = dict(zip(offsets, pins))
+        self._last_line_seqno = dict()
+        self.lost_count = 0
+        request = bytearray(_LINE_REQUEST_SIZE)
+        struct.pack_into(f"<{len(offsets)}I", request, 0, *offsets)
+        struct.pack_into("<32s", request, _LINE_REQUEST_CONSUMER_OFFSET, consumer.encode()[:31])
+        # gpio_v2_line_config.flags, then no per-line attributes
+        struct.pack_into("<Q", request, _LINE_REQUEST_CONFIG_OFFSET, _GPIO_V2_LINE_FLAG_INPUT | _GPIO_V2_LINE_FLAG_EDGE_FALLING)
+        struct.pack_into("<II", request, _LINE_REQUEST_NUM_LINES_OFFSET, len(offsets), event_buffer_size)
+        chip_fd = os.open(chip_path, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            fcntl.ioctl(chip_fd, _GPIO_V2_GET_LINE_IOCTL, request, True)
+        finally:
+            os.close(chip_fd)
+        (self._fd,) = struct.unpack_from("<i", request, _LINE_REQUEST_FD_OFFSET)
+        self._read_size = _LINE_EVENT.size * event_buffer_size
+
+    '''
+    Wait up to timeout_seconds for edges; returns every queued edge as (pin, timestamp_ns)
+    '''
+    def read_events(self, timeout_seconds : float) -> list:
+        (readable, _, _) = select.select([self._fd], [], [], timeout_seconds)
+        if not readable:
+            return []
+        data = os.read(self._fd, self._read_size)
+        events = list()
+        for (timestamp_ns, event_id, offset, _, line_seqno) in _LINE_EVENT.iter_unpack(data[:len(data) - len(data) % _LINE_EVENT.size]):
+            # Gaps in the per-line sequence number are edges the kernel buffer dropped
+            last_line_seqno = self._last_line_seqno.get(offset)
+            if last_line_seqno is not None and line_seqno > last_line_seqno + 1:
+                self.lost_count += line_seqno - last_line_seqno - 1
+            self._last_line_seqno[offset] = line_seqno
+            if event_id == _GPIO_V2_LINE_EVENT_FALLING_EDGE:
+                events.append((self._offset_to_pin[offset], timestamp_ns))
+        return events
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class CallbackEdgeEvents:
+    '''
+    Falling edges through an RPi.GPIO compatible module (mode already set by the caller).
+    Edges are stamped in the callback; at most max_events are held between reads.
+    '''
+    def __init__(self, gpio, pins : list, max_events : int = 4096) -> None:
+        self._gpio = gpio
+        self._pins = list(pins)
+        # deque.append / popleft are atomic, no lock is needed between the callback and the reader
+        self._events = collections.deque(maxlen=max_events)
+        self._ready = threading.Event()
+        for pin in self._pins:
+            gpio.setup(pin, gpio.IN)
+            gpio.add_event_detect(pin, gpio.FALLING, callback=self._edge)
+
+    def read_events(self, timeout_seconds : float) -> list:
+        if len(self._events) == 0:
+            self._ready.wait(timeout_seconds)
+        self._ready.clear()
+        events = list()
+        while True:
+            try:
+                events.append(self._events.popleft())
+            except IndexError:
+                return events
+
+    def close(self) -> None:
+        for pin in self._pins:
+            self._gpio.remove_event_detect(pin)
+
+    def _edge(self, pin) -> None:
+        self._events.append((pin, time.monotonic_ns()))
+        self._ready.set()
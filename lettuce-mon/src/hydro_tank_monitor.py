@@ -1,27 +1,25 @@
 
 import threading
-import random
 import time
 import datetime
-import platform
-import json
-
-import paho.mqtt.client as mqtt
-from board import SCL, SDA
-from busio import I2C
-import lgpio
-from gpiozero import Button
+import os
 
 import logger
 import config
+import device_backend
+import i2c_bus
 import sensors
 import depth_sensor
 import display
-
-'''
-TODO:
-1. Ensure operation without Network / OpenHav connection
-'''
+import sample_scheduler
+import measurement_cache
+import mqtt_connection
+import publish_policy
+import stream_stats
+import signal_filters
+import offline_buffer
+import payload_codec
+import config_reload
 
 '''
 I2C Devices
@@ -33,6 +31,12 @@ I2C Devices
 
 class HydroTankMonitor:
 
+    # Sensors the monitor cannot run without; a reloaded config must keep them
+    _REQUIRED_SENSORS = ("water_depth", "env_temp_humidity", "water_temperature")
+    # Scheduler lateness / jitter summary is logged (and restarted) this often
+    _TIMING_REPORT_PERIOD_SECONDS = 600
+    ultra_sonic_sensor = None
+
     '''
     Initialize app logger and config; prepare to start monitoring.
     Note: Keeping the top-level class as generic as possible for reusability.
@@ -60,26 +64,44 @@ class HydroTankMonitor:
         self._app_config = config.ConfigManager(config_file_name, 
                                                 self._app_logger, 
                                                 force_overwrite_existing_config)
+        # Validated, read-only snapshot of the config; unknown or mistyped keys fail here at startup
+        self._config = self._app_config.compile()
+        # Log sinks (rotating file, flood suppression) from config
+        self._app_logger.configure(self._config.logging)
 
-        # Create and connect to MQTT Broker - fail if unable to connect
-        self._mqtt_client_connect()
-        self._last_report_timestamp = None
+        # Create MQTT connection supervisor - connects in the background
+        self._mqtt_connection = self._create_mqtt_connection(self._config.mqtt)
+        self._mqtt_connection.start()
+        # Messages that could not be published are kept on disk and replayed on reconnect
+        self._in_flight_messages = list()
+        self._replay_in_flight = None
+        self._init_offline_buffer()
+        # Report by exception: publish on significant change or heartbeat, not on every report tick
+        self._publish_policy = publish_policy.PublishPolicy.from_config(self._config.mqtt.publish_policy,
+                                                                        self._config.mqtt.report_period_seconds)
+        # Sensor payload encoding selected in the config (json / cbor / struct)
+        self._sensor_payload_codec = payload_codec.create_codec(self._config.mqtt.sensor_payload_codec,
+                                                                payload_codec.HYDRO_TANK_SENSOR_SCHEMA)
         
         # Create I2C Bus and initialize sensors
-        # Water Depth Sensor (TCT40)
-        i2c_addr_water_depth_sensor = self._app_config.active_config["sensors"]["water_depth"]["i2c_addr"]
-        self.ultra_sonic_sensor = depth_sensor.VL53L4CD(i2c_addr_water_depth_sensor)
-        # Environment Temperature and Humidity Sensor (SHT31)
-        i2c_addr_env_sensor = self._app_config.active_config["sensors"]["env_temp_humidity"]["i2c_addr"]
-        self._sensor_environment_temp_humidity = sensors.sht31(I2C(SCL, SDA), i2c_addr_env_sensor, False)
-        # Water Temperature (MCS3421 Thermistor)
-        i2c_addr_water_temperature = self._app_config.active_config["sensors"]["water_temperature"]["i2c_addr"]
-        self._sensor_water_temperature = sensors.mcp3421Thermistor(I2C(SCL, SDA), i2c_addr_water_temperature, False)
+        # Measurement cache - every consumer within a sample period shares one physical read
+        self._measurement_cache = measurement_cache.MeasurementCache()
+        self._scheduler = None
+        for sensor_key in self._REQUIRED_SENSORS:
+            self._install_sensor(sensor_key, self._create_sensor(sensor_key, self._config), self._config)
+
+        # Per-field signal conditioning applied before display and publish
+        self._sensor_filters = signal_filters.FieldFilterBank(self._config.filters)
+        self._filtered_water_distance = None
 
         # Intialize Digital Input for zero button
         self._init_zero_button()
         self._zero_offset = 0
         self._display = display.FourDigitDisplay()
+
+        # Hot reload: valid config edits are picked up by the watcher and applied on the sampling thread
+        self._pending_config = None
+        self._config_watcher = self._app_config.watch(self._config_reloaded)
     
         # Initialization complete.
         self._app_logger.write(self._log_key, "Initialized.", logger.MessageLevel.INFO) 
@@ -103,141 +125,459 @@ class HydroTankMonitor:
     
     ''' ------ Private Functions ------'''
     '''
-    Main program thread: read sensors and publish data
+    Main program thread: sample each sensor at its own rate and publish data
     '''
     def _sensor_read_publish_thread(self):
-        sensor_sample_period_seconds = self._app_config.active_config["sensor_sample_period_seconds"]
-        sensor_sample_period_seconds = 1
-        while True:
-            # Read Sensors
-            sensor_data = dict()
-
-            sensor_data["timestamp_iso"] = datetime.datetime.now().isoformat()
-            
-            sensor_data["env_temperature_f"] = self._sensor_environment_temp_humidity.read_temp_humidity().temperature
-            sensor_data["env_humidity"] = self._sensor_environment_temp_humidity.read_temp_humidity().humidity
-            sensor_data["water_temperature_f"] = self._sensor_water_temperature.read_temp_humidity().temperature
-
-            # Water Depth
-            water_depth_inverted = -1 * self.ultra_sonic_sensor.read_distance_inches()
-            sensor_data["water_depth"] = water_depth_inverted + self._zero_offset
-            sensor_data["water_depth_offset"] = self._zero_offset
-            
-            # Update Display - adjust to display 10ths of inches
-            self._display.display_number(int(sensor_data["water_depth"]*10))
-
-            self._print_data_to_console(sensor_data)
-
-            # Publish Sensor Data to OpenHab
-            if self._last_report_timestamp is None or (datetime.datetime.now() - self._last_report_timestamp).seconds >= self._app_config.active_config["mqtt"]["report_period_seconds"]:
-                self._last_report_timestamp = datetime.datetime.now()
-                
-                # Publish to MQTT
-                topic_parts = [self._app_config.active_config['mqtt']['base_topic']]
-                if self._app_config.active_config['mqtt']['use_host_name_in_mqtt_topic'] is True:
-                    topic_parts.append(platform.node())
-                else:
-                    topic_parts.append(self._app_config.active_config['mqtt']['not_host_hame']) 
-                topic_parts.append(self._app_config.active_config['mqtt']['sensor_topic'])
-                sensor_mqtt_topic = self._mqtt_topic_join(topic_parts)
-                
-                data_json_str = json.dumps(sensor_data)
-                self._mqtt_publish(sensor_mqtt_topic, data_json_str)
-
-            # Sleep
-            time.sleep(sensor_sample_period_seconds)
-
-    '''
-    Prints all sensor data to the console to support debugging
-    '''
-    def _print_data_to_console(self, sensor_data):
+        sensors_config = self._config.sensors
+        self._sensor_data = dict()
+        # Running statistics of every sample taken since the last published report
+        self._sensor_window_stats = stream_stats.WindowAggregator()
+        # Sensors are registered before the report task so a report sees the samples taken in the same tick
+        scheduler = sample_scheduler.SampleScheduler(self._app_logger)
+        self._scheduler = scheduler
+        # Sensors due in the same tick are all triggered first, then collected (split-phase)
+        scheduler.add_task("water_depth",
+                           sensors_config["water_depth"].sample_period_seconds,
+                           self._sample_water_depth,
+                           start_fn=self.ultra_sonic_sensor.start_conversion)
+        scheduler.add_task("env_temp_humidity",
+                           sensors_config["env_temp_humidity"].sample_period_seconds,
+                           self._sample_env_temp_humidity,
+                           start_fn=self._sensor_environment_temp_humidity.start_conversion)
+        scheduler.add_task("water_temperature",
+                           sensors_config["water_temperature"].sample_period_seconds,
+                           self._sample_water_temperature,
+                           start_fn=self._sensor_water_temperature.start_conversion)
+        scheduler.add_task("report", self._config.sensor_sample_period_seconds, self._report_sensor_data)
+        scheduler.add_task("offline_replay", 1.0 / self._config.mqtt.replay_messages_per_second, self._replay_offline_message)
+        scheduler.add_task("config_reload", 1.0, self._apply_pending_config)
+        scheduler.add_task("timing_report", self._TIMING_REPORT_PERIOD_SECONDS, scheduler.log_timing_report,
+                           phase_seconds=self._TIMING_REPORT_PERIOD_SECONDS)
+        scheduler.run_forever()
+
+    '''
+    Water depth sensor (VL53L4CD) from the water_depth sensor config
+    '''
+    def _create_water_depth_sensor(self, app_config : config.AppConfig):
+        water_depth_config = app_config.require_sensor("water_depth")
+        return depth_sensor.VL53L4CD(water_depth_config.i2c_addr,
+                                     water_depth_config.continuous_ranging,
+                                     water_depth_config.distance_mode,
+                                     water_depth_config.timing_budget_ms,
+                                     water_depth_config.inter_measurement_ms,
+                                     i2c_bus_number=app_config.i2c.bus)
+
+    '''
+    Environment Temperature and Humidity Sensor (SHT31)
+    '''
+    def _create_env_temp_humidity_sensor(self, app_config : config.AppConfig):
+        env_sensor_config = app_config.require_sensor("env_temp_humidity")
+        return sensors.sht31(i2c_bus.get_i2c(app_config.i2c.bus), env_sensor_config.i2c_addr, False, env_sensor_config.periodic_mps)
+
+    '''
+    Water Temperature (MCS3421 Thermistor)
+    '''
+    def _create_water_temperature_sensor(self, app_config : config.AppConfig):
+        water_temperature_config = app_config.require_sensor("water_temperature")
+        # Resolution / oversampling from the latency budget if one is set, else as configured (default 18-bit)
+        latency_budget_ms = water_temperature_config.latency_budget_ms
+        calibration = sensors.SteinhartHart(*water_temperature_config.steinhart_hart) if water_temperature_config.steinhart_hart is not None else None
+        return sensors.mcp3421Thermistor(i2c_bus.get_i2c(app_config.i2c.bus),
+                                         water_temperature_config.i2c_addr,
+                                         False,
+                                         resolution=water_temperature_config.resolution or 18,
+                                         oversample_count=water_temperature_config.oversample_count or 1,
+                                         latency_budget_seconds=latency_budget_ms / 1000.0 if latency_budget_ms is not None else None,
+                                         calibration=calibration)
+
+    def _create_sensor(self, sensor_key : str, app_config : config.AppConfig):
+        create_fns = {"water_depth": self._create_water_depth_sensor,
+                      "env_temp_humidity": self._create_env_temp_humidity_sensor,
+                      "water_temperature": self._create_water_temperature_sensor}
+        return create_fns[sensor_key](app_config)
+
+    '''
+    Make a sensor the active one: attribute, measurement cache and (once running) its sampling task
+    '''
+    def _install_sensor(self, sensor_key : str, sensor, app_config : config.AppConfig):
+        sensor_config = app_config.require_sensor(sensor_key)
+        if sensor_key == "water_depth":
+            self.ultra_sonic_sensor = sensor
+            read_fn = sensor.read_distance_inches
+        elif sensor_key == "env_temp_humidity":
+            self._sensor_environment_temp_humidity = sensor
+            read_fn = sensor.read_temp_humidity
+        else:
+            self._sensor_water_temperature = sensor
+            read_fn = sensor.read_temp_humidity
+        self._measurement_cache.register(sensor_key, read_fn, sensor_config.sample_period_seconds)
+        if self._scheduler is not None:
+            sensor_task = self._scheduler.get_task(sensor_key)
+            sensor_task.start_fn = sensor.start_conversion
+            sensor_task.period_seconds = sensor_config.sample_period_seconds
+
+    def _get_sensor(self, sensor_key : str):
+        return {"water_depth": self.ultra_sonic_sensor,
+                "env_temp_humidity": self._sensor_environment_temp_humidity,
+                "water_temperature": self._sensor_water_temperature}[sensor_key]
+
+    '''
+    Stop a sensor's free-running acquisition before another instance reconfigures the device
+    '''
+    def _release_sensor(self, sensor) -> None:
+        if isinstance(sensor, depth_sensor.VL53L4CD):
+            sensor.stop_continuous()
+
+    '''
+    Stage a sensor re-initialization. When old and new settings address the same device
+    the running instance is released before the new one is built, and if the reload then
+    fails the device is re-initialized with the running settings.
+    '''
+    def _stage_sensor(self, reload : config_reload.ConfigReload, sensor_key : str):
+        (old_config, new_config) = (reload.old_config, reload.new_config)
+        same_device = (old_config.i2c.bus, old_config.sensors[sensor_key].i2c_addr) == \
+                      (new_config.i2c.bus, new_config.sensors[sensor_key].i2c_addr)
+
+        def restore_sensor():
+            try:
+                self._install_sensor(sensor_key, self._create_sensor(sensor_key, old_config), old_config)
+            except Exception as e:
+                self._app_logger.write(self._log_key, f"Unable to restore sensor {sensor_key}: {e}", logger.MessageLevel.ERROR)
+
+        def build_sensor():
+            if not same_device:
+                return self._create_sensor(sensor_key, new_config)
+            self._release_sensor(self._get_sensor(sensor_key))
+            try:
+                return self._create_sensor(sensor_key, new_config)
+            except Exception:
+                restore_sensor()
+                raise
+
+        def commit_sensor(sensor):
+            if not same_device:
+                self._release_sensor(self._get_sensor(sensor_key))
+            self._install_sensor(sensor_key, sensor, new_config)
+
+        def discard_sensor(sensor):
+            self._release_sensor(sensor)
+            if same_device:
+                restore_sensor()
+
+        reload.stage(sensor_key, build_sensor, commit_sensor, discard_sensor)
+
+    '''
+    Called on the config watcher thread with a validated config; applied by the sampling thread
+    '''
+    def _config_reloaded(self, new_config : config.AppConfig, config_dict : dict):
+        try:
+            for sensor_key in self._REQUIRED_SENSORS:
+                new_config.require_sensor(sensor_key)
+        except config.ConfigError as e:
+            self._app_logger.write(self._log_key, f"Config change ignored: {e}", logger.MessageLevel.ERROR)
+            return
+        self._pending_config = (new_config, config_dict)
+
+    '''
+    Swap in a reloaded config, re-initializing only the subsystems whose settings changed.
+    All of them are built before any is swapped in; if one fails the running config and
+    subsystems are kept.
+    '''
+    def _apply_pending_config(self):
+        pending_config = self._pending_config
+        if pending_config is None:
+            return
+        self._pending_config = None
+        (new_config, config_dict) = pending_config
+        old_config = self._config
+        reload = config_reload.ConfigReload(old_config, new_config, self._app_logger, self._log_key)
+        reload.stage_service_changes(self, payload_codec.HYDRO_TANK_SENSOR_SCHEMA)
+        (old_mqtt, new_mqtt) = (old_config.mqtt, new_config.mqtt)
+        if (new_mqtt.offline_buffer_file, new_mqtt.offline_buffer_bytes) != (old_mqtt.offline_buffer_file, old_mqtt.offline_buffer_bytes):
+            self._stage_offline_buffer(reload)
+        if new_config.filters != old_config.filters:
+            reload.stage("filters",
+                         lambda: signal_filters.FieldFilterBank(new_config.filters),
+                         lambda filters: setattr(self, "_sensor_filters", filters))
+        for sensor_key in self._REQUIRED_SENSORS:
+            if new_config.i2c != old_config.i2c or new_config.sensors[sensor_key] != old_config.sensors[sensor_key]:
+                self._stage_sensor(reload, sensor_key)
+        reload.on_commit(self._update_task_periods)
+        reload.apply(lambda app_config: self._commit_config(app_config, config_dict))
+
+    '''
+    Make an applied config the running one; the config manager then saves / compiles it too
+    '''
+    def _commit_config(self, app_config : config.AppConfig, config_dict : dict):
+        self._config = app_config
+        self._app_config.activate(config_dict)
+
+    '''
+    Scheduler periods derived from the active config
+    '''
+    def _update_task_periods(self):
+        self._scheduler.get_task("offline_replay").period_seconds = 1.0 / self._config.mqtt.replay_messages_per_second
+        self._scheduler.get_task("report").period_seconds = self._config.sensor_sample_period_seconds
+
+    '''
+    Collect the water depth and update the local display
+    '''
+    def _sample_water_depth(self):
+        water_distance = self._measurement_cache.refresh("water_depth", self.ultra_sonic_sensor.fetch_result)
+        if water_distance is None:
+            # Failed read: keep the last depth; the filters, window stats and display skip this sample
+            self._app_logger.write(self._log_key, "Water depth read failed; sample skipped.", logger.MessageLevel.WARN)
+            return
+        self._filtered_water_distance = self._sensor_filters.update("water_depth", water_distance)
+        water_depth_inverted = -1 * self._filtered_water_distance
+        self._sensor_data["water_depth"] = water_depth_inverted + self._zero_offset
+        self._sensor_data["water_depth_offset"] = self._zero_offset
+        self._sensor_window_stats.add("water_depth", self._sensor_data["water_depth"])
+        # Update Display - adjust to display 10ths of inches
+        self._display.display_number(int(self._sensor_data["water_depth"]*10))
+
+    '''
+    Collect the environment temperature and humidity
+    '''
+    def _sample_env_temp_humidity(self):
+        measurement = self._measurement_cache.refresh("env_temp_humidity", self._sensor_environment_temp_humidity.fetch_result)
+        self._sensor_data["env_temperature_f"] = self._sensor_filters.update("env_temperature_f", measurement.temperature)
+        self._sensor_data["env_humidity"] = self._sensor_filters.update("env_humidity", measurement.humidity)
+        self._sensor_window_stats.add("env_temperature_f", self._sensor_data["env_temperature_f"])
+        self._sensor_window_stats.add("env_humidity", self._sensor_data["env_humidity"])
+
+    '''
+    Collect the water temperature
+    '''
+    def _sample_water_temperature(self):
+        measurement = self._measurement_cache.refresh("water_temperature", self._sensor_water_temperature.fetch_result)
+        self._sensor_data["water_temperature_f"] = self._sensor_filters.update("water_temperature_f", measurement.temperature)
+        self._sensor_window_stats.add("water_temperature_f", self._sensor_data["water_temperature_f"])
+
+    '''
+    Print the latest samples and publish them to OpenHAB when the publish policy allows
+    '''
+    def _report_sensor_data(self):
+        timestamp = time.time()
+        sensor_data = dict(self._sensor_data)
+
+        # Console dump is formatted on the logger thread, only if INFO is enabled
+        self._app_logger.write(self._log_key, self._format_console_data, logger.MessageLevel.INFO, timestamp, dict(sensor_data))
+
+        # Publish Sensor Data to OpenHab
+        publish_reason = self._publish_policy.check(sensor_data)
+        if publish_reason is not None:
+            # Summary of every sample since the previous report
+            published_data = dict(sensor_data)
+            published_data["window_stats"] = self._sensor_window_stats.snapshot()
+
+            # Publish to MQTT (topic precomputed when the config was compiled)
+            payload = self._sensor_payload_codec.encode(published_data, timestamp)
+            if self._mqtt_publish(self._config.mqtt.sensor_topic_full, payload):
+                self._publish_policy.mark_published(sensor_data, publish_reason)
+                self._sensor_window_stats.reset()
+
+    '''
+    Formats all sensor data for the console to support debugging (called lazily by the logger)
+    '''
+    def _format_console_data(self, timestamp, sensor_data) -> str:
             console_str = "--- Sensor Data ---\n"
-            console_str += f"Timestamp:                {sensor_data['timestamp_iso']}\n"
+            console_str += f"Timestamp:                {datetime.datetime.fromtimestamp(timestamp).isoformat()}\n"
             console_str += f"Env. Temp (F):            {sensor_data['env_temperature_f']:.1f}F\n"
             console_str += f"Env. Humidity (%):        {sensor_data['env_humidity']:.1f}%\n"
             console_str += f"Water Temp (F):           {sensor_data['water_temperature_f']:.1f}F\n"
             console_str += f"Water Depth (in.):        {sensor_data['water_depth']:.2f}\"\n"
             console_str += f"Water Depth Offset (in.): {sensor_data['water_depth_offset']:.2f}\"\n"
-            self._app_logger.write(self._log_key, console_str, logger.MessageLevel.INFO) 
+            return console_str
 
     '''
-    Join MQTT topic parts into a single string with single slashes
+    Creates the MQTT connection supervisor (not started); connecting and reconnecting happen on its own thread
     '''
-    def _mqtt_topic_join(self, topic_parts: list) -> str:
-        topic_parts = [part.strip("/") for part in topic_parts]
-        return "/".join(topic_parts)
+    def _create_mqtt_connection(self, mqtt_config : config.MqttConfig):
+        return mqtt_connection.MqttConnectionSupervisor(mqtt_config.server_url,
+                                                        mqtt_config.server_port,
+                                                        self._app_logger,
+                                                        reconnect_min_seconds=mqtt_config.reconnect_min_seconds,
+                                                        reconnect_max_seconds=mqtt_config.reconnect_max_seconds,
+                                                        on_publish=self._mqtt_on_publish)
 
     '''
-    Creates the mqtt client and connects to the broker
+    Open the on-disk store-and-forward buffer; without it messages are dropped while disconnected
     '''
-    def _mqtt_client_connect(self):
-        client_id = f'python-mqtt-{random.randint(0, 1000)}'
-        server_url = self._app_config.active_config["mqtt"]["server_url"]
-        server_port = self._app_config.active_config["mqtt"]["server_port"]
-        mqtt_connected = False
+    def _init_offline_buffer(self):
         try:
-            self._mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id)
-            self._mqtt_client.on_connect = self._mqtt_on_connect
-            self._mqtt_client.on_publish = self._mqtt_on_publish
-        except:
-            self._app_logger.write(self._log_key, "Unable to create MQTT Client object.", logger.MessageLevel.ERROR)
-            return
-                
-        if self._mqtt_client == None:
-            self._app_logger.write(self._log_key, "MQTT Client object is None without exception thrown.", logger.MessageLevel.ERROR)
-            return
-            
+            self._install_offline_buffer(self._create_offline_buffer(self._config.mqtt))
+        except (OSError, ValueError) as e:
+            self._offline_buffer = None
+            self._app_logger.write(self._log_key, f"Unable to open offline buffer {self._offline_buffer_path(self._config.mqtt)}: {e}", logger.MessageLevel.ERROR)
+
+    def _offline_buffer_path(self, mqtt_config : config.MqttConfig) -> str:
+        return os.path.join(os.getcwd(), mqtt_config.offline_buffer_file)
+
+    def _create_offline_buffer(self, mqtt_config : config.MqttConfig) -> offline_buffer.OfflineBuffer:
+        return offline_buffer.OfflineBuffer(self._offline_buffer_path(mqtt_config), mqtt_config.offline_buffer_bytes)
+
+    def _install_offline_buffer(self, buffer : offline_buffer.OfflineBuffer):
+        self._offline_buffer = buffer
+        # A replayed record in flight belonged to the previous buffer; its head is sent again
+        self._replay_in_flight = None
+        self._app_logger.write(self._log_key, f"Offline buffer {buffer.file_path} holds {len(buffer)} unpublished messages.", logger.MessageLevel.INFO)
+
+    '''
+    Stage an offline buffer re-open. The same file cannot be mapped twice, so in that case
+    the running buffer is closed before the new one is opened and re-opened if the reload fails.
+    '''
+    def _stage_offline_buffer(self, reload : config_reload.ConfigReload):
+        (old_mqtt, new_mqtt) = (reload.old_config.mqtt, reload.new_config.mqtt)
+        same_file = self._offline_buffer_path(old_mqtt) == self._offline_buffer_path(new_mqtt)
+
+        def restore_buffer():
+            try:
+                self._install_offline_buffer(self._create_offline_buffer(old_mqtt))
+            except (OSError, ValueError) as e:
+                self._offline_buffer = None
+                self._app_logger.write(self._log_key, f"Unable to re-open offline buffer: {e}", logger.MessageLevel.ERROR)
+
+        def build_buffer():
+            if same_file and self._offline_buffer is not None:
+                self._offline_buffer.close()
+                self._offline_buffer = None
+                try:
+                    return self._create_offline_buffer(new_mqtt)
+                except Exception:
+                    restore_buffer()
+                    raise
+            return self._create_offline_buffer(new_mqtt)
+
+        def commit_buffer(buffer):
+            if self._offline_buffer is not None:
+                self._offline_buffer.close()
+            self._install_offline_buffer(buffer)
+
+        def discard_buffer(buffer):
+            buffer.close()
+            if same_file:
+                restore_buffer()
+
+        reload.stage("offline_buffer", build_buffer, commit_buffer, discard_buffer)
+
+    '''
+    Publish a message to the MQTT Broker (never blocks). While disconnected, or while
+    older messages are still waiting to be replayed, the message is buffered on disk.
+    Returns False if the message was dropped.
+    '''
+    def _mqtt_publish(self, mqtt_topic, payload) -> bool:
+        # Messages lost with their connection go back in the buffer ahead of this one
+        self._check_in_flight_messages()
+        if self._offline_buffer is not None and len(self._offline_buffer) > 0:
+            self._buffer_offline_message(mqtt_topic, payload)
+            return True
+        in_flight = self._mqtt_publish_now(mqtt_topic, payload)
+        if in_flight is not None:
+            if self._offline_buffer is not None:
+                self._in_flight_messages.append(in_flight + (mqtt_topic, payload))
+            return True
+        if self._offline_buffer is None:
+            self._app_logger.write("mqtt", "Not connected to MQTT Broker; message dropped.", logger.MessageLevel.WARN)
+            return False
+        self._buffer_offline_message(mqtt_topic, payload)
+        return True
+
+    '''
+    Hand a message to the MQTT client; returns (message info, connection, connect count)
+    to track its delivery, or None if it was not accepted
+    '''
+    def _mqtt_publish_now(self, mqtt_topic, payload):
+        qos = 2
+        retain = True
+        connection = self._mqtt_connection
+        connect_count = connection.connect_count
+        mqtt_msg_info = connection.publish(mqtt_topic,
+                                           payload,
+                                           qos,
+                                           retain)
+        if mqtt_msg_info is None or mqtt_msg_info.rc != 0:
+            return None
+        self._app_logger.write("mqtt", "Message published w/ code: %s", logger.MessageLevel.INFO, mqtt_msg_info.rc)
+        return (mqtt_msg_info, connection, connect_count)
+
+    '''
+    Delivery state of a tracked message: True once the broker has acknowledged it, None
+    while it may still be, False if its connection is gone. Every reconnect starts a new
+    clean-session client, so paho never resends what the old one had in flight.
+    '''
+    def _delivery_state(self, in_flight):
+        (mqtt_msg_info, connection, connect_count) = in_flight[:3]
         try:
-            mqtt_conn_code = self._mqtt_client.connect(server_url, server_port, 60)
-            self._mqtt_client.loop_start()
-            self._app_logger.write(self._log_key, f"MQTT Client Connect Code: {mqtt_conn_code}", logger.MessageLevel.INFO)
-            time.sleep(0.5)
-            mqtt_connected = self._mqtt_client.is_connected()
-        except:
-            self._app_logger.write(self._log_key, f"MQTT Client unable to connect object. Code = {mqtt_conn_code}", logger.MessageLevel.ERROR)
-            return
-            
-        if mqtt_connected is False:
-            mqtt_client_err_msg = "Client failed to connect to MQTT Broker."
-            self._app_logger.write(self._log_key, mqtt_client_err_msg, logger.MessageLevel.ERROR)
-                
-    '''
-    Publish a message to the MQTT Broker
-    '''
-    def _mqtt_publish(self, mqtt_topic, json_str_msg, validate_connection=True):
-        # Validate connection (if enabled)
-        if validate_connection is True:
-            if self._mqtt_client is None or self._mqtt_client.is_connected() is False:
-                self._mqtt_client_connect()
-        # Publish message
-        if self._mqtt_client is not None and self._mqtt_client.is_connected():
-            qos = 2
-            retain = True
-            mqtt_msg_info = self._mqtt_client.publish(mqtt_topic, 
-                                                    json_str_msg, 
-                                                    qos, 
-                                                    retain)
-            self._app_logger.write("mqtt", f"Message published w/ code: {mqtt_msg_info.rc}", logger.MessageLevel.INFO)
-        
+            if mqtt_msg_info.is_published():
+                return True
+        except (ValueError, RuntimeError):
+            return False
+        if connection is self._mqtt_connection and connection.connect_count == connect_count and connection.is_connected():
+            return None
+        return False
+
+    '''
+    Forget acknowledged live messages; buffer the ones whose connection was lost
+    '''
+    def _check_in_flight_messages(self):
+        still_in_flight = list()
+        for in_flight in self._in_flight_messages:
+            delivered = self._delivery_state(in_flight)
+            if delivered is None:
+                still_in_flight.append(in_flight)
+            elif not delivered and self._offline_buffer is not None:
+                (mqtt_topic, payload) = in_flight[3:]
+                self._buffer_offline_message(mqtt_topic, payload)
+        self._in_flight_messages = still_in_flight
+
+    def _buffer_offline_message(self, mqtt_topic, payload):
+        evicted = self._offline_buffer.append(mqtt_topic, payload)
+        self._app_logger.write("mqtt", "Message buffered offline (%d waiting).", logger.MessageLevel.INFO, len(self._offline_buffer))
+        if evicted > 0:
+            self._app_logger.write("mqtt", f"Offline buffer full; discarded {evicted} oldest messages.", logger.MessageLevel.WARN)
+
     '''
-    The callback for when the client receives a CONNACK response from the server.
+    Replay the oldest buffered message, in order, once per replay period while connected.
+    The record stays at the head of the buffer until the broker acknowledges it.
     '''
-    def _mqtt_on_connect(self, client, userdata, flags, rc):
-        self._app_logger.write("mqtt", "Connected with result code "+str(rc), logger.MessageLevel.INFO)
+    def _replay_offline_message(self):
+        self._check_in_flight_messages()
+        if self._offline_buffer is None or len(self._offline_buffer) == 0:
+            return
+        if self._replay_in_flight is not None:
+            delivered = self._delivery_state(self._replay_in_flight)
+            if delivered is None:
+                return
+            self._replay_in_flight = None
+            if delivered:
+                self._offline_buffer.pop()
+                if len(self._offline_buffer) == 0:
+                    return
+        if not self._mqtt_connection.is_connected():
+            return
+        damaged_count = self._offline_buffer.damaged_count
+        message = self._offline_buffer.peek()
+        if self._offline_buffer.damaged_count != damaged_count:
+            self._app_logger.write("mqtt", f"Offline buffer: dropped {self._offline_buffer.damaged_count - damaged_count} damaged messages.", logger.MessageLevel.ERROR)
+        if message is None:
+            return
+        (mqtt_topic, payload) = message
+        self._replay_in_flight = self._mqtt_publish_now(mqtt_topic, payload)
 
     '''
     The callback for when a message is published to the server
     '''
     def _mqtt_on_publish(self, client, userdata, msg):
-        self._app_logger.write("mqtt", f"Message published: {msg}", logger.MessageLevel.INFO)
+        self._app_logger.write("mqtt", "Message published: %s", logger.MessageLevel.INFO, msg)
 
     '''
     Initialize the digital input for zero water distance button
     '''
     def _init_zero_button(self):    
-        button_gpio_pin = self._app_config.active_config['zero_button_pin']
+        button_gpio_pin = self._config.zero_button_pin
         button_gpio_pin = 17
-        self._zero_button = Button(button_gpio_pin)
+        self._zero_button = device_backend.get_backend().create_button(button_gpio_pin)
         self._zero_button.when_pressed = self._zero_button_pressed_callback
     
     '''
@@ -245,8 +585,16 @@ class HydroTankMonitor:
     '''
     def _zero_button_pressed_callback(self, channel):
         self._app_logger.write("digital_input", "Zero button pressed.", logger.MessageLevel.INFO)
-        # Add logic to handle zeroing the water depth sensor
-        self._zero_offset = self.ultra_sonic_sensor.read_distance_inches()
+        # Add logic to handle zeroing the water depth sensor; uses the filtered distance once sampling runs
+        if self._filtered_water_distance is not None:
+            water_distance = self._filtered_water_distance
+        else:
+            water_distance = self._measurement_cache.get("water_depth")
+        if water_distance is None:
+            # The read failed; a None offset would break every later depth sample
+            self._app_logger.write("digital_input", f"No water distance reading; offset left at {self._zero_offset:.2f}", logger.MessageLevel.WARN)
+            return
+        self._zero_offset = water_distance
         self._app_logger.write("digital_input", f"Setting offset to {self._zero_offset:.2f}", logger.MessageLevel.INFO)
         
 if __name__ == "__main__":
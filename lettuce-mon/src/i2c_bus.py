@@ -0,0 +1,212 @@
+'''
+Process-wide I2C bus manager.
+
+Owns one persistent busio-style handle and one persistent SMBus handle per bus
+number, and serializes every transaction on a bus with a single re-entrant
+lock shared by both handles. Drivers use get_i2c() / get_smbus() instead of
+opening their own handles, and hold transaction() around multi-step sequences
+that must not interleave with other threads.
+'''
+import threading
+
+import device_backend
+
+
+class SharedI2C:
+    '''
+    busio.I2C compatible proxy; every transaction holds the bus lock.
+    try_lock() / unlock() map onto the same lock so adafruit_bus_device
+    I2CDevice context managers are serialized as well.
+    '''
+    def __init__(self, i2c, bus_lock : threading.RLock, bus_number : int) -> None:
+        self._i2c = i2c
+        self._bus_lock = bus_lock
+        self.bus_number = bus_number
+
+    def try_lock(self) -> bool:
+        return self._bus_lock.acquire(blocking=False)
+
+    def unlock(self) -> None:
+        self._bus_lock.release()
+
+    def scan(self) -> list:
+        with self._bus_lock:
+            return self._locked_call(self._i2c.scan)
+
+    def writeto(self, address : int, buffer, *, start : int = 0, end : int = None) -> None:
+        with self._bus_lock:
+            self._locked_call(self._i2c.writeto, address, buffer, start=start, end=end)
+
+    def readfrom_into(self, address : int, buffer, *, start : int = 0, end : int = None) -> None:
+        with self._bus_lock:
+            self._locked_call(self._i2c.readfrom_into, address, buffer, start=start, end=end)
+
+    def writeto_then_readfrom(self, address : int, buffer_out, buffer_in, *,
+                              out_start : int = 0, out_end : int = None,
+                              in_start : int = 0, in_end : int = None) -> None:
+        with self._bus_lock:
+            self._locked_call(self._i2c.writeto_then_readfrom, address, buffer_out, buffer_in,
+                              out_start=out_start, out_end=out_end, in_start=in_start, in_end=in_end)
+
+    '''
+    Persistent handle - closed only by I2CBusManager.close_all()
+    '''
+    def deinit(self) -> None:
+        pass
+
+    '''
+    busio requires its own lock to be held around transactions
+    '''
+    def _locked_call(self, fn, *args, **kwargs):
+        while not self._i2c.try_lock():
+            pass
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._i2c.unlock()
+
+
+class SharedSMBus:
+    '''
+    smbus2.SMBus compatible proxy; every transaction holds the bus lock.
+    '''
+    def __init__(self, smbus, bus_lock : threading.RLock, bus_number : int, i2c_msg) -> None:
+        self._smbus = smbus
+        self._bus_lock = bus_lock
+        self._i2c_msg = i2c_msg
+        self.bus_number = bus_number
+
+    def write_byte(self, i2c_addr : int, value : int) -> None:
+        with self._bus_lock:
+            self._smbus.write_byte(i2c_addr, value)
+
+    def read_byte(self, i2c_addr : int) -> int:
+        with self._bus_lock:
+            return self._smbus.read_byte(i2c_addr)
+
+    def write_byte_data(self, i2c_addr : int, register : int, value : int) -> None:
+        with self._bus_lock:
+            self._smbus.write_byte_data(i2c_addr, register, value)
+
+    def read_byte_data(self, i2c_addr : int, register : int) -> int:
+        with self._bus_lock:
+            return self._smbus.read_byte_data(i2c_addr, register)
+
+    def write_i2c_block_data(self, i2c_addr : int, register : int, data : list) -> None:
+        with self._bus_lock:
+            self._smbus.write_i2c_block_data(i2c_addr, register, data)
+
+    def read_i2c_block_data(self, i2c_addr : int, register : int, length : int) -> list:
+        with self._bus_lock:
+            return self._smbus.read_i2c_block_data(i2c_addr, register, length)
+
+    def i2c_rdwr(self, *i2c_msgs) -> None:
+        with self._bus_lock:
+            self._smbus.i2c_rdwr(*i2c_msgs)
+
+    '''
+    Combined write then repeated-start read in a single I2C_RDWR ioctl
+    '''
+    def write_then_read(self, i2c_addr : int, data, length : int) -> bytes:
+        write_msg = self._i2c_msg.write(i2c_addr, data)
+        read_msg = self._i2c_msg.read(i2c_addr, length)
+        with self._bus_lock:
+            self._smbus.i2c_rdwr(write_msg, read_msg)
+        return bytes(read_msg)
+
+    '''
+    Persistent handle - closed only by I2CBusManager.close_all()
+    '''
+    def close(self) -> None:
+        pass
+
+
+class I2CBusManager:
+    '''
+    Creates bus handles on first use and keeps them open for the process lifetime.
+    '''
+    def __init__(self, backend : device_backend.DeviceBackend = None) -> None:
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._bus_locks = dict()
+        self._i2c_handles = dict()
+        self._smbus_handles = dict()
+
+    '''
+    Lock serializing all transactions on a bus (re-entrant)
+    '''
+    def get_bus_lock(self, bus_number : int = 1) -> threading.RLock:
+        with self._lock:
+            return self._get_bus_lock_locked(bus_number)
+
+    '''
+    Context manager holding the bus for a multi-transaction sequence
+    '''
+    def transaction(self, bus_number : int = 1) -> threading.RLock:
+        return self.get_bus_lock(bus_number)
+
+    def get_i2c(self, bus_number : int = 1) -> SharedI2C:
+        with self._lock:
+            if bus_number not in self._i2c_handles:
+                i2c = self._get_backend().create_i2c(bus_number)
+                self._i2c_handles[bus_number] = SharedI2C(i2c, self._get_bus_lock_locked(bus_number), bus_number)
+            return self._i2c_handles[bus_number]
+
+    def get_smbus(self, bus_number : int = 1) -> SharedSMBus:
+        with self._lock:
+            if bus_number not in self._smbus_handles:
+                backend = self._get_backend()
+                smbus = backend.create_smbus(bus_number)
+                self._smbus_handles[bus_number] = SharedSMBus(smbus,
+                                                              self._get_bus_lock_locked(bus_number),
+                                                              bus_number,
+                                                              backend.get_i2c_msg())
+            return self._smbus_handles[bus_number]
+
+    '''
+    Close every handle (process shutdown)
+    '''
+    def close_all(self) -> None:
+        with self._lock:
+            for shared in self._i2c_handles.values():
+                shared._i2c.deinit()
+            for shared in self._smbus_handles.values():
+                shared._smbus.close()
+            self._i2c_handles.clear()
+            self._smbus_handles.clear()
+
+    def _get_backend(self) -> device_backend.DeviceBackend:
+        return self._backend if self._backend is not None else device_backend.get_backend()
+
+    def _get_bus_lock_locked(self, bus_number : int) -> threading.RLock:
+        if bus_number not in self._bus_locks:
+            self._bus_locks[bus_number] = threading.RLock()
+        return self._bus_locks[bus_number]
+
+
+_bus_manager = None
+_bus_manager_lock = threading.Lock()
+
+'''
+Returns the process-wide bus manager
+'''
+def get_bus_manager() -> I2CBusManager:
+    global _bus_manager
+    with _bus_manager_lock:
+        if _bus_manager is None:
+            _bus_manager = I2CBusManager()
+        return _bus_manager
+
+'''
+Replace the process-wide bus manager (e.g. after switching device backends)
+'''
+def set_bus_manager(bus_manager : I2CBusManager) -> None:
+    global _bus_manager
+    with _bus_manager_lock:
+        _bus_manager = bus_manager
+
+def get_i2c(bus_number : int = 1) -> SharedI2C:
+    return get_bus_manager().get_i2c(bus_number)
+
+def get_smbus(bus_number : int = 1) -> SharedSMBus:
+    return get_bus_manager().get_smbus(bus_number)
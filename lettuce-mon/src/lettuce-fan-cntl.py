@@ -2,16 +2,25 @@
 Service script that controls and monitors the fan speed of the lettuce farm.
 '''
 
-import datetime
+import json
+import threading
 import time
-import RPi.GPIO as GPIO
-from threading import Lock
 
+import gzip
 import logging
+import logging.handlers
+import os
+import shutil
 import paho.mqtt.client as mqtt
 
-import queue
-import copy
+import device_backend
+import fan_tach
+import i2c_bus
+import pid_control
+import pwm_output
+import sample_scheduler
+import sensors
+import topic_inbox
 
 class TripleFanController:
 
@@ -19,7 +28,7 @@ class TripleFanController:
 
     # Private Class Members
     _pwm = None
-    _tach_lock = None
+    _tach_capture = None
 
     '''
     Object initialization
@@ -29,25 +38,23 @@ class TripleFanController:
                     fan1_tach_pin : int= 15 , 
                     fan2_tach_pin : int= 13 , 
                     fan3_tach_pin : int= 11,
-                    pwm_freq : int = 10000):
+                    pwm_freq : int = 10000,
+                    tach_pulses_per_rev : int = 1,
+                    stall_timeout_seconds : float = 2.0,
+                    pwm_slew_rate_percent_per_second : float = None):
         self._pwn_pin = pwn_pin
         self._fan1_tach_pin = fan1_tach_pin
         self._fan2_tach_pin = fan2_tach_pin
         self._fan3_tach_pin = fan3_tach_pin
         self._pwm_freq = pwm_freq
+        self._pwm_slew_rate = pwm_slew_rate_percent_per_second
+        self._tach_pulses_per_rev = tach_pulses_per_rev
+        self._stall_timeout_seconds = stall_timeout_seconds
         self._last_pwm_set_point = 0
-        self._last_tach_time = datetime.datetime.now()
-
-        self._tach_counts = {
-            self._fan1_tach_pin: 0,
-            self._fan2_tach_pin: 0,
-            self._fan3_tach_pin: 0
-        }
 
         # Initialize GPIO
+        self._gpio = device_backend.get_backend().get_gpio()
         self._init_pi_pins()
-        # Lock for tach counts. Interrupt vs. user call.
-        self._tach_lock = Lock()
 
     '''
     Set the fan speed duty cycle (0-100)
@@ -55,31 +62,26 @@ class TripleFanController:
     def set_fan_pwm(self, duty_cycle : int):
         # Invert DC
         inv_dc = 100 - duty_cycle
-        self._pwm.ChangeDutyCycle(inv_dc)
+        self._pwm.set_duty_cycle(inv_dc)
         self._last_pwm_set_point = duty_cycle
+        # Give the fans time to reach the new speed before flagging a stall
+        self._tach_capture.rearm()
 
     '''
-    Returns the three fan speeds in RPM.
-    By default resets the counter
+    Returns the three fan speeds in RPM, from the median tach edge period.
+    reset_count is kept for compatibility; readings no longer depend on when they were last taken.
     '''
     def get_fan_speeds(self, reset_count : bool = True) -> tuple:
-        # First calculate the time since the last tach event
-        delta = datetime.datetime.now() - self._last_tach_time  
-        self._last_tach_time = datetime.datetime.now()    
-
-        # Calculate RPM
-        with self._tach_lock:
-            tach_counts_snap = dict(self._tach_counts)
-            tach1 = int(tach_counts_snap[self._fan1_tach_pin] / delta.total_seconds() * 60.0)
-            tach2 = int(tach_counts_snap[self._fan2_tach_pin] / delta.total_seconds() * 60.0)
-            tach3 = int(tach_counts_snap[self._fan3_tach_pin] / delta.total_seconds() * 60.0)
-
-            # Reset counters if requested
-            if (reset_count):
-                for tc in self._tach_counts:
-                    self._tach_counts[tc] = 0
-        
-        return (tach1, tach2, tach3)
+        return tuple(int(rpm) for rpm in self._tach_capture.get_rpms())
+
+    '''
+    Returns a stall flag per fan: True if the fan should be turning (set point > 0)
+    but no tach edge arrived within the stall timeout
+    '''
+    def get_stalled_fans(self) -> tuple:
+        if self._last_pwm_set_point <= 0:
+            return (False, False, False)
+        return self._tach_capture.get_stalled()
     
     '''
     Return fan speeds as console friendly string
@@ -96,27 +98,156 @@ class TripleFanController:
     Initialize GPIO for PWM control and tach measurement
     '''
     def _init_pi_pins(self):
+        GPIO = self._gpio
         # Use BOARD mode
         GPIO.setmode(GPIO.BOARD)
-        # Tach Input Pins
-        GPIO.setup(self._fan1_tach_pin, GPIO.IN)
-        GPIO.setup(self._fan2_tach_pin, GPIO.IN)
-        GPIO.setup(self._fan3_tach_pin, GPIO.IN)
-        GPIO.add_event_detect(self._fan1_tach_pin, GPIO.FALLING, callback=self._callback_fan_tach)
-        GPIO.add_event_detect(self._fan2_tach_pin, GPIO.FALLING, callback=self._callback_fan_tach)
-        GPIO.add_event_detect(self._fan3_tach_pin, GPIO.FALLING, callback=self._callback_fan_tach)
-        # PWM Output Pin
-        GPIO.setup(self._pwn_pin, GPIO.OUT)
-        GPIO.output(self._pwn_pin, GPIO.LOW)
-        self._pwm = GPIO.PWM(self._pwn_pin, self._pwm_freq)
-        self._pwm.start(0)   
+        # Tach Input Pins - kernel timestamped edges, captured in batches
+        self._tach_capture = fan_tach.TachCapture([self._fan1_tach_pin, self._fan2_tach_pin, self._fan3_tach_pin],
+                                                  pulses_per_rev=self._tach_pulses_per_rev,
+                                                  stall_timeout_seconds=self._stall_timeout_seconds)
+        # PWM Output Pin - hardware PWM if enabled (LETTUCE_HARDWARE_PWM) and routed to the pin, optionally slew-rate limited
+        self._pwm = pwm_output.RampedPwm(device_backend.get_backend().create_pwm(self._pwn_pin, self._pwm_freq, 0),
+                                         self._pwm_slew_rate)
 
-    '''
-    Called once per fan revolution (tach pin falling edge)
-    '''
-    def _callback_fan_tach(self, tach_channel):
-        with self._tach_lock:
-            self._tach_counts[tach_channel] += 1
+
+'''
+Closes the fan loop on the device: reads the box temperature and sets the fan duty cycle
+every control period on its own thread, so cooling does not depend on the network.
+Modes: "pid", "hysteresis" and "manual" (duty cycle from set_manual_pwm()).
+After max_read_failures failed sensor reads in a row the fans run at failsafe_pwm.
+'''
+class FanTemperatureController:
+
+    MODES = ("pid", "hysteresis", "manual")
+
+    def __init__(self,
+                    fan_controller : TripleFanController,
+                    temperature_sensor : sensors.TemperatureHumiditySensor,
+                    target_temperature_f : float = 75.0,
+                    control_period_seconds : float = 5.0,
+                    mode : str = "pid",
+                    kp : float = 10.0,
+                    ki : float = 0.1,
+                    kd : float = 0.0,
+                    min_pwm : int = 0,
+                    max_pwm : int = 100,
+                    hysteresis_band_f : float = 2.0,
+                    failsafe_pwm : int = 100,
+                    max_read_failures : int = 3,
+                    logger : logging.Logger = None):
+        if control_period_seconds <= 0:
+            raise ValueError(f"Control period must be positive: {control_period_seconds}")
+        self._fan_controller = fan_controller
+        self._temperature_sensor = temperature_sensor
+        self._control_period_seconds = control_period_seconds
+        self._failsafe_pwm = failsafe_pwm
+        self._max_read_failures = max_read_failures
+        self._logger = logger
+        self._pid = pid_control.PidController(kp, ki, kd, target_temperature_f, min_pwm, max_pwm, direct_acting=True)
+        self._hysteresis = pid_control.HysteresisController(target_temperature_f, hysteresis_band_f, min_pwm, max_pwm)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._mode = None
+        self._pwm = None
+        self._read_failures = 0
+        self.last_temperature_f = None
+        self.set_mode(mode)
+
+    '''
+    Start the control thread; returns immediately
+    '''
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._control_thread, name="fan-control", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout : float = 5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def set_target_temperature(self, target_temperature_f : float):
+        with self._lock:
+            self._pid.setpoint = target_temperature_f
+            self._hysteresis.setpoint = target_temperature_f
+
+    def set_mode(self, mode : str):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown fan control mode '{mode}' (use one of {list(self.MODES)})")
+        with self._lock:
+            self._set_mode_locked(mode)
+
+    '''
+    Switch to manual mode and apply the duty cycle now. Mode switch and apply are one
+    step under the lock, so a PID output computed before the switch cannot land after it.
+    '''
+    def set_manual_pwm(self, duty_cycle : int):
+        with self._lock:
+            self._set_mode_locked("manual")
+            self._apply_pwm(duty_cycle)
+
+    def get_state(self) -> dict:
+        with self._lock:
+            return {"mode": self._mode,
+                    "target_temperature_f": self._pid.setpoint,
+                    "temperature_f": self.last_temperature_f,
+                    "pwm": self._pwm,
+                    "read_failures": self._read_failures}
+
+    ''' ------ Private Functions ------'''
+    def _control_thread(self):
+        next_step_time = time.monotonic()
+        while not self._stop_event.is_set():
+            self._control_step()
+            # Fixed-rate: the next step is due one period after the previous one was due
+            next_step_time += self._control_period_seconds
+            delay = next_step_time - time.monotonic()
+            if delay < 0:
+                next_step_time = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def _control_step(self):
+        try:
+            temperature_f = self._temperature_sensor.read_temp_humidity().temperature
+        except Exception as e:
+            with self._lock:
+                self._read_failures += 1
+                read_failures = self._read_failures
+                if read_failures >= self._max_read_failures and self._mode != "manual":
+                    self._apply_pwm(self._failsafe_pwm)
+            self._log(f"Fan control sensor read failed ({read_failures}): {e}", logging.WARNING)
+            return
+        with self._lock:
+            self._read_failures = 0
+            self.last_temperature_f = temperature_f
+            if self._mode == "manual":
+                return
+            controller = self._pid if self._mode == "pid" else self._hysteresis
+            self._apply_pwm(int(round(controller.update(temperature_f))))
+
+    # Caller holds self._lock
+    def _set_mode_locked(self, mode : str):
+        if mode == self._mode:
+            return
+        # Bumpless: the PID's first output is the duty cycle the fans run at now
+        self._pid.reset(self._pwm)
+        self._hysteresis.reset()
+        self._mode = mode
+
+    # Caller holds self._lock: mode check, compare-and-set and the fan write are one step
+    def _apply_pwm(self, duty_cycle : int):
+        if duty_cycle != self._pwm:
+            self._fan_controller.set_fan_pwm(duty_cycle)
+            self._pwm = duty_cycle
+
+    def _log(self, msg : str, level : int = logging.INFO):
+        if self._logger is not None:
+            self._logger.log(level, msg)
 
 
 '''
@@ -131,7 +262,7 @@ class MqttClient:
         def __init__(self, topic : str, payload):
             self.topic = topic
             self.payload = payload
-            self.created = datetime.datetime.now()
+            self.created = time.monotonic()
 
     '''
     Init mqtt client
@@ -139,15 +270,16 @@ class MqttClient:
     def __init__(self,
                     openhab_host : str = "debian-openhab",
                     mqtt_broker_port : int = 1883,
-                    logger : logging.Logger = None):
+                    logger : logging.Logger = None,
+                    max_inbox_topics : int = 64):
         
         # Class Locals
         self.log_key = "Mqtt Client"
         self._openhab_host = openhab_host
         self._mqtt_broker_port = mqtt_broker_port
         self._flag_connected = False
-        self._sub_payload_queue = list()
-        self._sub_payload_queue_lock = Lock()
+        # Latest message per subscribed topic; bounded and wakes the consumer on arrival
+        self._inbox = topic_inbox.TopicInbox(max_inbox_topics)
         self._subscription_list = list()
 
         # Mqtt Client
@@ -210,13 +342,16 @@ class MqttClient:
             self._subscription_list.append(topic)
 
     '''
-    Get a copy of the 
+    Take the pending subscription messages (latest per topic) as a list of MqttTopicQueueElement
+    '''
+    def flush_subscription_topic_queue(self) -> list:
+        return [mtte for (_, mtte) in self._inbox.drain()]
+
+    '''
+    Block until a subscription message arrives or timeout; returns True if one is pending
     '''
-    def flush_subscription_topic_queue(self) -> queue:
-        with self._sub_payload_queue_lock:
-            queue_copy = copy.deepcopy(self._sub_payload_queue)
-            self._sub_payload_queue.clear()
-            return queue_copy
+    def wait_for_messages(self, timeout : float = None) -> bool:
+        return self._inbox.wait(timeout)
 
     '''
     Connect callback
@@ -241,8 +376,7 @@ class MqttClient:
     def _on_client_message(self, client, userdata, message):
         mtte = MqttClient.MqttTopicQueueElement(message.topic, message.payload)
         self._log(f"Msg Recv'd: {message.topic} --> {message.payload}")
-        with self._sub_payload_queue_lock:
-            self._sub_payload_queue.append(mtte)
+        self._inbox.put(message.topic, mtte)
     
     '''
     Interal log method
@@ -253,6 +387,41 @@ class MqttClient:
         print(f"{self.log_key}: {log_msg}")
 
 
+'''
+Drops repeats of the previous record; the next different record reports how many were dropped
+'''
+class RepeatedMessageFilter(logging.Filter):
+    def __init__(self) -> None:
+        super().__init__()
+        self._last_message = None
+        self._repeat_count = 0
+
+    def filter(self, record : logging.LogRecord) -> bool:
+        message = (record.levelno, record.getMessage())
+        if message == self._last_message:
+            self._repeat_count += 1
+            return False
+        if self._repeat_count > 0:
+            record.msg = f"(previous message repeated {self._repeat_count} times) {record.getMessage()}"
+            record.args = None
+        self._last_message = message
+        self._repeat_count = 0
+        return True
+
+'''
+Size-bounded log file; rotated files are gzip compressed (<file>.1.gz ... <file>.<backup_count>.gz)
+'''
+def _rotating_log_handler(file_path : str, max_bytes : int = 1048576, backup_count : int = 5) -> logging.Handler:
+    handler = logging.handlers.RotatingFileHandler(file_path, maxBytes=max_bytes, backupCount=backup_count)
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzip_rotator
+    return handler
+
+def _gzip_rotator(source : str, dest : str) -> None:
+    with open(source, 'rb') as source_file, gzip.open(dest, 'wb') as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
 '''
 Main Loop for Fan Controller
 '''
@@ -267,19 +436,28 @@ def main():
     fan_1_rpm_topic = "lettuce_box/seedling_box/fan_1/rpm"
     fan_2_rpm_topic = "lettuce_box/seedling_box/fan_2/rpm"
     fan_pwm_set_point_topic = "lettuce_box/seedling_box/fan/pwm"
+    fan_target_temperature_topic = "lettuce_box/seedling_box/fan/target_temperature_f"
+    fan_control_mode_topic = "lettuce_box/seedling_box/fan/mode"
+    fan_control_state_topic = "lettuce_box/seedling_box/fan/control_state"
+
+    # Local fan control from the seedling box temperature
+    control_period_seconds = 5
+    target_temperature_f = 75.0
 
     # Configure Logger
     logging.basicConfig(level=logging.INFO, format="%(asctime)s:%(levelname)s:%(message)s")
     logger = logging.getLogger(__name__)
     
-    # Debug File Log
-    file = logging.FileHandler("debug_lettuce_fan_controller.log")
+    logger.addFilter(RepeatedMessageFilter())
+    
+    # Debug File Log (size-bounded, compressed rotation)
+    file = _rotating_log_handler("debug_lettuce_fan_controller.log")
     file.setLevel(logging.INFO)
     fileformat = logging.Formatter("%(asctime)s:%(levelname)s:%(message)s")
     file.setFormatter(fileformat)
     logger.addHandler(file)
     # Critical File Log
-    cric_file = logging.FileHandler("critical_lettuce_fan_controller.log")
+    cric_file = _rotating_log_handler("critical_lettuce_fan_controller.log")
     cric_file.setLevel(logging.CRITICAL)
     cric_file.setFormatter(fileformat)
     logger.addHandler(cric_file)
@@ -297,33 +475,74 @@ def main():
             time.sleep(test_sleep_time)
             print(fan_controller.get_fan_speeds_as_str())
 
+    # Closed-loop control from the seedling box SHT31; manual set points only without the sensor
+    fan_temperature_controller = None
+    try:
+        seedling_box_sensor = sensors.sht31(i2c_bus.get_i2c(), 0x44, False)
+        fan_temperature_controller = FanTemperatureController(fan_controller,
+                                                              seedling_box_sensor,
+                                                              target_temperature_f,
+                                                              control_period_seconds,
+                                                              logger=logger)
+        fan_temperature_controller.start()
+    except Exception as e:
+        logger.error(f"Local fan control disabled; seedling box sensor unavailable: {e}")
+
     # Initialize MQTT Client
     mqtt_client = MqttClient()
 
-    # Infinite loop of reporting temperature and setting fan speed based on temperature
+    def report_fan_state():
+        fan_speeds = fan_controller.get_fan_speeds()
+        mqtt_client.try_publish(fan_1_rpm_topic, fan_speeds[0])
+        print(f"{fan_1_rpm_topic}/{fan_speeds[0]}")
+        mqtt_client.try_publish(fan_2_rpm_topic, fan_speeds[1])
+        print(f"{fan_2_rpm_topic}/{fan_speeds[1]}")
+        for (fan_index, stalled) in enumerate(fan_controller.get_stalled_fans()):
+            if stalled:
+                logger.warning(f"Fan {fan_index + 1} stalled")
+        if fan_temperature_controller is not None:
+            mqtt_client.try_publish(fan_control_state_topic, json.dumps(fan_temperature_controller.get_state()))
+
+    # Fan speeds are reported on fixed monotonic deadlines every loop period
+    scheduler = sample_scheduler.SampleScheduler()
+    scheduler.add_task("report", loop_period_seconds, report_fan_state)
+
+    # Infinite loop of reporting fan speeds and applying set points as soon as they arrive.
     while True:
 
         if mqtt_client.is_connected():
-            # Report fan speed
-            fan_speeds = fan_controller.get_fan_speeds()
-            mqtt_client.try_publish(fan_1_rpm_topic, fan_speeds[0])
-            print(f"{fan_1_rpm_topic}/{fan_speeds[0]}")
-            mqtt_client.try_publish(fan_2_rpm_topic, fan_speeds[1])
-            print(f"{fan_2_rpm_topic}/{fan_speeds[1]}")
-            
+            scheduler.run_pending()
+
             # Check if a new set point is availble
             sub_messages = mqtt_client.flush_subscription_topic_queue()
             for msg in sub_messages:
-                if msg.topic == fan_pwm_set_point_topic:
-                    pwm_set_point = int(msg.payload)
-                    fan_controller.set_fan_pwm(pwm_set_point)
-                    print(f"New Set Point Received = {pwm_set_point}%")
+                try:
+                    if msg.topic == fan_pwm_set_point_topic:
+                        # A PWM set point overrides local control (manual mode)
+                        pwm_set_point = int(msg.payload)
+                        if fan_temperature_controller is not None:
+                            fan_temperature_controller.set_manual_pwm(pwm_set_point)
+                        else:
+                            fan_controller.set_fan_pwm(pwm_set_point)
+                        print(f"New Set Point Received = {pwm_set_point}%")
+                    elif msg.topic == fan_target_temperature_topic and fan_temperature_controller is not None:
+                        fan_temperature_controller.set_target_temperature(float(msg.payload))
+                        print(f"New Target Temperature Received = {float(msg.payload)}F")
+                    elif msg.topic == fan_control_mode_topic and fan_temperature_controller is not None:
+                        fan_temperature_controller.set_mode(msg.payload.decode().strip().lower())
+                        print(f"New Fan Control Mode Received = {msg.payload.decode()}")
+                except ValueError as e:
+                    logger.error(f"Invalid payload {msg.payload!r} on {msg.topic}: {e}")
+
+            # Sleep until the next report, waking immediately for a new set point
+            mqtt_client.wait_for_messages(scheduler.time_until_next())
 
         else:
             mqtt_client.try_connect()
             mqtt_client.subscribe(fan_pwm_set_point_topic)
-
-        time.sleep(loop_period_seconds)
+            mqtt_client.subscribe(fan_target_temperature_topic)
+            mqtt_client.subscribe(fan_control_mode_topic)
+            time.sleep(loop_period_seconds)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,13 @@
 print("lettuce!")
 
-import time
 import argparse
-from board import SCL, SDA
-import busio
 
 import paho.mqtt.client as mqtt
 
 import sensors
+import i2c_bus
+import publish_policy
+import sample_scheduler
 
 '''
 Priority Development Order
@@ -23,9 +23,12 @@ class TempHumiditySensor:
     '''
     Constructor
     '''
-    def __init__(self, name : str, sensor_obj, base_mqtt_publish_topic : str):
+    def __init__(self, name : str, sensor_obj, base_mqtt_publish_topic : str,
+                 sensor_publish_policy : publish_policy.PublishPolicy = None):
         self._sensor_name = name
         self._sensor_obj = sensor_obj
+        self._publish_policy = sensor_publish_policy
+        self._publish_reason = None
         # Check if base topic has a trailing '/'
         if base_mqtt_publish_topic[-1] != "/": 
             self._base_mqtt_publish_topic = base_mqtt_publish_topic + "/"
@@ -33,14 +36,27 @@ class TempHumiditySensor:
             self._base_mqtt_publish_topic = base_mqtt_publish_topic
     
     '''
-    Update measurement from sensor (get)
+    Trigger a measurement without waiting for it
+    '''
+    def start_measurement(self) -> tuple:
+        start_okay = True
+        ret_msg = ""
+        try:
+            self._sensor_obj.start_conversion()
+        except:
+            ret_msg = "Failed to start sensor conversion"
+            start_okay = False
+        return (start_okay, ret_msg)
+
+    '''
+    Update measurement from sensor (get); collects a conversion started by start_measurement()
     '''
     def update_measurement(self) -> tuple:
         read_okay = True
         ret_msg = ""
         self._last_measurement = None
         try:
-            self._last_measurement = self._sensor_obj.read_temp_humidity()
+            self._last_measurement = self._sensor_obj.fetch_result()
         except:
             ret_msg = "Failed to read sensor"
             read_okay = False
@@ -63,6 +79,26 @@ class TempHumiditySensor:
         else:
             return self._last_measurement.to_json()
     
+    '''
+    True if the last measurement should be published (always without a publish policy)
+    '''
+    def should_publish(self) -> bool:
+        if self._publish_policy is None:
+            return True
+        self._publish_reason = self._publish_policy.check(self._publish_values())
+        return self._publish_reason is not None
+
+    '''
+    Record the last measurement as published, once it has been handed to the MQTT client
+    '''
+    def mark_published(self) -> None:
+        if self._publish_policy is not None:
+            self._publish_policy.mark_published(self._publish_values(), self._publish_reason)
+
+    def _publish_values(self) -> dict:
+        return {"temperature": self.get_last_temperature(),
+                "humidity": self.get_last_humidity()}
+
     def get_last_temperature(self) -> float:
         if self._last_measurement is None:
             return float("NaN")
@@ -89,19 +125,31 @@ class LettuceMonitor:
     _sensors = list()
 
     '''
-    Initialize the Lettuce Monitor object
+    Initialize the Lettuce Monitor object. Each sensor is published only when its
+    temperature (F) or humidity (%) moved past the deadband since its last publish,
+    or after heartbeat_seconds without one.
     '''
-    def __init__(self):
+    def __init__(self,
+                 temperature_deadband : float = 0.5,
+                 humidity_deadband : float = 1.0,
+                 heartbeat_seconds : float = 300,
+                 min_interval_seconds : float = 0.0):
         
         # I2C Bus
-        i2c = busio.I2C(SCL, SDA)
+        i2c = i2c_bus.get_i2c()
 
         # Create Sensor Objects for Temp / Humidity
         mqtt_base_topic = "lettuce_box/"
-        self._sensors.append(TempHumiditySensor("Seedling Box", sensors.sht31(i2c, 0x44), mqtt_base_topic))
-        self._sensors.append(TempHumiditySensor("Main Box", sensors.sht31(i2c, 0x45), mqtt_base_topic))
-        self._sensors.append(TempHumiditySensor("Room", sensors.hts221(i2c, 0x59), mqtt_base_topic))
-        self._sensors.append(TempHumiditySensor("Water", sensors.mcp3421Thermistor(i2c, 0x68), mqtt_base_topic))
+        sensor_objs = [("Seedling Box", sensors.sht31(i2c, 0x44)),
+                       ("Main Box", sensors.sht31(i2c, 0x45)),
+                       ("Room", sensors.hts221(i2c, 0x59)),
+                       ("Water", sensors.mcp3421Thermistor(i2c, 0x68))]
+        for (name, sensor_obj) in sensor_objs:
+            sensor_publish_policy = publish_policy.PublishPolicy({"temperature": publish_policy.FieldDeadband(temperature_deadband),
+                                                                  "humidity": publish_policy.FieldDeadband(humidity_deadband)},
+                                                                 heartbeat_seconds,
+                                                                 min_interval_seconds)
+            self._sensors.append(TempHumiditySensor(name, sensor_obj, mqtt_base_topic, sensor_publish_policy))
 
         # Create MQTT Client
         self._mqtt_client = mqtt.Client()
@@ -111,11 +159,17 @@ class LettuceMonitor:
         self._mqtt_client.loop_start()
     
     '''
-    Read all the configured sensors and store results in memory
+    Read all the configured sensors and store results in memory.
+    Every conversion is started before any is collected.
     '''
     def read_sensors(self) -> tuple:
         all_read_okay = True
         all_ret_msg = ""
+        # Trigger all conversions
+        for sensor in self._sensors:
+            (start_okay, ret_msg) = sensor.start_measurement()
+            if start_okay == False:
+                return (False, f"Failed to start measurement of {sensor}")
         # Temp / Humidity Sensor
         for sensor in self._sensors:
             (read_okay, ret_msg) = sensor.update_measurement()
@@ -126,17 +180,22 @@ class LettuceMonitor:
         return (all_read_okay, all_ret_msg)
     
     '''
-    Publish all the sensor data to the network.
+    Publish the sensor data that changed significantly (or is due a heartbeat) to the network.
     '''
     def publish_sensor_data(self) -> tuple:
         all_read_okay = True
         all_ret_msg = ""
         for sensor in self._sensors:
-            if self._mqtt_client is not None:
-                self._mqtt_client.publish(sensor.get_mqtt_publish_topic(), 
-                                          sensor.get_mqtt_measurement_string(), 
-                                          0, 
-                                          True)
+            if self._mqtt_client is not None and sensor.should_publish():
+                mqtt_msg_info = self._mqtt_client.publish(sensor.get_mqtt_publish_topic(), 
+                                                          sensor.get_mqtt_measurement_string(), 
+                                                          0, 
+                                                          True)
+                if mqtt_msg_info.rc != 0:
+                    # Not handed off (e.g. disconnected); the next cycle tries again
+                    print(f"publish_sensor_data: {sensor.get_mqtt_publish_topic()} not published (rc={mqtt_msg_info.rc})")
+                    continue
+                sensor.mark_published()
                 print(f"publish_sensor_data: {sensor.get_mqtt_publish_topic()}/{sensor.get_mqtt_measurement_string()}")
         return (all_read_okay, all_ret_msg)
     
@@ -172,21 +231,24 @@ if __name__ == '__main__':
     # Process Init
     lettuce = LettuceMonitor()
 
-    # Process Loop
-    for loop_index in range(loop_count):
+    def read_and_publish():
         # Read the sensors
         (read_sensor_okay, err_msg) = lettuce.read_sensors()
         if not read_sensor_okay:
             print(err_msg)
-            continue
+            return
 
         # MQTT Publish
         (publish_sensor_okay, err_msg) = lettuce.publish_sensor_data()
         if not publish_sensor_okay:
             print(err_msg)
-            continue
 
-        # Sleep
-        if loop_period_seconds > 0:
-            time.sleep(loop_period_seconds)
+    # Process Loop - on fixed monotonic deadlines, so read / publish time does not stretch the period
+    if loop_period_seconds is None or loop_period_seconds <= 0:
+        for loop_index in range(loop_count):
+            read_and_publish()
+    else:
+        scheduler = sample_scheduler.SampleScheduler()
+        loop_task = scheduler.add_task("read_and_publish", loop_period_seconds, read_and_publish)
+        scheduler.run_forever(should_stop=lambda: loop_task.run_count + loop_task.error_count >= loop_count)
     
\ No newline at end of file
@@ -1,7 +1,13 @@
 from enum import IntEnum
 from datetime import datetime
+import atexit
+import gzip
 import os
+import shutil
+import queue
 import sys
+import threading
+import time
 # Fixed multi-threading bug by using os.write instead of print
 # Ref: https://stackoverflow.com/questions/75367828/runtimeerror-reentrant-call-inside-io-bufferedwriter-name-stdout
 
@@ -23,52 +29,364 @@ class MessageLevel(IntEnum):
     ERROR = 4
     FATAL = 5
 
+_LEVEL_NAMES = {MessageLevel.TRACE: 'TRACE',
+                MessageLevel.DEBUG: 'DEBUG',
+                MessageLevel.INFO: 'INFO',
+                MessageLevel.WARN: 'WARN',
+                MessageLevel.ERROR: 'ERROR',
+                MessageLevel.FATAL: 'FATAL'}
+
+class StreamSink:
+    '''
+    Writes log text to a file descriptor (stdout by default)
+    '''
+    def __init__(self, fd : int = None) -> None:
+        self._fd = fd if fd is not None else sys.stdout.fileno()
+
+    def write(self, text : str) -> None:
+        data = text.encode('utf8')
+        while data:
+            written = os.write(self._fd, data)
+            data = data[written:]
+
+    def close(self) -> None:
+        pass
+
+class RotatingFileSink:
+    '''
+    Appends log text to a file and rotates it when it would exceed max_bytes or
+    is older than rotate_interval_seconds. Rotated files are kept as
+    <file>.1[.gz] (newest) ... <file>.<backup_count>[.gz]; older ones are deleted.
+    '''
+    def __init__(self,
+                 file_path : str,
+                 max_bytes : int = 1048576,
+                 rotate_interval_seconds : float = None,
+                 backup_count : int = 5,
+                 compress : bool = True) -> None:
+        if max_bytes <= 0 or backup_count < 0:
+            raise ValueError(f"Invalid log rotation settings: max_bytes={max_bytes}, backup_count={backup_count}")
+        self.file_path = file_path
+        self._max_bytes = max_bytes
+        self._rotate_interval_seconds = rotate_interval_seconds
+        self._backup_count = backup_count
+        self._compress = compress
+        folder_path = os.path.dirname(file_path)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+        self._open()
+
+    def write(self, text : str) -> None:
+        data = text.encode('utf8')
+        if self._size > 0 and (self._size + len(data) > self._max_bytes or self._rotation_due()):
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _open(self) -> None:
+        self._file = open(self.file_path, 'ab')
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _rotation_due(self) -> bool:
+        return self._rotate_interval_seconds is not None and time.time() - self._opened_at >= self._rotate_interval_seconds
+
+    def _archive_path(self, index : int) -> str:
+        suffix = ".gz" if self._compress else ""
+        return f"{self.file_path}.{index}{suffix}"
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self._backup_count == 0:
+            os.remove(self.file_path)
+        else:
+            if os.path.exists(self._archive_path(self._backup_count)):
+                os.remove(self._archive_path(self._backup_count))
+            for index in range(self._backup_count - 1, 0, -1):
+                if os.path.exists(self._archive_path(index)):
+                    os.replace(self._archive_path(index), self._archive_path(index + 1))
+            if self._compress:
+                with open(self.file_path, 'rb') as source, gzip.open(self._archive_path(1), 'wb') as archive:
+                    shutil.copyfileobj(source, archive)
+                os.remove(self.file_path)
+            else:
+                os.replace(self.file_path, self._archive_path(1))
+        self._open()
+
+class FloodSuppressor:
+    '''
+    Drops repeats of a message (same key, level and text) within
+    duplicate_window_seconds, and messages of a key beyond max_messages_per_key
+    per rate_window_seconds. When a window closes with anything suppressed a
+    summary line is produced instead (see collect_summaries()).
+    Thread-safe: a synchronous Logger calls it from every logging thread.
+    '''
+    def __init__(self,
+                 duplicate_window_seconds : float = 60.0,
+                 max_messages_per_key : int = None,
+                 rate_window_seconds : float = 60.0,
+                 clock=time.monotonic) -> None:
+        self._duplicate_window_seconds = duplicate_window_seconds
+        self._max_messages_per_key = max_messages_per_key
+        self._rate_window_seconds = rate_window_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (key, level, text) -> [window start, suppressed count]
+        self._recent_messages = dict()
+        # key -> [window start, message count, suppressed count]
+        self._key_rates = dict()
+        self.suppressed_count = 0
+
+    '''
+    Returns True if the message should be written
+    '''
+    def allow(self, key, level, text : str) -> bool:
+        with self._lock:
+            return self._allow_locked(key, level, text)
+
+    '''
+    Close expired windows; returns summary (key, level, text) tuples for those that suppressed messages
+    '''
+    def collect_summaries(self) -> list:
+        with self._lock:
+            return self._collect_summaries_locked()
+
+    # Caller holds self._lock
+    def _allow_locked(self, key, level, text : str) -> bool:
+        now = self._clock()
+        if self._duplicate_window_seconds > 0:
+            message_id = (key, level, text)
+            recent = self._recent_messages.get(message_id)
+            if recent is not None and now - recent[0] < self._duplicate_window_seconds:
+                recent[1] += 1
+                self.suppressed_count += 1
+                return False
+            if recent is None:
+                self._recent_messages[message_id] = [now, 0]
+        if self._max_messages_per_key is not None:
+            rate = self._key_rates.get(key)
+            if rate is None:
+                rate = [now, 0, 0]
+                self._key_rates[key] = rate
+            if rate[1] >= self._max_messages_per_key and now - rate[0] < self._rate_window_seconds:
+                rate[2] += 1
+                self.suppressed_count += 1
+                return False
+            rate[1] += 1
+        return True
+
+    # Caller holds self._lock
+    def _collect_summaries_locked(self) -> list:
+        now = self._clock()
+        summaries = list()
+        for message_id, (window_start, suppressed) in list(self._recent_messages.items()):
+            if now - window_start >= self._duplicate_window_seconds:
+                del self._recent_messages[message_id]
+                if suppressed > 0:
+                    (key, level, text) = message_id
+                    summaries.append((key, level, f"Previous message repeated {suppressed} times in {now - window_start:.0f}s: {text}"))
+        for key, rate in list(self._key_rates.items()):
+            if now - rate[0] >= self._rate_window_seconds:
+                del self._key_rates[key]
+                if rate[2] > 0:
+                    summaries.append((key, MessageLevel.WARN, f"Rate limited: {rate[2]} messages suppressed in {now - rate[0]:.0f}s"))
+        return summaries
+
+'''
+Close sinks, ignoring errors (used when sinks are replaced or discarded)
+'''
+def close_sinks(sinks : list) -> None:
+    for sink in sinks:
+        try:
+            sink.close()
+        except Exception:
+            pass
+
 class Logger:
     
     '''
     Create a logger object with a specific log level and mute list.
+    Messages are queued and formatted / written in batches by a background
+    thread (asynchronous=False writes on the calling thread). When the queue
+    is full new messages are dropped and counted.
+    Output goes to the sinks (stdout by default), optionally through a FloodSuppressor.
     '''
     def __init__(self, 
                  log_level = MessageLevel.INFO, 
-                 mute_keys = []) -> None:
+                 mute_keys = None,
+                 asynchronous : bool = True,
+                 max_queue_size : int = 10000,
+                 max_batch_size : int = 256,
+                 sinks : list = None,
+                 flood_suppressor : FloodSuppressor = None) -> None:
         self._msg_count = 0
         self.log_level = log_level
-        self._mute_list = []
-        #self._mute_list.append("h2music")
-        #self._mute_list.append("audio_driver")
-        self._mute_list.append("md2a_model")
-        self._mute_list.append(mute_keys)
-        pass
+        self._mute_list = set()
+        #self._mute_list.add("h2music")
+        #self._mute_list.add("audio_driver")
+        self._mute_list.add("md2a_model")
+        if mute_keys is not None:
+            self._mute_list.update(mute_keys)
+        self.dropped_count = 0
+        self._reported_dropped_count = 0
+        self._max_batch_size = max_batch_size
+        self._sinks = sinks if sinks is not None else [StreamSink()]
+        # Held while writing to the sinks and while configure() replaces / closes them
+        self._sinks_lock = threading.Lock()
+        self._flood_suppressor = flood_suppressor
+        self._queue = None
+        self._writer_thread = None
+        if asynchronous:
+            self._queue = queue.Queue(max_queue_size)
+            self._writer_thread = threading.Thread(target=self._writer_thread_main, name="logger", daemon=True)
+            self._writer_thread.start()
+            # Do not lose queued messages at interpreter exit
+            atexit.register(self.flush)
+
+    def mute(self, key) -> None:
+        self._mute_list.add(key)
+
+    def unmute(self, key) -> None:
+        self._mute_list.discard(key)
+
+    '''
+    Apply a compiled "logging" config section (config.LoggingConfig): console, file,
+    max_bytes, rotate_interval_seconds, backup_count, compress, duplicate_window_seconds,
+    max_messages_per_key, rate_window_seconds
+    '''
+    def configure(self, logging_config) -> None:
+        self.set_sinks(*self.create_sinks(logging_config))
+
+    '''
+    Build the (sinks, flood suppressor) of a "logging" config section without installing them
+    '''
+    @staticmethod
+    def create_sinks(logging_config) -> tuple:
+        sinks = list()
+        if logging_config.console:
+            sinks.append(StreamSink())
+        if logging_config.file:
+            sinks.append(RotatingFileSink(logging_config.file,
+                                          logging_config.max_bytes,
+                                          logging_config.rotate_interval_seconds,
+                                          logging_config.backup_count,
+                                          logging_config.compress))
+        flood_suppressor = None
+        if logging_config.duplicate_window_seconds or logging_config.max_messages_per_key:
+            flood_suppressor = FloodSuppressor(logging_config.duplicate_window_seconds or 0,
+                                               logging_config.max_messages_per_key,
+                                               logging_config.rate_window_seconds)
+        return (sinks, flood_suppressor)
+
+    '''
+    Replace the sinks and flood suppressor; the previous sinks are closed
+    '''
+    def set_sinks(self, sinks : list, flood_suppressor : FloodSuppressor = None) -> None:
+        # No flush(): the lock keeps the writer off the sinks being replaced, and waiting
+        # for an empty queue could stall the caller while other threads keep logging
+        with self._sinks_lock:
+            old_sinks = self._sinks
+            self._sinks = sinks
+            self._flood_suppressor = flood_suppressor
+            close_sinks(old_sinks)
 
     '''
     Write a message to the log.
+    msg is formatted only if the message passes the level and mute checks:
+    with args it is a %-format string (msg % args), or a callable returning
+    the text (msg(*args)).
     '''
-    def write(self, key, msg, level = MessageLevel.INFO) -> None:
-        # Step 0 - Short-circuit if the message is muted
+    def write(self, key, msg, level = MessageLevel.INFO, *args) -> None:
+        # Step 0 - Short-circuit if the message is filtered; nothing is formatted
+        if (level < self.log_level):
+            return
         if (key in self._mute_list):
             return
-        if (level < self.log_level):
+        self._msg_count += 1
+        record = (time.time(), key, level, msg, args)
+        # Step 1 - Hand the message to the writer thread
+        if self._queue is None:
+            self._write_batch([record])
             return
-        # Step 1 - Write the message
-        level_str = ""
-        if (level == MessageLevel.TRACE):
-            level_str = 'TRACE'
-        elif (level == MessageLevel.DEBUG):
-            level_str = 'DEBUG'
-        elif (level == MessageLevel.INFO):
-            level_str = 'INFO'
-        elif (level == MessageLevel.WARN):
-            level_str = 'WARN'
-        elif (level == MessageLevel.ERROR):
-            level_str = 'ERROR'
-        elif (level == MessageLevel.FATAL):
-            level_str = 'FATAL'
-        else:
-            level_str = 'UNKNOWN'
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_count += 1
+            return
+        if level >= MessageLevel.FATAL:
+            self.flush()
+
+    '''
+    Block until every queued message has been written
+    '''
+    def flush(self) -> None:
+        if self._queue is not None and self._writer_thread.is_alive():
+            self._queue.join()
+
+    '''
+    Background writer: drain the queue and write each batch to the sinks at once.
+    Wakes up periodically while idle so suppression summaries are not held back.
+    '''
+    def _writer_thread_main(self) -> None:
+        while True:
+            try:
+                batch = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                batch = list()
+            while len(batch) < self._max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            task_count = len(batch)
+            dropped = self.dropped_count - self._reported_dropped_count
+            if dropped > 0:
+                self._reported_dropped_count += dropped
+                batch.append((time.time(), "logger", MessageLevel.WARN, "%d messages dropped (log queue full)", (dropped,)))
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in range(task_count):
+                    self._queue.task_done()
+
+    def _write_batch(self, batch : list) -> None:
+        lines = list()
+        flood_suppressor = self._flood_suppressor
+        if flood_suppressor is not None:
+            for (key, level, text) in flood_suppressor.collect_summaries():
+                lines.append(self._format_line(time.time(), key, level, text))
+        for (timestamp, key, level, msg, args) in batch:
+            try:
+                if callable(msg):
+                    msg = msg(*args)
+                elif args:
+                    msg = msg % args
+            except Exception as e:
+                msg = f"<log message formatting failed: {e!r}>"
+            msg = str(msg)
+            if flood_suppressor is not None and not flood_suppressor.allow(key, level, msg):
+                continue
+            lines.append(self._format_line(timestamp, key, level, msg))
+        if len(lines) == 0:
+            return
+        text = "".join(lines)
+        with self._sinks_lock:
+            for sink in self._sinks:
+                # A failing sink must not take down the writer thread or the other sinks
+                try:
+                    sink.write(text)
+                except Exception:
+                    pass
+
+    def _format_line(self, timestamp : float, key, level, msg : str) -> str:
         # Format
         # [DateTime][key][level]{message} 
-        header = "[{0}][{1}][{2}]".format(datetime.now(),
+        header = "[{0}][{1}][{2}]".format(datetime.fromtimestamp(timestamp),
                                             key,
-                                            level_str).ljust(60)
+                                            _LEVEL_NAMES.get(level, 'UNKNOWN')).ljust(60)
         #print(header + msg)
-        os.write(sys.stdout.fileno(), (header + msg + "\n").encode('utf8'))
\ No newline at end of file
+        return header + msg + "\n"
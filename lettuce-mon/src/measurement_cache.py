@@ -0,0 +1,119 @@
+'''
+Measurement cache: lets every consumer of a sensor (console, display, MQTT,
+calibration callbacks) share one physical read.
+
+Each sensor key has a time-to-live; a get() within the TTL returns the cached
+value. Reads are de-duplicated while in flight: a thread asking for a key that
+another thread is already reading waits for that read instead of issuing its own.
+'''
+import threading
+import time
+
+
+class _Flight:
+    '''
+    One physical read in progress; waiters block on done
+    '''
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _CacheEntry:
+    def __init__(self, read_fn, ttl_seconds : float) -> None:
+        self.read_fn = read_fn
+        self.ttl_seconds = ttl_seconds
+        self.value = None
+        self.timestamp = None
+        self.flight = None
+        self.hit_count = 0
+        self.read_count = 0
+        self.coalesced_count = 0
+
+
+class MeasurementCache:
+    '''
+    Thread-safe per-sensor measurement cache with TTL and in-flight de-duplication.
+    '''
+    def __init__(self, clock=time.monotonic) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = dict()
+
+    '''
+    Register a sensor key with the function performing a physical read
+    '''
+    def register(self, key : str, read_fn, ttl_seconds : float) -> None:
+        if ttl_seconds < 0:
+            raise ValueError(f"TTL for '{key}' must not be negative: {ttl_seconds}")
+        with self._lock:
+            self._entries[key] = _CacheEntry(read_fn, ttl_seconds)
+
+    '''
+    Return the cached value if younger than the TTL, otherwise read the sensor
+    '''
+    def get(self, key : str):
+        with self._lock:
+            entry = self._entries[key]
+            if entry.timestamp is not None and self._clock() - entry.timestamp <= entry.ttl_seconds:
+                entry.hit_count += 1
+                return entry.value
+        return self.refresh(key)
+
+    '''
+    Force a physical read (or join the one already in flight) and cache the result.
+    read_fn overrides the registered read function, e.g. to collect a split-phase
+    conversion that was already triggered.
+    '''
+    def refresh(self, key : str, read_fn=None):
+        with self._lock:
+            entry = self._entries[key]
+            flight = entry.flight
+            if flight is not None:
+                entry.coalesced_count += 1
+                owner = False
+            else:
+                flight = _Flight()
+                entry.flight = flight
+                owner = True
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = (read_fn if read_fn is not None else entry.read_fn)()
+        except Exception as e:
+            flight.error = e
+        with self._lock:
+            entry.flight = None
+            entry.read_count += 1
+            # Failed reads (exception or None) are never cached
+            if flight.error is None and flight.value is not None:
+                entry.value = flight.value
+                entry.timestamp = self._clock()
+        flight.done.set()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    '''
+    Return the cached value regardless of age without touching the sensor (None if never read)
+    '''
+    def peek(self, key : str):
+        with self._lock:
+            return self._entries[key].value
+
+    def invalidate(self, key : str) -> None:
+        with self._lock:
+            self._entries[key].timestamp = None
+
+    '''
+    Returns {key: (hits, physical reads, coalesced waits)}
+    '''
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {key: (entry.hit_count, entry.read_count, entry.coalesced_count)
+                    for key, entry in self._entries.items()}
@@ -0,0 +1,154 @@
+'''
+MQTT connection supervisor: owns the paho client on a background thread so
+that publishers never block on DNS, TCP connect or reconnect back-off.
+'''
+import random
+import threading
+
+import paho.mqtt.client as mqtt
+
+import logger
+
+
+class MqttConnectionSupervisor:
+    '''
+    Connects, runs the network loop and reconnects with jittered exponential
+    back-off, all on its own thread. connected is a threading.Event reflecting
+    the broker connection state; publish() drops the message (returns None)
+    while disconnected instead of waiting.
+    '''
+    def __init__(self,
+                 server_url : str,
+                 server_port : int,
+                 app_logger : logger.Logger,
+                 keepalive_seconds : int = 60,
+                 reconnect_min_seconds : float = 1.0,
+                 reconnect_max_seconds : float = 60.0,
+                 jitter_fraction : float = 0.5,
+                 on_publish=None) -> None:
+        if reconnect_min_seconds <= 0 or reconnect_max_seconds < reconnect_min_seconds:
+            raise ValueError(f"Invalid reconnect back-off range: {reconnect_min_seconds} - {reconnect_max_seconds}")
+        self._server_url = server_url
+        self._server_port = server_port
+        self._app_logger = app_logger
+        self._log_key = "mqtt"
+        self._keepalive_seconds = keepalive_seconds
+        self._reconnect_min_seconds = reconnect_min_seconds
+        self._reconnect_max_seconds = reconnect_max_seconds
+        self._jitter_fraction = jitter_fraction
+        self._on_publish = on_publish
+        self._client = None
+        self._failed_attempts = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.connected = threading.Event()
+        self.connect_count = 0
+        self.disconnect_count = 0
+
+    '''
+    Start the supervisor thread; returns immediately
+    '''
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._supervisor_thread, name="mqtt-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout : float = 5.0) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_connected(self) -> bool:
+        return self.connected.is_set()
+
+    '''
+    Block until connected or timeout; returns the connection state
+    '''
+    def wait_connected(self, timeout : float = None) -> bool:
+        return self.connected.wait(timeout)
+
+    '''
+    Queue a message if connected; returns the paho MQTTMessageInfo, or None if disconnected
+    '''
+    def publish(self, topic : str, payload, qos : int = 0, retain : bool = False):
+        client = self._client
+        if client is None or not self.connected.is_set():
+            return None
+        return client.publish(topic, payload, qos, retain)
+
+    '''
+    Back-off before the next connect attempt: exponential in the number of
+    consecutive failures, capped, with the top jitter_fraction randomized
+    '''
+    def next_backoff_seconds(self) -> float:
+        exponent = min(self._failed_attempts, 32)
+        delay = min(self._reconnect_max_seconds, self._reconnect_min_seconds * (2 ** exponent))
+        return delay * (1.0 - self._jitter_fraction * random.random())
+
+    ''' ------ Private Functions ------'''
+    def _supervisor_thread(self) -> None:
+        while not self._stop_event.is_set():
+            if self._client is None and not self._connect():
+                self._back_off()
+                continue
+            # Network loop; returns quickly when publishers queue data
+            rc = self._client.loop(timeout=1.0)
+            if rc != mqtt.MQTT_ERR_SUCCESS:
+                self._connection_lost(rc)
+                self._back_off()
+        self._close_client()
+
+    def _connect(self) -> bool:
+        client_id = f'python-mqtt-{random.randint(0, 1000)}'
+        try:
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id)
+            client.on_connect = self._mqtt_on_connect
+            client.on_disconnect = self._mqtt_on_disconnect
+            if self._on_publish is not None:
+                client.on_publish = self._on_publish
+            mqtt_conn_code = client.connect(self._server_url, self._server_port, self._keepalive_seconds)
+        except Exception as e:
+            self._failed_attempts += 1
+            self._app_logger.write(self._log_key, f"Unable to connect to MQTT Broker {self._server_url}:{self._server_port}: {e}", logger.MessageLevel.ERROR)
+            return False
+        self._app_logger.write(self._log_key, f"MQTT Client Connect Code: {mqtt_conn_code}", logger.MessageLevel.INFO)
+        self._client = client
+        return True
+
+    def _connection_lost(self, rc : int) -> None:
+        self._app_logger.write(self._log_key, f"MQTT network loop failed (rc={rc}); reconnecting.", logger.MessageLevel.WARN)
+        self._failed_attempts += 1
+        self._close_client()
+
+    def _close_client(self) -> None:
+        self.connected.clear()
+        client = self._client
+        self._client = None
+        if client is not None:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def _back_off(self) -> None:
+        delay = self.next_backoff_seconds()
+        self._app_logger.write(self._log_key, f"Reconnecting to MQTT Broker in {delay:.1f}s", logger.MessageLevel.INFO)
+        self._stop_event.wait(delay)
+
+    '''
+    The callback for when the client receives a CONNACK response from the server.
+    '''
+    def _mqtt_on_connect(self, client, userdata, flags, rc):
+        self._app_logger.write(self._log_key, "Connected with result code "+str(rc), logger.MessageLevel.INFO)
+        if rc == 0:
+            self._failed_attempts = 0
+            self.connect_count += 1
+            self.connected.set()
+
+    def _mqtt_on_disconnect(self, client, userdata, rc):
+        self._app_logger.write(self._log_key, "Disconnected with result code "+str(rc), logger.MessageLevel.WARN)
+        self.disconnect_count += 1
+        self.connected.clear()
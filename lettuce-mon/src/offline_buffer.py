@@ -0,0 +1,234 @@
+'''
+Store-and-forward buffer: a bounded, memory-mapped, crash-safe FIFO of MQTT
+messages that could not be published, kept on disk so that history survives
+broker outages and restarts.
+
+File layout:
+    [header slot A][header slot B][data ring ............................]
+Each header slot holds the ring state (head / tail byte counters, record
+count) with a sequence number and CRC. State changes are committed by
+flushing the data first and then writing the next slot, so a torn write
+leaves the previous slot valid. Records are [length][crc32][topic \\0 payload].
+When the ring is full the oldest records are evicted.
+'''
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+
+class OfflineBuffer:
+    '''
+    Bounded on-disk FIFO of (topic, payload) pairs. Payloads are text or binary
+    (see payload_codec); text is stored UTF-8 encoded and comes back as bytes.
+    '''
+    _MAGIC = b"LMOB"
+    _VERSION = 1
+    # magic, version, reserved, sequence, head, tail, record count, capacity
+    _HEADER_FORMAT = struct.Struct("<4sHHQQQII")
+    _HEADER_CRC_FORMAT = struct.Struct("<I")
+    _HEADER_SLOT_SIZE = 64
+    _DATA_OFFSET = 2 * _HEADER_SLOT_SIZE
+    # payload length, payload crc32
+    _RECORD_HEADER_FORMAT = struct.Struct("<II")
+
+    def __init__(self, file_path : str, capacity_bytes : int = 1048576) -> None:
+        if capacity_bytes <= self._RECORD_HEADER_FORMAT.size:
+            raise ValueError(f"Offline buffer capacity too small: {capacity_bytes}")
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._head = 0
+        self._tail = 0
+        self._count = 0
+        self.evicted_count = 0
+        self.damaged_count = 0
+        folder_path = os.path.dirname(file_path)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+        file_size = self._DATA_OFFSET + capacity_bytes
+        self._file = open(file_path, "a+b")
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() != file_size:
+            # New file or capacity changed - start empty
+            self._file.truncate(file_size)
+            fresh = True
+        else:
+            fresh = False
+        self._capacity = capacity_bytes
+        self._mm = mmap.mmap(self._file.fileno(), file_size)
+        if fresh or not self._load_header():
+            self._commit_header()
+        else:
+            self._recover_records()
+
+    def __len__(self) -> int:
+        return self._count
+
+    '''
+    Bytes of the data ring in use
+    '''
+    def used_bytes(self) -> int:
+        return self._tail - self._head
+
+    '''
+    Append a message, evicting the oldest ones if the ring is full; returns the number evicted
+    '''
+    def append(self, topic : str, payload) -> int:
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        record_payload = topic.encode("utf-8") + b"\x00" + payload
+        record_size = self._RECORD_HEADER_FORMAT.size + len(record_payload)
+        if record_size > self._capacity:
+            raise ValueError(f"Message of {record_size} bytes exceeds offline buffer capacity {self._capacity}")
+        with self._lock:
+            evicted = 0
+            while self._tail - self._head + record_size > self._capacity:
+                self._head += self._record_size_at(self._head)
+                self._count -= 1
+                evicted += 1
+            if evicted > 0:
+                # Release the evicted space before overwriting it
+                self._commit_header()
+                self.evicted_count += evicted
+            record_header = self._RECORD_HEADER_FORMAT.pack(len(record_payload), zlib.crc32(record_payload))
+            self._write_ring(self._tail, record_header + record_payload)
+            self._mm.flush()
+            self._tail += record_size
+            self._count += 1
+            self._commit_header()
+            return evicted
+
+    '''
+    Oldest (topic, payload bytes) without removing it, or None if empty.
+    Damaged records at the head are dropped (counted in damaged_count).
+    '''
+    def peek(self):
+        with self._lock:
+            while self._count > 0:
+                record_payload = self._read_record_payload(self._head)
+                if record_payload is not None:
+                    topic, payload = record_payload.split(b"\x00", 1)
+                    return (topic.decode("utf-8"), payload)
+                self._drop_damaged_head()
+            return None
+
+    '''
+    Remove the oldest message (after it has been published)
+    '''
+    def pop(self) -> None:
+        with self._lock:
+            if self._count == 0:
+                return
+            self._head += self._record_size_at(self._head)
+            self._count -= 1
+            if self._count == 0:
+                self._head = self._tail
+            self._commit_header()
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+            self._file.close()
+
+    ''' ------ Private Functions ------'''
+    '''
+    Load the newest valid header slot; False if neither slot is valid
+    '''
+    def _load_header(self) -> bool:
+        best = None
+        for slot in range(2):
+            offset = slot * self._HEADER_SLOT_SIZE
+            header_bytes = self._mm[offset:offset + self._HEADER_FORMAT.size]
+            (stored_crc,) = self._HEADER_CRC_FORMAT.unpack_from(self._mm, offset + self._HEADER_FORMAT.size)
+            if zlib.crc32(header_bytes) != stored_crc:
+                continue
+            magic, version, _, sequence, head, tail, count, capacity = self._HEADER_FORMAT.unpack(header_bytes)
+            if magic != self._MAGIC or version != self._VERSION or capacity != self._capacity:
+                continue
+            if tail < head or tail - head > capacity:
+                continue
+            if best is None or sequence > best[0]:
+                best = (sequence, head, tail, count)
+        if best is None:
+            return False
+        self._sequence, self._head, self._tail, self._count = best
+        return True
+
+    '''
+    Write the ring state to the next header slot and flush it
+    '''
+    def _commit_header(self) -> None:
+        self._sequence += 1
+        header_bytes = self._HEADER_FORMAT.pack(self._MAGIC, self._VERSION, 0, self._sequence,
+                                                self._head, self._tail, self._count, self._capacity)
+        offset = (self._sequence % 2) * self._HEADER_SLOT_SIZE
+        self._mm[offset:offset + self._HEADER_FORMAT.size] = header_bytes
+        self._HEADER_CRC_FORMAT.pack_into(self._mm, offset + self._HEADER_FORMAT.size, zlib.crc32(header_bytes))
+        self._mm.flush(0, min(mmap.PAGESIZE, len(self._mm)))
+
+    '''
+    Validate every committed record; truncate at the first damaged one
+    '''
+    def _recover_records(self) -> None:
+        position = self._head
+        count = 0
+        while position < self._tail:
+            record_size = self._record_size_at(position)
+            if position + record_size > self._tail or self._read_record_payload(position) is None:
+                break
+            position += record_size
+            count += 1
+        if position != self._tail or count != self._count:
+            self._tail = position
+            self._count = count
+            self._commit_header()
+
+    '''
+    Drop the record at the head whose CRC does not match. If its length is damaged
+    too the following records cannot be located, so the rest of the ring is dropped.
+    '''
+    def _drop_damaged_head(self) -> None:
+        record_size = self._record_size_at(self._head)
+        if self._count > 1 and self._head + record_size < self._tail:
+            self._head += record_size
+            self._count -= 1
+            self.damaged_count += 1
+        else:
+            self.damaged_count += self._count
+            self._head = self._tail
+            self._count = 0
+        self._commit_header()
+
+    def _record_size_at(self, position : int) -> int:
+        length, _ = self._RECORD_HEADER_FORMAT.unpack(self._read_ring(position, self._RECORD_HEADER_FORMAT.size))
+        return self._RECORD_HEADER_FORMAT.size + length
+
+    '''
+    Payload of the record at position, or None if its CRC does not match
+    '''
+    def _read_record_payload(self, position : int):
+        length, crc = self._RECORD_HEADER_FORMAT.unpack(self._read_ring(position, self._RECORD_HEADER_FORMAT.size))
+        if length > self._capacity:
+            return None
+        record_payload = self._read_ring(position + self._RECORD_HEADER_FORMAT.size, length)
+        if zlib.crc32(record_payload) != crc:
+            return None
+        return record_payload
+
+    def _read_ring(self, position : int, length : int) -> bytes:
+        start = self._DATA_OFFSET + position % self._capacity
+        first = min(length, self._DATA_OFFSET + self._capacity - start)
+        data = self._mm[start:start + first]
+        if first < length:
+            data += self._mm[self._DATA_OFFSET:self._DATA_OFFSET + length - first]
+        return data
+
+    def _write_ring(self, position : int, data : bytes) -> None:
+        start = self._DATA_OFFSET + position % self._capacity
+        first = min(len(data), self._DATA_OFFSET + self._capacity - start)
+        self._mm[start:start + first] = data[:first]
+        if first < len(data):
+            self._mm[self._DATA_OFFSET:self._DATA_OFFSET + len(data) - first] = data[first:]
@@ -0,0 +1,285 @@
+'''
+MQTT payload codecs for sensor samples, selectable per topic (mqtt.payload_codecs).
+
+    json    text, {"timestamp_iso": ..., <fields>} - the historical format (default)
+    cbor    binary CBOR map (RFC 8949), {"timestamp_ms": <epoch ms>, <fields>}
+    struct  fixed layout: [magic "LM"][schema version u16][epoch ms i64][one float32 per schema field]
+            little endian, NaN for a missing value. Only the schema fields are carried
+            (no window stats); the smallest and cheapest to encode.
+
+Every codec has encode(values, timestamp) -> payload and decode(payload) -> (timestamp, values),
+timestamp in epoch seconds. decode_payload() recognizes the format of a received payload,
+so this module doubles as the decoder for consumers; it has no device dependencies.
+'''
+import collections.abc
+import datetime
+import functools
+import json
+import math
+import struct
+
+CODEC_NAMES = ("json", "cbor", "struct")
+
+
+class StructSchema:
+    '''
+    Field layout of the struct codec. A layout never changes once published:
+    adding, removing or reordering fields takes a new schema version.
+    '''
+    def __init__(self, version : int, fields : tuple) -> None:
+        if not 0 < version <= 0xFFFF:
+            raise ValueError(f"Schema version must be between 1 and 65535: {version}")
+        self.version = version
+        self.fields = tuple(fields)
+        self.values_format = struct.Struct(f"<{len(self.fields)}f")
+
+
+HYDRO_TANK_SENSOR_SCHEMA = StructSchema(1, ("water_depth", "water_depth_offset", "env_temperature_f",
+                                            "env_humidity", "water_temperature_f"))
+SYSTEM_MONITOR_SENSOR_SCHEMA = StructSchema(2, ("env_temperature_f", "env_humidity"))
+
+# Known layouts by schema version, for decoding
+STRUCT_SCHEMAS = {schema.version: schema for schema in (HYDRO_TANK_SENSOR_SCHEMA, SYSTEM_MONITOR_SENSOR_SCHEMA)}
+
+
+class JsonCodec:
+    name = "json"
+
+    def encode(self, values : dict, timestamp : float) -> str:
+        payload = {"timestamp_iso": datetime.datetime.fromtimestamp(timestamp).isoformat()}
+        payload.update(values)
+        return json.dumps(payload)
+
+    def decode(self, payload) -> tuple:
+        values = json.loads(payload)
+        timestamp = datetime.datetime.fromisoformat(values.pop("timestamp_iso")).timestamp()
+        return (timestamp, values)
+
+
+class CborCodec:
+    name = "cbor"
+
+    def encode(self, values : dict, timestamp : float) -> bytes:
+        payload = {"timestamp_ms": int(round(timestamp * 1000))}
+        payload.update(values)
+        return cbor_encode(payload)
+
+    def decode(self, payload : bytes) -> tuple:
+        values = cbor_decode(payload)
+        timestamp = values.pop("timestamp_ms") / 1000.0
+        return (timestamp, values)
+
+
+class StructCodec:
+    name = "struct"
+    MAGIC = b"LM"
+    # magic, schema version, timestamp (epoch ms)
+    _HEADER_FORMAT = struct.Struct("<2sHq")
+
+    def __init__(self, schema : StructSchema) -> None:
+        self.schema = schema
+        self._payload_format = struct.Struct(self._HEADER_FORMAT.format + schema.values_format.format[1:])
+
+    def encode(self, values : dict, timestamp : float) -> bytes:
+        nan = math.nan
+        field_values = [nan if values.get(field) is None else values[field] for field in self.schema.fields]
+        return self._payload_format.pack(self.MAGIC, self.schema.version, int(round(timestamp * 1000)), *field_values)
+
+    '''
+    Decode a payload of this codec's schema; payloads of other versions are decoded with
+    decode_payload() / StructCodec.decode_any()
+    '''
+    def decode(self, payload : bytes) -> tuple:
+        (magic, version, timestamp_ms, *field_values) = self._payload_format.unpack(payload)
+        if magic != self.MAGIC or version != self.schema.version:
+            raise ValueError(f"Not a struct payload of schema version {self.schema.version}")
+        values = {field: None if math.isnan(value) else value for (field, value) in zip(self.schema.fields, field_values)}
+        return (timestamp_ms / 1000.0, values)
+
+    @staticmethod
+    def decode_any(payload : bytes, schemas : dict = STRUCT_SCHEMAS) -> tuple:
+        (magic, version, _) = StructCodec._HEADER_FORMAT.unpack_from(payload)
+        if magic != StructCodec.MAGIC:
+            raise ValueError("Not a struct payload")
+        if version not in schemas:
+            raise ValueError(f"Unknown struct payload schema version {version}")
+        return StructCodec(schemas[version]).decode(payload)
+
+
+'''
+Codec by name; the struct codec needs the schema of the topic's samples
+'''
+def create_codec(name : str, struct_schema : StructSchema = None):
+    if name == "json":
+        return JsonCodec()
+    if name == "cbor":
+        return CborCodec()
+    if name == "struct":
+        if struct_schema is None:
+            raise ValueError("The struct payload codec needs a schema")
+        return StructCodec(struct_schema)
+    raise ValueError(f"Unknown payload codec '{name}' (use one of {list(CODEC_NAMES)})")
+
+
+'''
+Decode a received payload of any codec; returns (codec name, timestamp, values)
+'''
+def decode_payload(payload, schemas : dict = STRUCT_SCHEMAS) -> tuple:
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if payload[:1] == b"{":
+        return ("json",) + JsonCodec().decode(payload)
+    if payload[:2] == StructCodec.MAGIC:
+        return ("struct",) + StructCodec.decode_any(payload, schemas)
+    # CBOR maps start with major type 5 (0xA0 - 0xBF)
+    if len(payload) > 0 and 0xA0 <= payload[0] <= 0xBF:
+        return ("cbor",) + CborCodec().decode(payload)
+    raise ValueError("Unrecognized payload format")
+
+
+''' ------ CBOR (RFC 8949) subset: maps, arrays, text / byte strings, ints, floats, bool, null ------'''
+_CBOR_UINT16 = struct.Struct(">H")
+_CBOR_UINT32 = struct.Struct(">I")
+_CBOR_UINT64 = struct.Struct(">Q")
+_CBOR_FLOAT16 = struct.Struct(">e")
+_CBOR_FLOAT32 = struct.Struct(">f")
+_CBOR_FLOAT64 = struct.Struct(">d")
+
+
+def cbor_encode(value) -> bytes:
+    parts = []
+    _cbor_encode_item(value, parts)
+    return b"".join(parts)
+
+
+def cbor_decode(payload : bytes):
+    (value, offset) = _cbor_decode_item(memoryview(payload), 0)
+    if offset != len(payload):
+        raise ValueError(f"Trailing bytes after CBOR item at offset {offset}")
+    return value
+
+
+def _cbor_head(major : int, length : int) -> bytes:
+    if length < 24:
+        return bytes((major << 5 | length,))
+    if length < 0x100:
+        return bytes((major << 5 | 24, length))
+    if length < 0x10000:
+        return bytes((major << 5 | 25,)) + _CBOR_UINT16.pack(length)
+    if length < 0x100000000:
+        return bytes((major << 5 | 26,)) + _CBOR_UINT32.pack(length)
+    if length < 0x10000000000000000:
+        return bytes((major << 5 | 27,)) + _CBOR_UINT64.pack(length)
+    raise ValueError(f"Integer too large for CBOR: {length}")
+
+
+def _cbor_encode_item(value, parts : list) -> None:
+    # Exact type checks first (the common case); bool before int, it is an int subclass
+    value_type = type(value)
+    if value_type is float:
+        parts.append(_cbor_float(value))
+    elif value_type is dict:
+        parts.append(_cbor_head(5, len(value)))
+        for (key, item) in value.items():
+            parts.append(_cbor_text(key) if type(key) is str else cbor_encode(key))
+            _cbor_encode_item(item, parts)
+    elif value_type is str:
+        parts.append(_cbor_text(value))
+    elif value is None:
+        parts.append(b"\xf6")
+    elif value is True:
+        parts.append(b"\xf5")
+    elif value is False:
+        parts.append(b"\xf4")
+    elif isinstance(value, int):
+        parts.append(_cbor_head(0, value) if value >= 0 else _cbor_head(1, -1 - value))
+    elif isinstance(value, float):
+        parts.append(_cbor_float(value))
+    elif isinstance(value, str):
+        parts.append(_cbor_text(str(value)))
+    elif isinstance(value, (bytes, bytearray)):
+        parts.append(_cbor_head(2, len(value)))
+        parts.append(bytes(value))
+    elif isinstance(value, (list, tuple)):
+        parts.append(_cbor_head(4, len(value)))
+        for item in value:
+            _cbor_encode_item(item, parts)
+    elif isinstance(value, collections.abc.Mapping):
+        _cbor_encode_item(dict(value), parts)
+    else:
+        raise TypeError(f"Cannot CBOR-encode {type(value).__name__}")
+
+
+def _cbor_float(value : float) -> bytes:
+    # Sensor readings rarely survive float32, so only whole numbers (exact up to 2^24) and NaN
+    # are narrowed; testing every value for a lossless float32 costs more than it saves
+    if value != value or (value.is_integer() and -16777216.0 <= value <= 16777216.0):
+        return b"\xfa" + _CBOR_FLOAT32.pack(value)
+    return b"\xfb" + _CBOR_FLOAT64.pack(value)
+
+
+# Field names repeat in every message; their encoding is cached
+@functools.lru_cache(maxsize=512)
+def _cbor_text(value : str) -> bytes:
+    encoded = value.encode("utf-8")
+    return _cbor_head(3, len(encoded)) + encoded
+
+
+def _cbor_decode_item(data : memoryview, offset : int) -> tuple:
+    initial = data[offset]
+    (major, info) = (initial >> 5, initial & 0x1F)
+    offset += 1
+    if major == 7:
+        if info == 20:
+            return (False, offset)
+        if info == 21:
+            return (True, offset)
+        if info in (22, 23):
+            return (None, offset)
+        if info == 25:
+            return (_CBOR_FLOAT16.unpack_from(data, offset)[0], offset + 2)
+        if info == 26:
+            return (_CBOR_FLOAT32.unpack_from(data, offset)[0], offset + 4)
+        if info == 27:
+            return (_CBOR_FLOAT64.unpack_from(data, offset)[0], offset + 8)
+        raise ValueError(f"Unsupported CBOR simple value {info} at offset {offset - 1}")
+    if info < 24:
+        argument = info
+    elif info == 24:
+        argument = data[offset]
+        offset += 1
+    elif info == 25:
+        argument = _CBOR_UINT16.unpack_from(data, offset)[0]
+        offset += 2
+    elif info == 26:
+        argument = _CBOR_UINT32.unpack_from(data, offset)[0]
+        offset += 4
+    elif info == 27:
+        argument = _CBOR_UINT64.unpack_from(data, offset)[0]
+        offset += 8
+    else:
+        raise ValueError(f"Unsupported CBOR length encoding {info} at offset {offset - 1}")
+    if major == 0:
+        return (argument, offset)
+    if major == 1:
+        return (-1 - argument, offset)
+    if major in (2, 3):
+        end = offset + argument
+        if end > len(data):
+            raise ValueError("Truncated CBOR string")
+        raw = bytes(data[offset:end])
+        return (raw.decode("utf-8") if major == 3 else raw, end)
+    if major == 4:
+        items = []
+        for _ in range(argument):
+            (item, offset) = _cbor_decode_item(data, offset)
+            items.append(item)
+        return (items, offset)
+    if major == 5:
+        items = {}
+        for _ in range(argument):
+            (key, offset) = _cbor_decode_item(data, offset)
+            (items[key], offset) = _cbor_decode_item(data, offset)
+        return (items, offset)
+    # Major type 6: semantic tag - return the tagged item itself
+    return _cbor_decode_item(data, offset)
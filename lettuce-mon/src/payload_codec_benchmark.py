@@ -0,0 +1,59 @@
+'''
+Compares the MQTT payload codecs on a representative hydro tank report:
+encode / decode cost per message and payload size, with and without window stats.
+
+    python payload_codec_benchmark.py [iterations]
+'''
+import sys
+import time
+import timeit
+
+import payload_codec
+import stream_stats
+
+
+'''
+A hydro tank report as published: latest values plus the window stats of ~60 samples
+'''
+def _sample_report(with_window_stats : bool) -> dict:
+    values = {"water_depth": 7.834,
+              "water_depth_offset": 0.25,
+              "env_temperature_f": 71.62,
+              "env_humidity": 48.17,
+              "water_temperature_f": 66.43}
+    if with_window_stats:
+        window_stats = stream_stats.WindowAggregator()
+        for index in range(60):
+            window_stats.add_sample({field: value + 0.01 * (index % 7) for (field, value) in values.items()})
+        values["window_stats"] = window_stats.snapshot()
+    return values
+
+
+def run(iterations : int = 20000) -> list:
+    results = list()
+    timestamp = time.time()
+    for with_window_stats in (False, True):
+        values = _sample_report(with_window_stats)
+        for name in payload_codec.CODEC_NAMES:
+            codec = payload_codec.create_codec(name, payload_codec.HYDRO_TANK_SENSOR_SCHEMA)
+            payload = codec.encode(values, timestamp)
+            encode_seconds = min(timeit.repeat(lambda: codec.encode(values, timestamp), number=iterations, repeat=3))
+            decode_seconds = min(timeit.repeat(lambda: codec.decode(payload), number=iterations, repeat=3))
+            results.append({"codec": name,
+                            "window_stats": with_window_stats,
+                            "bytes": len(payload),
+                            "encode_us": encode_seconds / iterations * 1e6,
+                            "decode_us": decode_seconds / iterations * 1e6})
+    return results
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'codec':<8}{'window stats':>14}{'bytes':>8}{'encode (us)':>14}{'decode (us)':>14}")
+    for result in run(iterations):
+        print(f"{result['codec']:<8}{'yes' if result['window_stats'] else 'no':>14}{result['bytes']:>8}"
+              f"{result['encode_us']:>14.2f}{result['decode_us']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
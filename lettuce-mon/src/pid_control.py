@@ -0,0 +1,134 @@
+'''
+Closed-loop controllers for local actuation (e.g. fan duty cycle from box temperature).
+
+Both controllers have update(measurement) -> output, a setpoint attribute and reset().
+'''
+import time
+
+
+class PidController:
+    '''
+    PID controller with output limits and anti-windup.
+    direct_acting: the output rises when the measurement rises above the setpoint
+    (cooling); otherwise it rises when the measurement falls below it (heating).
+    Anti-windup: the integral only accumulates while the output is not saturated
+    in the direction of the error, and is itself clamped to the output range.
+    The derivative acts on the measurement, so setpoint changes cause no kick.
+    '''
+    def __init__(self,
+                 kp : float,
+                 ki : float = 0.0,
+                 kd : float = 0.0,
+                 setpoint : float = 0.0,
+                 output_min : float = 0.0,
+                 output_max : float = 100.0,
+                 direct_acting : bool = False,
+                 derivative_alpha : float = 1.0,
+                 clock=time.monotonic) -> None:
+        if output_max <= output_min:
+            raise ValueError(f"Invalid output limits: {output_min} - {output_max}")
+        if not 0 < derivative_alpha <= 1:
+            raise ValueError(f"Derivative filter alpha must be in (0, 1]: {derivative_alpha}")
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.setpoint = setpoint
+        self.output_min = output_min
+        self.output_max = output_max
+        self.direct_acting = direct_acting
+        self.derivative_alpha = derivative_alpha
+        self._clock = clock
+        self.reset()
+
+    '''
+    Clear the controller state. With initial_output, taking over from another controller
+    (or manual control) is bumpless: the first update() seeds the integral so that its
+    output equals initial_output, and the loop moves on from there.
+    '''
+    def reset(self, initial_output : float = None) -> None:
+        self._integral = 0.0
+        self._initial_output = initial_output
+        self._derivative = 0.0
+        self._last_measurement = None
+        self._last_time = None
+        self.output = None
+
+    '''
+    Compute the output for a new measurement; dt comes from the clock unless given
+    '''
+    def update(self, measurement : float, dt : float = None) -> float:
+        now = self._clock()
+        if dt is None:
+            dt = 0.0 if self._last_time is None else now - self._last_time
+        self._last_time = now
+        error = measurement - self.setpoint if self.direct_acting else self.setpoint - measurement
+
+        # Derivative on measurement, low-pass filtered
+        if self._last_measurement is not None and dt > 0:
+            slope = (measurement - self._last_measurement) / dt
+            if not self.direct_acting:
+                slope = -slope
+            self._derivative += self.derivative_alpha * (slope - self._derivative)
+        self._last_measurement = measurement
+
+        if self._initial_output is not None:
+            # Bumpless transfer: kp * error is already part of the output being taken over
+            self._integral = max(self.output_min, min(self.output_max, self._initial_output - self.kp * error))
+            self._initial_output = None
+        unclamped = self.kp * error + self._integral + self.kd * self._derivative
+        # Conditional integration: do not wind further into a saturated limit
+        if dt > 0 and self.ki != 0:
+            saturated_high = unclamped >= self.output_max and error > 0
+            saturated_low = unclamped <= self.output_min and error < 0
+            if not (saturated_high or saturated_low):
+                self._integral += self.ki * error * dt
+                self._integral = max(self.output_min, min(self.output_max, self._integral))
+                unclamped = self.kp * error + self._integral + self.kd * self._derivative
+        self.output = max(self.output_min, min(self.output_max, unclamped))
+        return self.output
+
+    def state(self) -> dict:
+        return {"setpoint": self.setpoint,
+                "output": self.output,
+                "integral": self._integral,
+                "derivative": self._derivative}
+
+
+class HysteresisController:
+    '''
+    Two-level (bang-bang) controller: high_output once the measurement exceeds
+    setpoint + band / 2, low_output once it falls below setpoint - band / 2
+    (direct acting; reversed when direct_acting is False).
+    '''
+    def __init__(self,
+                 setpoint : float,
+                 band : float = 1.0,
+                 low_output : float = 0.0,
+                 high_output : float = 100.0,
+                 direct_acting : bool = True) -> None:
+        if band < 0:
+            raise ValueError(f"Hysteresis band must not be negative: {band}")
+        self.setpoint = setpoint
+        self.band = band
+        self.low_output = low_output
+        self.high_output = high_output
+        self.direct_acting = direct_acting
+        self.reset()
+
+    def reset(self) -> None:
+        self._active = False
+        self.output = None
+
+    def update(self, measurement : float, dt : float = None) -> float:
+        excess = measurement - self.setpoint if self.direct_acting else self.setpoint - measurement
+        if excess > self.band / 2:
+            self._active = True
+        elif excess < -self.band / 2:
+            self._active = False
+        self.output = self.high_output if self._active else self.low_output
+        return self.output
+
+    def state(self) -> dict:
+        return {"setpoint": self.setpoint,
+                "output": self.output,
+                "active": self._active}
@@ -0,0 +1,115 @@
+'''
+Report-by-exception publish policy: decide whether a sample is worth publishing.
+
+A sample (dict of field -> value) is published when any watched field moved
+past its deadband since the last *published* sample, or when nothing has been
+published for heartbeat_seconds. Nothing is published more often than
+min_interval_seconds. Fields without a deadband (timestamps etc.) are carried
+in the payload but never trigger a publish on their own.
+'''
+import math
+import time
+
+
+class FieldDeadband:
+    '''
+    A change is significant when it exceeds the absolute OR the percent band.
+    A band of None is disabled; with both disabled any change is significant.
+    '''
+    def __init__(self, absolute : float = None, percent : float = None) -> None:
+        if (absolute is not None and absolute < 0) or (percent is not None and percent < 0):
+            raise ValueError(f"Deadbands must not be negative: absolute={absolute}, percent={percent}")
+        self.absolute = absolute
+        self.percent = percent
+
+    def exceeded(self, last_value, value) -> bool:
+        if last_value is None or value is None:
+            return last_value is not value
+        if not isinstance(value, (int, float)) or not isinstance(last_value, (int, float)):
+            return value != last_value
+        if math.isnan(value) or math.isnan(last_value):
+            return math.isnan(value) != math.isnan(last_value)
+        delta = abs(value - last_value)
+        if self.absolute is None and self.percent is None:
+            return delta > 0
+        if self.absolute is not None and delta > self.absolute:
+            return True
+        if self.percent is not None and delta > abs(last_value) * self.percent / 100.0:
+            return True
+        return False
+
+
+class PublishPolicy:
+    '''
+    Tracks the last published sample of one topic and decides when to publish the next.
+    '''
+    REASON_FIRST = "first"
+    REASON_CHANGE = "change"
+    REASON_HEARTBEAT = "heartbeat"
+
+    def __init__(self,
+                 deadbands : dict = None,
+                 heartbeat_seconds : float = None,
+                 min_interval_seconds : float = 0.0,
+                 clock=time.monotonic) -> None:
+        if heartbeat_seconds is not None and heartbeat_seconds <= 0:
+            raise ValueError(f"Heartbeat interval must be positive: {heartbeat_seconds}")
+        if min_interval_seconds < 0:
+            raise ValueError(f"Minimum publish interval must not be negative: {min_interval_seconds}")
+        self.deadbands = deadbands if deadbands is not None else dict()
+        self.heartbeat_seconds = heartbeat_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self._clock = clock
+        self._last_values = None
+        self._last_publish_time = None
+        self.last_reason = None
+        self.publish_count = 0
+        self.suppressed_count = 0
+
+    '''
+    Build a policy from a compiled config section (config.PublishPolicyConfig):
+    heartbeat_seconds, min_interval_seconds and deadbands {field: (absolute, percent)}
+    '''
+    @staticmethod
+    def from_config(policy_config, default_heartbeat_seconds : float = None) -> 'PublishPolicy':
+        deadbands = dict()
+        for field, band in policy_config.deadbands.items():
+            deadbands[field] = FieldDeadband(band.absolute, band.percent)
+        heartbeat_seconds = policy_config.heartbeat_seconds
+        return PublishPolicy(deadbands,
+                             heartbeat_seconds if heartbeat_seconds is not None else default_heartbeat_seconds,
+                             policy_config.min_interval_seconds if policy_config.min_interval_seconds is not None else 0.0)
+
+    '''
+    Returns the reason values should be published now (REASON_*), or None. Nothing is
+    recorded: call mark_published() once the message has actually been handed off, so a
+    dropped message does not hold back the next sample.
+    '''
+    def check(self, values : dict):
+        reason = self._publish_reason(values)
+        if reason is None:
+            self.suppressed_count += 1
+        return reason
+
+    '''
+    Remember values as the last published sample
+    '''
+    def mark_published(self, values : dict, reason : str = None) -> None:
+        self._last_values = dict(values)
+        self._last_publish_time = self._clock()
+        self.last_reason = reason
+        self.publish_count += 1
+
+    ''' ------ Private Functions ------'''
+    def _publish_reason(self, values : dict):
+        if self._last_publish_time is None:
+            return self.REASON_FIRST
+        elapsed = self._clock() - self._last_publish_time
+        if elapsed < self.min_interval_seconds:
+            return None
+        for field, deadband in self.deadbands.items():
+            if field in values and deadband.exceeded(self._last_values.get(field), values[field]):
+                return self.REASON_CHANGE
+        if self.heartbeat_seconds is not None and elapsed >= self.heartbeat_seconds:
+            return self.REASON_HEARTBEAT
+        return None
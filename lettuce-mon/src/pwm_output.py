@@ -0,0 +1,197 @@
+'''
+PWM outputs: one interface over the hardware PWM peripheral (sysfs pwmchip),
+RPi.GPIO software PWM and the simulator, plus an optional slew-rate ramp.
+
+Every output has set_duty_cycle(percent), a duty_cycle attribute and close().
+Hardware PWM is generated by the SoC: no thread, no jitter, and a new duty
+cycle is latched by the peripheral at the end of the running period, so set
+point changes are glitch-free and cost one sysfs write.
+
+Which pin a PWM channel drives is set by the device-tree overlay, not by the
+sysfs export: each channel can come out on two pins and the overlay picks one
+(the plain dtoverlay=pwm routes channel 0 to BOARD pin 12). Hardware PWM is
+therefore opt-in (see device_backend.HARDWARE_PWM_ENV_VAR) and needs the
+overlay for the pin in BOARD_PIN_PWM_OVERLAYS in /boot/config.txt.
+'''
+import os
+import subprocess
+import threading
+import time
+
+# Raspberry Pi (BCM2711 and earlier) BOARD pins that can carry the PWM0 peripheral: pin -> (pwmchip, channel)
+BOARD_PIN_TO_PWM_CHANNEL = {12: (0, 0), 32: (0, 0), 33: (0, 1), 35: (0, 1)}
+BOARD_PIN_TO_BCM_GPIO = {12: 18, 32: 12, 33: 13, 35: 19}
+# config.txt overlay routing the channel to the pin (the fan PWM is on pin 32)
+BOARD_PIN_PWM_OVERLAYS = {12: "dtoverlay=pwm,pin=18,func=2",
+                          32: "dtoverlay=pwm,pin=12,func=4",
+                          33: "dtoverlay=pwm-2chan,pin=12,func=4,pin2=13,func2=4",
+                          35: "dtoverlay=pwm-2chan,pin=18,func=2,pin2=19,func2=2"}
+
+
+def _check_duty_cycle(duty_cycle : float) -> None:
+    if duty_cycle < 0 or duty_cycle > 100:
+        raise ValueError(f"Duty cycle must be between 0 and 100: {duty_cycle}")
+
+
+'''
+Whether a BOARD pin is currently muxed to the PWM peripheral: True / False, or None
+if that cannot be read (neither pinctrl nor raspi-gpio available)
+'''
+def pin_routed_to_pwm(board_pin : int):
+    gpio = str(BOARD_PIN_TO_BCM_GPIO[board_pin])
+    # pinctrl: "12: a0 pd | lo // GPIO12 = PWM0_CHAN0", raspi-gpio: "GPIO 12: level=0 fsel=4 alt=0 func=PWM0"
+    for command in (["pinctrl", "get", gpio], ["raspi-gpio", "get", gpio]):
+        try:
+            output = subprocess.run(command, capture_output=True, text=True, timeout=2.0, check=True).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        return "PWM" in output.upper()
+    return None
+
+
+class SysfsPwm:
+    '''
+    One channel of a kernel PWM chip (/sys/class/pwm/pwmchip<chip>/pwm<channel>).
+    Needs the PWM overlay routing the channel to the intended pin (see
+    BOARD_PIN_PWM_OVERLAYS) and write access to the sysfs files; raises OSError
+    if the channel cannot be exported. The export succeeds whichever pin the
+    overlay chose, so check the pin with pin_routed_to_pwm().
+    '''
+    _EXPORT_TIMEOUT_SECONDS = 1.0
+
+    def __init__(self, chip : int = 0, channel : int = 0, frequency : float = 25000, duty_cycle : float = 0.0) -> None:
+        _check_duty_cycle(duty_cycle)
+        chip_path = f"/sys/class/pwm/pwmchip{chip}"
+        self._channel_path = os.path.join(chip_path, f"pwm{channel}")
+        if not os.path.isdir(self._channel_path):
+            self._write(os.path.join(chip_path, "export"), channel)
+            # udev may take a moment to create the channel and fix its permissions
+            deadline = time.monotonic() + self._EXPORT_TIMEOUT_SECONDS
+            while not os.access(os.path.join(self._channel_path, "duty_cycle"), os.W_OK):
+                if time.monotonic() > deadline:
+                    raise OSError(f"PWM channel {self._channel_path} not available after export")
+                time.sleep(0.01)
+        self.period_ns = int(1e9 / frequency)
+        # The duty cycle may never exceed the period
+        self._write(os.path.join(self._channel_path, "duty_cycle"), 0)
+        self._write(os.path.join(self._channel_path, "period"), self.period_ns)
+        self._duty_fd = os.open(os.path.join(self._channel_path, "duty_cycle"), os.O_WRONLY)
+        self.duty_cycle = None
+        self.set_duty_cycle(duty_cycle)
+        self._write(os.path.join(self._channel_path, "enable"), 1)
+
+    def set_duty_cycle(self, duty_cycle : float) -> None:
+        _check_duty_cycle(duty_cycle)
+        os.pwrite(self._duty_fd, str(int(self.period_ns * duty_cycle / 100.0)).encode(), 0)
+        self.duty_cycle = duty_cycle
+
+    def close(self) -> None:
+        if self._duty_fd is not None:
+            self._write(os.path.join(self._channel_path, "enable"), 0)
+            os.close(self._duty_fd)
+            self._duty_fd = None
+
+    def _write(self, file_path : str, value) -> None:
+        with open(file_path, 'w') as file:
+            file.write(str(value))
+
+
+class GpioSoftwarePwm:
+    '''
+    RPi.GPIO compatible software PWM (a library thread toggles the pin); the fallback
+    for pins without a PWM peripheral. The caller sets the GPIO pin numbering mode.
+    '''
+    def __init__(self, gpio, pin : int, frequency : float = 10000, duty_cycle : float = 0.0) -> None:
+        _check_duty_cycle(duty_cycle)
+        gpio.setup(pin, gpio.OUT)
+        gpio.output(pin, gpio.LOW)
+        self._pwm = gpio.PWM(pin, frequency)
+        self._pwm.start(duty_cycle)
+        self.duty_cycle = duty_cycle
+
+    def set_duty_cycle(self, duty_cycle : float) -> None:
+        _check_duty_cycle(duty_cycle)
+        self._pwm.ChangeDutyCycle(duty_cycle)
+        self.duty_cycle = duty_cycle
+
+    def close(self) -> None:
+        self._pwm.stop()
+
+
+class RampedPwm:
+    '''
+    Moves an output towards the requested duty cycle at no more than
+    slew_rate_percent_per_second (None: apply at once). The ramp runs on a
+    thread that only wakes while a ramp is in progress.
+    '''
+    def __init__(self, output, slew_rate_percent_per_second : float = None, step_seconds : float = 0.02) -> None:
+        if slew_rate_percent_per_second is not None and slew_rate_percent_per_second <= 0:
+            raise ValueError(f"Slew rate must be positive: {slew_rate_percent_per_second}")
+        self._output = output
+        self._slew_rate = slew_rate_percent_per_second
+        self._step_seconds = step_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._target = output.duty_cycle
+        self._thread = None
+
+    @property
+    def duty_cycle(self) -> float:
+        return self._output.duty_cycle
+
+    @property
+    def target_duty_cycle(self) -> float:
+        return self._target
+
+    def set_duty_cycle(self, duty_cycle : float) -> None:
+        _check_duty_cycle(duty_cycle)
+        with self._lock:
+            self._target = duty_cycle
+            if self._slew_rate is None:
+                self._output.set_duty_cycle(duty_cycle)
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._ramp_thread, name="pwm-ramp", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    '''
+    Block until the output reached the requested duty cycle (or timeout); returns True if it did
+    '''
+    def wait_settled(self, timeout : float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._output.duty_cycle != self._target:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(self._step_seconds)
+        return True
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        self._output.close()
+
+    ''' ------ Private Functions ------'''
+    def _ramp_thread(self) -> None:
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            last = time.monotonic()
+            while not self._closed:
+                time.sleep(self._step_seconds)
+                now = time.monotonic()
+                max_step = self._slew_rate * (now - last)
+                last = now
+                with self._lock:
+                    current = self._output.duty_cycle
+                    if current == self._target:
+                        break
+                    if abs(self._target - current) <= max_step:
+                        self._output.set_duty_cycle(self._target)
+                    elif self._target > current:
+                        self._output.set_duty_cycle(current + max_step)
+                    else:
+                        self._output.set_duty_cycle(current - max_step)
@@ -0,0 +1,213 @@
+'''
+Multi-rate sampling scheduler: each task (usually one sensor) runs at its own period.
+
+Deadlines are absolute points on the monotonic clock (first_due + n * period), so the
+time a task body takes never shifts the next tick and wall-clock jumps (NTP, manual
+changes) have no effect. Every tick records its lateness (actual - scheduled start)
+and jitter (change in lateness from the previous tick) in histograms.
+'''
+import math
+import time
+
+import logger
+import stream_stats
+
+# What a task does after falling behind by one or more whole periods
+MISSED_SKIP = "skip"           # drop the missed ticks and continue on the original grid
+MISSED_CATCH_UP = "catch_up"   # run the missed ticks back to back (at most max_catch_up of them)
+
+# Lateness / jitter histogram buckets (seconds)
+TIMING_BUCKET_EDGES_SECONDS = (0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+class SampleTask:
+    '''
+    One periodic task. run_fn is called with no arguments when the task is due;
+    its return value is kept as last_value. The optional start_fn triggers a
+    split-phase conversion (see sensors.TemperatureHumiditySensor).
+    '''
+    def __init__(self, name : str, period_seconds : float, run_fn, first_due : float, start_fn=None,
+                 missed_tick_policy : str = MISSED_SKIP, max_catch_up : int = 10) -> None:
+        if period_seconds <= 0:
+            raise ValueError(f"Sample period for '{name}' must be positive: {period_seconds}")
+        if missed_tick_policy not in (MISSED_SKIP, MISSED_CATCH_UP):
+            raise ValueError(f"Unknown missed tick policy for '{name}': {missed_tick_policy}")
+        self.name = name
+        self.period_seconds = period_seconds
+        self.run_fn = run_fn
+        self.start_fn = start_fn
+        self.missed_tick_policy = missed_tick_policy
+        self.max_catch_up = max_catch_up
+        self.next_due = first_due
+        self.last_value = None
+        self.last_run = None
+        self.run_count = 0
+        self.error_count = 0
+        self.missed_count = 0
+        self.lateness = stream_stats.Histogram(TIMING_BUCKET_EDGES_SECONDS)
+        self.jitter = stream_stats.Histogram(TIMING_BUCKET_EDGES_SECONDS)
+        self._last_lateness = None
+
+    '''
+    Record the start of the tick scheduled at next_due
+    '''
+    def record_start(self, now : float) -> None:
+        lateness = max(0.0, now - self.next_due)
+        self.lateness.add(lateness)
+        if self._last_lateness is not None:
+            self.jitter.add(abs(lateness - self._last_lateness))
+        self._last_lateness = lateness
+
+    '''
+    Move next_due to the following tick on the grid, applying the missed tick policy
+    '''
+    def advance(self, now : float) -> None:
+        self.next_due += self.period_seconds
+        if self.next_due > now:
+            return
+        behind = math.floor((now - self.next_due) / self.period_seconds) + 1
+        if self.missed_tick_policy == MISSED_CATCH_UP:
+            # The remaining ticks stay due and run on the following calls
+            behind -= self.max_catch_up
+        if behind > 0:
+            self.next_due += behind * self.period_seconds
+            self.missed_count += behind
+
+    def timing_report(self) -> dict:
+        return {"runs": self.run_count,
+                "errors": self.error_count,
+                "missed": self.missed_count,
+                "lateness": self.lateness.to_dict(),
+                "jitter": self.jitter.to_dict()}
+
+    def reset_timing(self) -> None:
+        self.missed_count = 0
+        self.lateness.reset()
+        self.jitter.reset()
+
+
+class SampleScheduler:
+    '''
+    Runs registered tasks on the monotonic clock. Tasks that come due at the
+    same time run in registration order, so register sensors before the
+    consumers (display / report) that use their values.
+    All due tasks are triggered (start_fn) before any is collected (run_fn),
+    so sensors sampled in the same tick convert in parallel.
+    '''
+    def __init__(self, app_logger : logger.Logger = None, clock=time.monotonic, sleep=time.sleep) -> None:
+        self._app_logger = app_logger
+        self._log_key = "scheduler"
+        self._clock = clock
+        self._sleep = sleep
+        self._tasks = list()
+
+    '''
+    Register a task; by default it first runs on the next call to run_pending()
+    '''
+    def add_task(self, name : str, period_seconds : float, run_fn,
+                 phase_seconds : float = 0.0, start_fn=None,
+                 missed_tick_policy : str = MISSED_SKIP, max_catch_up : int = 10) -> SampleTask:
+        task = SampleTask(name, period_seconds, run_fn, self._clock() + phase_seconds, start_fn,
+                          missed_tick_policy, max_catch_up)
+        self._tasks.append(task)
+        return task
+
+    def get_task(self, name : str) -> SampleTask:
+        for task in self._tasks:
+            if task.name == name:
+                return task
+        raise KeyError(name)
+
+    '''
+    Run every task that is due; returns the names of the tasks that ran
+    '''
+    def run_pending(self) -> list:
+        now = self._clock()
+        due_tasks = [task for task in self._tasks if now >= task.next_due]
+        # Phase 1 - trigger every due conversion
+        started = list()
+        for task in due_tasks:
+            task.record_start(self._clock())
+            if task.start_fn is None:
+                started.append(task)
+                continue
+            try:
+                task.start_fn()
+                started.append(task)
+            except Exception as e:
+                self._task_failed(task, e)
+        # Phase 2 - collect results / run the task body
+        ran = list()
+        for task in due_tasks:
+            if task in started:
+                try:
+                    task.last_value = task.run_fn()
+                    task.run_count += 1
+                except Exception as e:
+                    self._task_failed(task, e)
+            task.last_run = now
+            task.advance(self._clock())
+            ran.append(task.name)
+        return ran
+
+    '''
+    Count and log a failed task; the task stays scheduled
+    '''
+    def _task_failed(self, task : SampleTask, e : Exception) -> None:
+        task.error_count += 1
+        if self._app_logger is not None:
+            self._app_logger.write(self._log_key, f"Task '{task.name}' failed: {e}", logger.MessageLevel.WARN)
+
+    '''
+    Seconds until the earliest task is due (0 if one is already due)
+    '''
+    def time_until_next(self) -> float:
+        if len(self._tasks) == 0:
+            return 0.0
+        next_due = min(task.next_due for task in self._tasks)
+        return max(0.0, next_due - self._clock())
+
+    '''
+    Sleep until the earliest task is due
+    '''
+    def sleep_until_next(self) -> None:
+        delay = self.time_until_next()
+        if delay > 0:
+            self._sleep(delay)
+
+    '''
+    Run tasks forever (or until should_stop() returns True)
+    '''
+    def run_forever(self, should_stop=None) -> None:
+        while should_stop is None or not should_stop():
+            self.run_pending()
+            self.sleep_until_next()
+
+    '''
+    Timing of every task since the last reset: {task: {runs, errors, missed, lateness, jitter}}
+    '''
+    def timing_report(self) -> dict:
+        return {task.name: task.timing_report() for task in self._tasks}
+
+    def reset_timing(self) -> None:
+        for task in self._tasks:
+            task.reset_timing()
+
+    '''
+    Log a one-line timing summary per task and start a new timing window (usable as a task)
+    '''
+    def log_timing_report(self) -> None:
+        if self._app_logger is not None:
+            self._app_logger.write(self._log_key, self._format_timing_report, logger.MessageLevel.INFO, self.timing_report())
+        self.reset_timing()
+
+    def _format_timing_report(self, report : dict) -> str:
+        lines = ["Task timing (ms): lateness mean / p99 / max, jitter p99, missed ticks"]
+        for (name, timing) in report.items():
+            lateness = timing["lateness"]
+            if lateness["count"] == 0:
+                continue
+            jitter_p99 = timing["jitter"]["p99"]
+            lines.append(f"  {name:<20} {lateness['mean'] * 1e3:8.2f} {lateness['p99'] * 1e3:8.2f} {lateness['max'] * 1e3:8.2f}"
+                         f" {(jitter_p99 or 0.0) * 1e3:8.2f} {timing['missed']:6d}")
+        return "\n".join(lines)
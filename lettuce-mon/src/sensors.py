@@ -1,15 +1,7 @@
-import busio
-from busio import I2C
-from adafruit_bus_device import i2c_device
-from board import SCL, SDA
-
-import smbus2
-
-import adafruit_hts221
-
-import adafruit_mcp3421.mcp3421 as ADC
-from adafruit_mcp3421.analog_in import AnalogIn
+import device_backend
+import i2c_bus
 
+import array
 import datetime
 import json
 import math
@@ -34,70 +26,480 @@ class SingleTempHumidityMeasurement:
         return json.dumps(json_dict)
 
 class TemperatureHumiditySensor:
-    def read_temp_humidity(self) -> SingleTempHumidityMeasurement:
+    '''
+    Drivers expose a split-phase acquisition: start_conversion() triggers a
+    measurement and returns immediately, fetch_result() waits for it to
+    complete and returns it. Triggering every sensor first and collecting
+    afterwards makes a cycle cost the slowest conversion rather than the sum.
+    '''
+
+    '''
+    Trigger a measurement without waiting for it (no-op for free-running sensors)
+    '''
+    def start_conversion(self) -> None:
         pass
 
+    '''
+    Wait for the measurement started by start_conversion() and return it
+    '''
+    def fetch_result(self) -> SingleTempHumidityMeasurement:
+        raise NotImplementedError
+
+    def read_temp_humidity(self) -> SingleTempHumidityMeasurement:
+        self.start_conversion()
+        return self.fetch_result()
+
+class CRCError(Exception):
+    pass
+
+'''
+Sensirion CRC-8 (polynomial 0x31, init 0xFF) lookup table
+'''
+def _build_crc8_table(polynomial : int = 0x31) -> bytes:
+    table = bytearray(256)
+    for index in range(256):
+        crc = index
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ polynomial) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table[index] = crc
+    return bytes(table)
+
+_CRC8_TABLE = _build_crc8_table()
+
+'''
+Returns True if both words of the 6-byte SHT31 frame at offset pass their CRC
+'''
+def sht31_frame_crc_ok(data, offset : int = 0) -> bool:
+    table = _CRC8_TABLE
+    if table[table[0xFF ^ data[offset]] ^ data[offset + 1]] != data[offset + 2]:
+        return False
+    return table[table[0xFF ^ data[offset + 3]] ^ data[offset + 4]] == data[offset + 5]
+
+'''
+Batch decode concatenated 6-byte SHT31 frames (e.g. collected with sht31.fetch_raw_into).
+Frames failing CRC are skipped. Returns (temperatures_f, humidities, crc_error_count).
+'''
+def decode_sht31_frames(frames, count : int = None) -> tuple:
+    if count is None:
+        count = len(frames) // sht31.FRAME_SIZE
+    temperatures_f = array.array('d')
+    humidities = array.array('d')
+    crc_errors = 0
+    for offset in range(0, count * sht31.FRAME_SIZE, sht31.FRAME_SIZE):
+        if not sht31_frame_crc_ok(frames, offset):
+            crc_errors += 1
+            continue
+        temperatures_f.append(-49 + (315 * ((frames[offset] << 8) | frames[offset + 1]) / 65535.0))
+        humidities.append(100 * ((frames[offset + 3] << 8) | frames[offset + 4]) / 65535.0)
+    return (temperatures_f, humidities, crc_errors)
+
 class sht31(TemperatureHumiditySensor):
-    def __init__(self, i2c : I2C, i2c_addr : int = 0x44, print_reads=True) -> None:
-        self.i2c_device = i2c_device.I2CDevice(i2c, i2c_addr)
+    '''
+    Sensirion SHT31. Single shot mode (default) triggers one measurement per
+    start_conversion(). Periodic mode lets the sensor measure on its own at
+    0.5/1/2/4/10 measurements per second; fetch_result() then returns the newest
+    measurement without waiting (or the previous one if nothing new is ready).
+    Every frame is CRC checked; corrupted frames are re-read.
+    '''
+    FRAME_SIZE = 6
+    # Single shot, high repeatability, no clock stretching (the device NACKs reads until done)
+    _CMD_SINGLE_SHOT_HIGH = bytes([0x24, 0x00])
+    # Periodic acquisition, high repeatability: measurements per second -> command
+    _CMD_PERIODIC_HIGH = {
+        0.5: bytes([0x20, 0x32]),
+        1: bytes([0x21, 0x30]),
+        2: bytes([0x22, 0x36]),
+        4: bytes([0x23, 0x34]),
+        10: bytes([0x27, 0x37]),
+    }
+    _CMD_FETCH_DATA = bytes([0xE0, 0x00])
+    _CMD_BREAK = bytes([0x30, 0x93])
+    _CONVERSION_SECS = 0.0155
+    _NOT_READY_RETRIES = 5
+    _CRC_RETRIES = 2
+
+    def __init__(self, i2c, i2c_addr : int = 0x44, print_reads=True, periodic_mps : float = None) -> None:
+        self.i2c_device = device_backend.get_backend().create_i2c_device(i2c, i2c_addr)
         self._print_reads = print_reads
+        self._ready_at = None
+        self._periodic_mps = None
+        self._period_secs = None
+        # Preallocated frame buffers: _data receives every read, _last_frame holds the last valid one
+        self._data = bytearray(self.FRAME_SIZE)
+        self._last_frame = bytearray(self.FRAME_SIZE)
+        self._last_frame_valid = False
+        self._last_measurement = None
+        self.crc_error_count = 0
+        if periodic_mps is not None:
+            self.start_periodic(periodic_mps)
 
-    def read_temp_humidity(self) -> SingleTempHumidityMeasurement:
-        wr_data = bytearray(2)
-        wr_data[0] = 0x2C
-        wr_data[1] = 0x06
-        self.i2c_device.write(wr_data)
-        # SHT31 address, 0x44(68)
-        # Read data back from 0x00(00), 6 bytes
-        # Temp MSB, Temp LSB, Temp CRC, Humididty MSB, Humidity LSB, Humidity CRC
-        data = bytearray(6)
-        self.i2c_device.readinto(data)
+    '''
+    Switch to periodic acquisition at the given measurements per second
+    '''
+    def start_periodic(self, periodic_mps : float) -> None:
+        if periodic_mps not in self._CMD_PERIODIC_HIGH:
+            raise ValueError(f"Unsupported SHT31 periodic rate: {periodic_mps} (use one of {list(self._CMD_PERIODIC_HIGH)})")
+        if self._periodic_mps is not None:
+            self.stop_periodic()
+        self.i2c_device.write(self._CMD_PERIODIC_HIGH[periodic_mps])
+        self._periodic_mps = periodic_mps
+        self._period_secs = 1.0 / periodic_mps
+        self._last_frame_valid = False
+        self._last_measurement = None
+        self._ready_at = time.monotonic() + self._CONVERSION_SECS
+
+    '''
+    Stop periodic acquisition and return to single shot mode
+    '''
+    def stop_periodic(self) -> None:
+        self.i2c_device.write(self._CMD_BREAK)
+        self._periodic_mps = None
+        self._period_secs = None
+        self._ready_at = None
+        # The sensor needs 1 ms after a break before it accepts the next command
+        time.sleep(0.001)
+
+    def start_conversion(self) -> None:
+        if self._periodic_mps is not None:
+            return
+        self.i2c_device.write(self._CMD_SINGLE_SHOT_HIGH)
+        self._ready_at = time.monotonic() + self._CONVERSION_SECS
+
+    def fetch_result(self) -> SingleTempHumidityMeasurement:
+        if not self._acquire_frame() and self._last_measurement is not None:
+            return self._last_measurement
+        frame = self._last_frame
         # Convert the data
-        temp = data[0] * 256 + data[1]
-        cTemp = -45 + (175 * temp / 65535.0)
-        fTemp = -49 + (315 * temp / 65535.0)
-        humidity = 100 * (data[3] * 256 + data[4]) / 65535.0
+        fTemp = -49 + (315 * ((frame[0] << 8) | frame[1]) / 65535.0)
+        humidity = 100 * ((frame[3] << 8) | frame[4]) / 65535.0
         # Output data to screen and return
         if self._print_reads:
             print(f"SHT31 0x{self.i2c_device.device_address:02x} Temperature:\t\t{fTemp:0.1f} F")
             print(f"SHT31 0x{self.i2c_device.device_address:02x} Relative Humidity:\t{humidity:0.1f}%")
-        return SingleTempHumidityMeasurement(fTemp, humidity)
+        self._last_measurement = SingleTempHumidityMeasurement(fTemp, humidity)
+        return self._last_measurement
+
+    '''
+    Copy one CRC-checked raw frame into buffer at offset without decoding it
+    (for batch decoding with decode_sht31_frames). Returns False if periodic
+    mode had no new measurement and the previous frame was copied instead.
+    '''
+    def fetch_raw_into(self, buffer, offset : int = 0) -> bool:
+        new_frame = self._acquire_frame()
+        buffer[offset:offset + self.FRAME_SIZE] = self._last_frame
+        return new_frame
+
+    '''
+    Read a frame into _last_frame, retrying on CRC errors.
+    Returns False if periodic mode had no new measurement since the last fetch.
+    '''
+    def _acquire_frame(self) -> bool:
+        for attempt in range(self._CRC_RETRIES + 1):
+            if not self._read_frame():
+                return False
+            if sht31_frame_crc_ok(self._data):
+                self._last_frame[:] = self._data
+                self._last_frame_valid = True
+                return True
+            self.crc_error_count += 1
+            if self._periodic_mps is not None:
+                # The corrupted frame was consumed; wait for the next periodic measurement
+                self._ready_at = time.monotonic() + self._period_secs
+        raise CRCError(f"SHT31 0x{self.i2c_device.device_address:02x} CRC check failed {self._CRC_RETRIES + 1} times")
+
+    '''
+    Read the raw 6 bytes into _data.
+    Returns False if periodic mode had no new measurement since the last fetch.
+    '''
+    def _read_frame(self) -> bool:
+        if self._periodic_mps is None and self._ready_at is None:
+            self.start_conversion()
+        if self._ready_at is not None:
+            remaining = self._ready_at - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            self._ready_at = None
+        # Temp MSB, Temp LSB, Temp CRC, Humididty MSB, Humidity LSB, Humidity CRC
+        for retry in range(self._NOT_READY_RETRIES):
+            try:
+                if self._periodic_mps is not None:
+                    # Fetch command and read in one transaction (repeated start)
+                    self.i2c_device.write_then_readinto(self._CMD_FETCH_DATA, self._data)
+                else:
+                    self.i2c_device.readinto(self._data)
+                return True
+            except OSError:
+                # Single shot: conversion still running. Periodic: no measurement since the last fetch.
+                if self._periodic_mps is not None and self._last_frame_valid:
+                    return False
+                if retry == self._NOT_READY_RETRIES - 1:
+                    raise
+                time.sleep(0.001)
+        return False
 
 class hts221(TemperatureHumiditySensor):
-    def __init__(self, i2c : I2C, i2c_addr : int = 0x59) -> None:
-        self.hts = adafruit_hts221.HTS221(i2c)
-        data_rate = adafruit_hts221.Rate.label[self.hts.data_rate]  
+    def __init__(self, i2c, i2c_addr : int = 0x59) -> None:
+        self.hts = device_backend.get_backend().create_hts221(i2c, i2c_addr)
 
-    def read_temp_humidity(self) -> SingleTempHumidityMeasurement:
+    '''
+    The HTS221 converts continuously at its output data rate; fetch the latest result
+    '''
+    def fetch_result(self) -> SingleTempHumidityMeasurement:
         f_temp = self.hts.temperature * (9.0/5.0) + 32.0
         humidity = self.hts.relative_humidity
         print(f"HTS221 Temperature:\t\t{f_temp:0.1f} F")
         print(f"HTS221 Relative Humidity:\t{humidity:0.1f}%")
         return SingleTempHumidityMeasurement(f_temp, humidity)
     
+class SteinhartHart:
+    '''
+    Thermistor calibration: 1 / T = A + B ln(R) + C ln(R)^3, T in kelvin, R in ohms.
+    The default coefficients were fitted at 40 / 70 / 100 degF to the log curve the
+    water probe used before (T_F = -44.91 ln(R) + 493.17); they agree with it to
+    within 0.06 degF from 30 to 110 degF. Use from_points() to calibrate a probe.
+    '''
+    def __init__(self, a : float = 2.128950e-3, b : float = 5.773562e-5, c : float = 8.670514e-7) -> None:
+        self.a = a
+        self.b = b
+        self.c = c
+
+    '''
+    Coefficients through three (resistance ohms, temperature degF) calibration points
+    '''
+    @staticmethod
+    def from_points(points) -> 'SteinhartHart':
+        if len(points) != 3:
+            raise ValueError(f"Steinhart-Hart calibration needs three points, not {len(points)}")
+        l1, l2, l3 = (math.log(resistance) for (resistance, _) in points)
+        y1, y2, y3 = (1.0 / ((temperature_f - 32.0) * 5.0 / 9.0 + 273.15) for (_, temperature_f) in points)
+        g2 = (y2 - y1) / (l2 - l1)
+        g3 = (y3 - y1) / (l3 - l1)
+        c = (g3 - g2) / (l3 - l2) / (l1 + l2 + l3)
+        b = g2 - c * (l1 * l1 + l1 * l2 + l2 * l2)
+        a = y1 - (b + c * l1 * l1) * l1
+        return SteinhartHart(a, b, c)
+
+    def temperature_f(self, resistance : float) -> float:
+        log_r = math.log(resistance)
+        kelvin = 1.0 / (self.a + self.b * log_r + self.c * log_r * log_r * log_r)
+        return (kelvin - 273.15) * 9.0 / 5.0 + 32.0
+
+
+class ThermistorTable:
+    '''
+    Raw MCP3421 code -> degF for a thermistor / shunt divider, by linear interpolation
+    in a table evaluated once over the code range (no log per sample). Codes in the
+    first table segment (a shorted probe) or below have no temperature.
+    '''
+    def __init__(self,
+                 calibration : SteinhartHart = None,
+                 resolution : int = 18,
+                 gain : int = 1,
+                 v_in : float = 3.3,
+                 shunt_resistor : float = 32020,
+                 v_ref : float = 2.048,
+                 table_size : int = 1025) -> None:
+        self.calibration = calibration if calibration is not None else SteinhartHart()
+        self.full_scale = 1 << (resolution - 1)
+        self._volts_per_code = v_ref / gain / self.full_scale
+        self._v_in = v_in
+        self._shunt_resistor = shunt_resistor
+        self._scale = (table_size - 1) / self.full_scale
+        self._last_index = table_size - 1
+        self._table = array.array('d', [math.nan] * table_size)
+        for index in range(1, table_size):
+            resistance = self.resistance(index / self._scale)
+            if resistance > 0:
+                self._table[index] = self.calibration.temperature_f(resistance)
+
+    def voltage(self, code : float) -> float:
+        return code * self._volts_per_code
+
+    def resistance(self, code : float) -> float:
+        v_out = self.voltage(code)
+        if v_out >= self._v_in:
+            return math.inf
+        return (v_out * self._shunt_resistor) / (self._v_in - v_out)
+
+    '''
+    Temperature of one (possibly averaged) code; raises ValueError outside the table
+    '''
+    def code_to_temperature_f(self, code : float) -> float:
+        temperature_f = self._interpolate(code)
+        if math.isnan(temperature_f):
+            raise ValueError(f"MCP3421 code {code} is outside the thermistor range (probe shorted or missing?)")
+        return temperature_f
+
+    '''
+    Batch conversion of raw codes; out of range codes give NaN
+    '''
+    def codes_to_temperature_f(self, codes) -> array.array:
+        (table, scale, last_index) = (self._table, self._scale, self._last_index)
+        temperatures_f = array.array('d', bytes(8 * len(codes)))
+        for (index, code) in enumerate(codes):
+            position = code * scale
+            if not position > 0:
+                temperatures_f[index] = math.nan
+                continue
+            low_index = int(position)
+            if low_index >= last_index:
+                temperatures_f[index] = table[last_index]
+                continue
+            low = table[low_index]
+            temperatures_f[index] = low + (table[low_index + 1] - low) * (position - low_index)
+        return temperatures_f
+
+    def _interpolate(self, code : float) -> float:
+        position = code * self._scale
+        if not position > 0:
+            return math.nan
+        index = int(position)
+        if index >= self._last_index:
+            return self._table[self._last_index]
+        low = self._table[index]
+        return low + (self._table[index + 1] - low) * (position - index)
+
+
 class mcp3421Thermistor(TemperatureHumiditySensor):
-    def __init__(self, i2c : I2C, 
+    '''
+    MCP3421 ADC reading a thermistor / shunt resistor divider.
+    Continuous mode: the ADC free-runs and fetch_result() returns the latest
+    completed conversion without waiting for a new one.
+    One-shot mode: start_conversion() triggers a conversion and fetch_result()
+    waits for it.
+    Oversampling (oversample_count > 1, continuous mode): fetch_result() averages
+    that many consecutive new conversions. With latency_budget_seconds the
+    resolution and oversample count are chosen by choose_resolution().
+    '''
+    _SAMPLES_PER_SECOND = {12: 240.0, 14: 60.0, 16: 15.0, 18: 3.75}
+    _RESOLUTION_CODES = {12: 0, 14: 1, 16: 2, 18: 3}
+    _GAIN_CODES = {1: 0, 2: 1, 4: 2, 8: 3}
+    _CONVERSION_MARGIN = 1.1
+    _V_REF = 2.048
+    _MAX_OVERSAMPLE = 64
+    _READY_TIMEOUT_CONVERSIONS = 2
+
+    def __init__(self, i2c, 
                  i2c_addr : int = 0x68,
-                 print_reads=True) -> None:
-        self.adc_device = ADC.MCP3421(i2c)
-        self.adc_device.gain = 1
-        self.adc_device.resolution = 18
-        self.adc_device.continuous_mode = True
-        self.adc_channel = AnalogIn(self.adc_device)
+                 print_reads=True,
+                 resolution : int = 18,
+                 gain : int = 1,
+                 continuous_mode : bool = True,
+                 oversample_count : int = 1,
+                 latency_budget_seconds : float = None,
+                 calibration : SteinhartHart = None) -> None:
+        if latency_budget_seconds is not None:
+            (resolution, oversample_count) = self.choose_resolution(latency_budget_seconds)
+        if resolution not in self._RESOLUTION_CODES:
+            raise ValueError(f"Unsupported MCP3421 resolution: {resolution}")
+        if gain not in self._GAIN_CODES:
+            raise ValueError(f"Unsupported MCP3421 gain: {gain}")
+        if not 1 <= oversample_count <= self._MAX_OVERSAMPLE:
+            raise ValueError(f"MCP3421 oversample count must be between 1 and {self._MAX_OVERSAMPLE}: {oversample_count}")
+        self.adc_device = device_backend.get_backend().create_i2c_device(i2c, i2c_addr)
+        self.resolution = resolution
+        self.gain = gain
+        self.oversample_count = oversample_count
+        # Consecutive conversions are only available from the free-running ADC
+        self.continuous_mode = continuous_mode or oversample_count > 1
         self._print_reads = print_reads
+        self._config = ((0x10 if self.continuous_mode else 0x00) |
+                        (self._RESOLUTION_CODES[resolution] << 2) |
+                        self._GAIN_CODES[gain])
+        self._conversion_secs = self._CONVERSION_MARGIN / self._SAMPLES_PER_SECOND[resolution]
+        self._data = bytearray(4 if resolution == 18 else 3)
+        self.table = ThermistorTable(calibration, resolution, gain, v_ref=self._V_REF)
+        self.adc_device.write(bytes([self._config]))
+        # The first continuous conversion completes one conversion time after configuration
+        self._ready_at = time.monotonic() + self._conversion_secs if self.continuous_mode else None
+
+    '''
+    (resolution, oversample count) giving the most effective bits within the latency
+    budget: averaging n conversions adds log2(n) / 2 bits (noise falls by sqrt(n)).
+    E.g. 0.1 s -> 16-bit x 1, 0.25 s -> 16-bit x 3, 0.3 s -> 18-bit x 1, 0.03 s -> 14-bit x 1.
+    '''
+    @classmethod
+    def choose_resolution(cls, latency_budget_seconds : float) -> tuple:
+        best = None
+        for (resolution, samples_per_second) in cls._SAMPLES_PER_SECOND.items():
+            count = min(cls._MAX_OVERSAMPLE, int(latency_budget_seconds * samples_per_second / cls._CONVERSION_MARGIN))
+            if count < 1:
+                continue
+            effective_bits = resolution + math.log2(count) / 2
+            # Prefer more bits; on a tie the faster setting
+            key = (effective_bits, -count / samples_per_second)
+            if best is None or key > best[0]:
+                best = (key, resolution, count)
+        if best is None:
+            raise ValueError(f"No MCP3421 resolution fits a {latency_budget_seconds * 1000:.1f} ms latency budget")
+        return (best[1], best[2])
 
-    def read_temp_humidity(self) -> float:
-        raw = self.adc_channel.value
-        # Convert bin to float
-        v_out = raw / 131072 * 2.048
-        # Convert Voltage to Resistance
-        v_in = 3.3
-        shunt_resistor = 32020
-        r_thermistor = (v_out * shunt_resistor) / (v_in - v_out) 
-        # Convert Resistance to Temperature (thermistor)
-        f_temperature = -44.91*math.log(r_thermistor)+493.17
+    def start_conversion(self) -> None:
+        if self.continuous_mode:
+            return
+        self.adc_device.write(bytes([self._config | 0x80]))
+        self._ready_at = time.monotonic() + self._conversion_secs
+
+    def fetch_result(self) -> SingleTempHumidityMeasurement:
+        if self.oversample_count > 1:
+            return self._code_to_measurement(self._read_oversampled_code())
+        if self._ready_at is None:
+            self.start_conversion()
+        remaining = self._ready_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        raw = self._read_code(wait_for_new=not self.continuous_mode)
+        if not self.continuous_mode:
+            self._ready_at = None
+        return self._code_to_measurement(raw)
+
+    '''
+    Batch conversion of raw codes (e.g. logged samples) to degF; out of range codes give NaN
+    '''
+    def codes_to_temperature_f(self, codes) -> array.array:
+        return self.table.codes_to_temperature_f(codes)
+
+    '''
+    Average of oversample_count consecutive new conversions
+    '''
+    def _read_oversampled_code(self) -> float:
+        remaining = self._ready_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        total = 0
+        for _ in range(self.oversample_count):
+            total += self._read_code(wait_for_new=True, poll_seconds=self._conversion_secs / 8)
+        return total / self.oversample_count
+
+    '''
+    Read the output register; optionally poll until the RDY bit reports a new conversion.
+    Raises TimeoutError if none arrives within _READY_TIMEOUT_CONVERSIONS conversion times
+    (RDY stuck at 1, e.g. a reset ADC or a bus returning 0xFF)
+    '''
+    def _read_code(self, wait_for_new : bool, poll_seconds : float = 0.001) -> int:
+        data = self._data
+        deadline = time.monotonic() + self._READY_TIMEOUT_CONVERSIONS * self._conversion_secs
+        while True:
+            self.adc_device.readinto(data)
+            if not wait_for_new or data[-1] & 0x80 == 0:
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"MCP3421 conversion not ready after {self._READY_TIMEOUT_CONVERSIONS * self._conversion_secs * 1000:.0f} ms")
+            time.sleep(poll_seconds)
+        if self.resolution == 18:
+            raw = ((data[0] & 0x03) << 16) | (data[1] << 8) | data[2]
+        else:
+            raw = (data[0] << 8) | data[1]
+        sign_bit = 1 << (17 if self.resolution == 18 else 15)
+        return raw - (sign_bit << 1) if raw & sign_bit else raw
+
+    def _code_to_measurement(self, raw : float) -> SingleTempHumidityMeasurement:
+        f_temperature = self.table.code_to_temperature_f(raw)
         if self._print_reads:
-            print(f"MCP3421 Voltage:\t{v_out:0.3f}V\tThermistor: {int(r_thermistor)}ohms\tTempature: {f_temperature:0.1f}degF")   
+            print(f"MCP3421 Voltage:\t{self.table.voltage(raw):0.3f}V\tThermistor: {int(self.table.resistance(raw))}ohms\tTempature: {f_temperature:0.1f}degF")   
         return SingleTempHumidityMeasurement(f_temperature, 0)
 
 class TCT40Sensor:
@@ -117,17 +519,30 @@ class TCT40Sensor:
                 i2c_addr : int = 0x2F):
         self.i2c_bus_number = i2c_bus_number
         self.address = i2c_addr
+        self._bus = i2c_bus.get_smbus(i2c_bus_number)
+        self._ready_at = None
 
-    def read_distance_inches(self):
-        bus = smbus2.SMBus(self.i2c_bus_number)
+    '''
+    Trigger a measurement without waiting for it
+    '''
+    def start_conversion(self) -> None:
+        self._bus.write_byte(self.address, 0x01)
+        self._ready_at = time.monotonic() + self._WRITE_READ_DELAY_SECS
+
+    '''
+    Wait for the triggered measurement and return the distance in inches (None on error)
+    '''
+    def fetch_result(self):
         try:
-            # Write to initiate measurement
-            bus.write_byte(self.address, 0x01)
-            time.sleep(self._WRITE_READ_DELAY_SECS)  # Wait for measurement to complete
+            if self._ready_at is None:
+                self.start_conversion()
+            remaining = self._ready_at - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)  # Wait for measurement to complete
+            self._ready_at = None
 
-            # Read 2 bytes of data
-            data = bus.read_i2c_block_data(self.address, 0x01, 2)
-            bus.close()
+            # Read 2 bytes of data (register select and read in one I2C_RDWR transaction)
+            data = self._bus.write_then_read(self.address, [0x01], 2)
             distance = ((data[0] & 0x7F) << 8) + data[1]
             distance_cm = distance / 10
             distance_in = distance_cm / 2.54
@@ -135,6 +550,14 @@ class TCT40Sensor:
         except Exception as e:
             print(f"Error reading distance: {e}")
             return None
+
+    def read_distance_inches(self):
+        try:
+            self.start_conversion()
+        except Exception as e:
+            print(f"Error reading distance: {e}")
+            return None
+        return self.fetch_result()
     
     def print_distance(self, include_bar=True):
         distance_in = self.read_distance_inches()
@@ -153,8 +576,8 @@ class TCT40Sensor:
 
 if __name__ == "__main__":
     ultra_sonic_sensor = TCT40Sensor()
-    temp_humidity_sensor = sht31(I2C(SCL, SDA), i2c_addr=0x45)
-    thermistor = mcp3421Thermistor(I2C(SCL, SDA), i2c_addr=0x68)
+    temp_humidity_sensor = sht31(i2c_bus.get_i2c(), i2c_addr=0x45)
+    thermistor = mcp3421Thermistor(i2c_bus.get_i2c(), i2c_addr=0x68)
     while True:
         ultra_sonic_sensor.print_distance()
         temp_humidity_sensor.read_temp_humidity()
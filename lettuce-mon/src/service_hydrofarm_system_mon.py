@@ -1,22 +1,21 @@
 
 import threading
-import random
 import time
 import datetime
-import platform
-import json
-
-import paho.mqtt.client as mqtt
-from board import SCL, SDA
-from busio import I2C
-import lgpio
-from gpiozero import Button
 
 import logger
 import config
+import config_reload
+import i2c_bus
 import sensors
 import depth_sensor
 import display
+import measurement_cache
+import mqtt_connection
+import payload_codec
+import publish_policy
+import sample_scheduler
+import stream_stats
 
 '''
 TODO:
@@ -30,6 +29,9 @@ I2C Devices
 
 class HydroFarmSystemMonitor:
 
+    # Scheduler lateness / jitter summary is logged (and restarted) this often
+    _TIMING_REPORT_PERIOD_SECONDS = 600
+
     '''
     Initialize app logger and config; prepare to start monitoring.
     Note: Keeping the top-level class as generic as possible for reusability.
@@ -54,15 +56,29 @@ class HydroFarmSystemMonitor:
                                                 self._app_logger, 
                                                 force_overwrite_existing_config,
                                                 "system")
-
-        # Create and connect to MQTT Broker - fail if unable to connect
-        self._mqtt_client_connect()
-        self._last_report_timestamp = None
+        # Validated, read-only snapshot of the config; unknown or mistyped keys fail here at startup
+        self._config = self._app_config.compile()
+        # Log sinks (rotating file, flood suppression) from config
+        self._app_logger.configure(self._config.logging)
+
+        # Create MQTT connection supervisor - connects in the background
+        self._mqtt_connection = self._create_mqtt_connection(self._config.mqtt)
+        self._mqtt_connection.start()
+        # Report by exception: publish on significant change or heartbeat, not on every report tick
+        self._publish_policy = publish_policy.PublishPolicy.from_config(self._config.mqtt.publish_policy,
+                                                                        self._config.mqtt.report_period_seconds)
+        # Sensor payload encoding selected in the config (json / cbor / struct)
+        self._sensor_payload_codec = payload_codec.create_codec(self._config.mqtt.sensor_payload_codec,
+                                                                payload_codec.SYSTEM_MONITOR_SENSOR_SCHEMA)
         
         # Create I2C Bus and initialize sensors
-        # Environment Temperature and Humidity Sensor (SHT31)
-        i2c_addr_env_sensor = self._app_config.active_config["sensors"]["env_temp_humidity"]["i2c_addr"]
-        self._sensor_environment_temp_humidity = sensors.sht31(I2C(SCL, SDA), i2c_addr_env_sensor, False)
+        # Measurement cache - every consumer within a sample period shares one physical read
+        self._measurement_cache = measurement_cache.MeasurementCache()
+        self._install_env_temp_humidity_sensor(self._create_env_temp_humidity_sensor(self._config), self._config)
+
+        # Hot reload: valid config edits are picked up by the watcher and applied by the monitoring loop
+        self._pending_config = None
+        self._config_watcher = self._app_config.watch(self._config_reloaded)
     
         # Initialization complete.
         self._app_logger.write(self._log_key, "Initialized.", logger.MessageLevel.INFO) 
@@ -86,105 +102,140 @@ class HydroFarmSystemMonitor:
     
     ''' ------ Private Functions ------'''
     '''
-    Main program thread: read sensors and publish data
+    Main program thread: read sensors and publish data on fixed monotonic deadlines
     '''
     def _sensor_read_publish_thread(self):
-        sensor_sample_period_seconds = self._app_config.active_config["sensor_sample_period_seconds"]
-        sensor_sample_period_seconds = 1
-        while True:
-            # Read Sensors
-            sensor_data = dict()
-            sensor_data["timestamp_iso"] = datetime.datetime.now().isoformat()
-            sensor_data["env_temperature_f"] = self._sensor_environment_temp_humidity.read_temp_humidity().temperature
-            sensor_data["env_humidity"] = self._sensor_environment_temp_humidity.read_temp_humidity().humidity
-
-            self._print_data_to_console(sensor_data)
-
-            # Publish Sensor Data to OpenHab
-            if self._last_report_timestamp is None or (datetime.datetime.now() - self._last_report_timestamp).seconds >= self._app_config.active_config["mqtt"]["report_period_seconds"]:
-                self._last_report_timestamp = datetime.datetime.now()
-                
-                # Publish to MQTT
-                topic_parts = [self._app_config.active_config['mqtt']['base_topic']]
-                if self._app_config.active_config['mqtt']['use_host_name_in_mqtt_topic'] is True:
-                    topic_parts.append(platform.node())
-                else:
-                    topic_parts.append(self._app_config.active_config['mqtt']['not_host_hame']) 
-                topic_parts.append(self._app_config.active_config['mqtt']['sensor_topic'])
-                sensor_mqtt_topic = self._mqtt_topic_join(topic_parts)
-                
-                data_json_str = json.dumps(sensor_data)
-                self._mqtt_publish(sensor_mqtt_topic, data_json_str)
-
-            # Sleep
-            time.sleep(sensor_sample_period_seconds)
-
-    '''
-    Prints all sensor data to the console to support debugging
-    '''
-    def _print_data_to_console(self, sensor_data):
+        # Running statistics of every sample taken since the last published report
+        self._sensor_window_stats = stream_stats.WindowAggregator()
+        scheduler = sample_scheduler.SampleScheduler(self._app_logger)
+        self._scheduler = scheduler
+        scheduler.add_task("config_reload", 1.0, self._apply_pending_config)
+        scheduler.add_task("report", self._config.sensor_sample_period_seconds, self._report_sensor_data)
+        scheduler.add_task("timing_report", self._TIMING_REPORT_PERIOD_SECONDS, scheduler.log_timing_report,
+                           phase_seconds=self._TIMING_REPORT_PERIOD_SECONDS)
+        scheduler.run_forever()
+
+    '''
+    Read the sensors and publish them to OpenHAB when the publish policy allows
+    '''
+    def _report_sensor_data(self):
+        timestamp = time.time()
+        sensor_data = dict()
+        sensor_data["env_temperature_f"] = self._measurement_cache.get("env_temp_humidity").temperature
+        sensor_data["env_humidity"] = self._measurement_cache.get("env_temp_humidity").humidity
+        self._sensor_window_stats.add_sample(sensor_data)
+
+        # Console dump is formatted on the logger thread, only if INFO is enabled
+        self._app_logger.write(self._log_key, self._format_console_data, logger.MessageLevel.INFO, timestamp, dict(sensor_data))
+
+        # Publish Sensor Data to OpenHab
+        publish_reason = self._publish_policy.check(sensor_data)
+        if publish_reason is not None:
+            # Summary of every sample since the previous report
+            published_data = dict(sensor_data)
+            published_data["window_stats"] = self._sensor_window_stats.snapshot()
+
+            # Publish to MQTT (topic precomputed when the config was compiled)
+            payload = self._sensor_payload_codec.encode(published_data, timestamp)
+            if self._mqtt_publish(self._config.mqtt.sensor_topic_full, payload):
+                self._publish_policy.mark_published(sensor_data, publish_reason)
+                self._sensor_window_stats.reset()
+
+    '''
+    Environment Temperature and Humidity Sensor (SHT31)
+    '''
+    def _create_env_temp_humidity_sensor(self, app_config : config.AppConfig):
+        env_sensor_config = app_config.require_sensor("env_temp_humidity")
+        return sensors.sht31(i2c_bus.get_i2c(app_config.i2c.bus), env_sensor_config.i2c_addr, False, env_sensor_config.periodic_mps)
+
+    def _install_env_temp_humidity_sensor(self, sensor, app_config : config.AppConfig):
+        self._sensor_environment_temp_humidity = sensor
+        self._measurement_cache.register("env_temp_humidity",
+                                         sensor.read_temp_humidity,
+                                         app_config.require_sensor("env_temp_humidity").sample_period_seconds)
+
+    '''
+    Called on the config watcher thread with a validated config; applied by the monitoring loop
+    '''
+    def _config_reloaded(self, new_config : config.AppConfig, config_dict : dict):
+        try:
+            new_config.require_sensor("env_temp_humidity")
+        except config.ConfigError as e:
+            self._app_logger.write(self._log_key, f"Config change ignored: {e}", logger.MessageLevel.ERROR)
+            return
+        self._pending_config = (new_config, config_dict)
+
+    '''
+    Swap in a reloaded config, re-initializing only the subsystems whose settings changed.
+    All of them are built before any is swapped in; if one fails the running config and
+    subsystems are kept.
+    '''
+    def _apply_pending_config(self):
+        pending_config = self._pending_config
+        if pending_config is None:
+            return
+        self._pending_config = None
+        (new_config, config_dict) = pending_config
+        old_config = self._config
+        reload = config_reload.ConfigReload(old_config, new_config, self._app_logger, self._log_key)
+        reload.stage_service_changes(self, payload_codec.SYSTEM_MONITOR_SENSOR_SCHEMA)
+        if new_config.i2c != old_config.i2c or new_config.sensors["env_temp_humidity"] != old_config.sensors["env_temp_humidity"]:
+            reload.stage("env_temp_humidity",
+                         lambda: self._create_env_temp_humidity_sensor(new_config),
+                         lambda sensor: self._install_env_temp_humidity_sensor(sensor, new_config))
+        reload.on_commit(lambda: setattr(self._scheduler.get_task("report"), "period_seconds", new_config.sensor_sample_period_seconds))
+        reload.apply(lambda app_config: self._commit_config(app_config, config_dict))
+
+    '''
+    Make an applied config the running one; the config manager then saves / compiles it too
+    '''
+    def _commit_config(self, app_config : config.AppConfig, config_dict : dict):
+        self._config = app_config
+        self._app_config.activate(config_dict)
+
+    '''
+    Formats all sensor data for the console to support debugging (called lazily by the logger)
+    '''
+    def _format_console_data(self, timestamp, sensor_data) -> str:
             console_str = "--- Sensor Data ---\n"
-            console_str += f"Timestamp:                {sensor_data['timestamp_iso']}\n"
+            console_str += f"Timestamp:                {datetime.datetime.fromtimestamp(timestamp).isoformat()}\n"
             console_str += f"Env. Temp (F):            {sensor_data['env_temperature_f']:.1f}F\n"
             console_str += f"Env. Humidity (%):        {sensor_data['env_humidity']:.1f}%\n"
-            self._app_logger.write(self._log_key, console_str, logger.MessageLevel.INFO) 
+            return console_str
 
     '''
-    Join MQTT topic parts into a single string with single slashes
+    Creates the MQTT connection supervisor (not started); connecting and reconnecting happen on its own thread
     '''
-    def _mqtt_topic_join(self, topic_parts: list) -> str:
-        topic_parts = [part.strip("/") for part in topic_parts]
-        return "/".join(topic_parts)
+    def _create_mqtt_connection(self, mqtt_config : config.MqttConfig):
+        return mqtt_connection.MqttConnectionSupervisor(mqtt_config.server_url,
+                                                        mqtt_config.server_port,
+                                                        self._app_logger,
+                                                        reconnect_min_seconds=mqtt_config.reconnect_min_seconds,
+                                                        reconnect_max_seconds=mqtt_config.reconnect_max_seconds,
+                                                        on_publish=self._mqtt_on_publish)
 
     '''
-    Creates the mqtt client and connects to the broker
-    '''
-    def _mqtt_client_connect(self):
-        client_id = f'python-mqtt-{random.randint(0, 1000)}'
-        self._mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id)
-        self._mqtt_client.on_connect = self._mqtt_on_connect
-        self._mqtt_client.on_publish = self._mqtt_on_publish
-        
-        server_url = self._app_config.active_config["mqtt"]["server_url"]
-        server_port = self._app_config.active_config["mqtt"]["server_port"]
-        mqtt_conn_code = self._mqtt_client.connect(server_url, server_port, 60)
-        self._mqtt_client.loop_start()
-        self._app_logger.write(self._log_key, f"MQTT Client Connect Code: {mqtt_conn_code}", logger.MessageLevel.INFO)
-        time.sleep(0.5)
-        mqtt_connected = self._mqtt_client.is_connected()
-        if mqtt_connected is False:
-            mqtt_client_err_msg = "Client failed to connect to MQTT Broker."
-            self._app_logger.write(self._log_key, mqtt_client_err_msg, logger.MessageLevel.ERROR)
-                
-    '''
-    Publish a message to the MQTT Broker
-    '''
-    def _mqtt_publish(self, mqtt_topic, json_str_msg, validate_connection=True):
-        # Validate connection (if enabled)
-        if validate_connection is True:
-            if self._mqtt_client is None or self._mqtt_client.is_connected() is False:
-                self._mqtt_client_connect()
-        # Publish message
-        if self._mqtt_client is not None and self._mqtt_client.is_connected():
-            qos = 2
-            retain = True
-            mqtt_msg_info = self._mqtt_client.publish(mqtt_topic, 
-                                                    json_str_msg, 
-                                                    qos, 
-                                                    retain)
-            self._app_logger.write("mqtt", f"Message published w/ code: {mqtt_msg_info.rc}", logger.MessageLevel.INFO)
-        
-    '''
-    The callback for when the client receives a CONNACK response from the server.
+    Publish a message to the MQTT Broker; dropped (never blocks) while disconnected.
+    Returns True if the message was handed to the MQTT client.
     '''
-    def _mqtt_on_connect(self, client, userdata, flags, rc):
-        self._app_logger.write("mqtt", "Connected with result code "+str(rc), logger.MessageLevel.INFO)
+    def _mqtt_publish(self, mqtt_topic, payload) -> bool:
+        qos = 2
+        retain = True
+        mqtt_msg_info = self._mqtt_connection.publish(mqtt_topic,
+                                                      payload,
+                                                      qos,
+                                                      retain)
+        if mqtt_msg_info is None or mqtt_msg_info.rc != 0:
+            self._app_logger.write("mqtt", "Not connected to MQTT Broker; message dropped.", logger.MessageLevel.WARN)
+            return False
+        self._app_logger.write("mqtt", "Message published w/ code: %s", logger.MessageLevel.INFO, mqtt_msg_info.rc)
+        return True
 
     '''
     The callback for when a message is published to the server
     '''
     def _mqtt_on_publish(self, client, userdata, msg):
-        self._app_logger.write("mqtt", f"Message published: {msg}", logger.MessageLevel.INFO)
+        self._app_logger.write("mqtt", "Message published: %s", logger.MessageLevel.INFO, msg)
     
     '''
     Called when button press is detected. Capture the current distance as an offset
@@ -0,0 +1,211 @@
+'''
+Streaming signal conditioning: median, Hampel outlier rejection, EMA and 1-D
+Kalman filters over array-backed ring buffers, chained per field.
+
+Every filter has update(value) -> filtered value and reset(). Window filters
+keep their samples in an array('d') ring and do the window work with C-level
+builtins (sorted / map) over it, so the per-sample cost stays small.
+'''
+import array
+import math
+
+
+class SampleRing:
+    '''
+    Fixed-size ring of floats; values() returns the held samples (unordered)
+    '''
+    def __init__(self, size : int) -> None:
+        if size < 1:
+            raise ValueError(f"Ring size must be positive: {size}")
+        self._buffer = array.array('d', bytes(8 * size))
+        self._size = size
+        self._index = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value : float) -> None:
+        self._buffer[self._index] = value
+        self._index = (self._index + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+
+    def values(self):
+        if self._count == self._size:
+            return self._buffer
+        return self._buffer[:self._count]
+
+    def clear(self) -> None:
+        self._index = 0
+        self._count = 0
+
+
+def _median(values) -> float:
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2 == 1:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2.0
+
+
+class MedianFilter:
+    '''
+    Running median of the last window samples
+    '''
+    def __init__(self, window : int = 5) -> None:
+        self._ring = SampleRing(window)
+
+    def update(self, value : float) -> float:
+        self._ring.append(value)
+        return _median(self._ring.values())
+
+    def reset(self) -> None:
+        self._ring.clear()
+
+
+class HampelFilter:
+    '''
+    Replaces a sample with the window median when it is more than n_sigmas
+    robust standard deviations (1.4826 * MAD) away from it. Raw samples are
+    kept in the window, so a genuine level change is accepted once it fills
+    half the window.
+    '''
+    _MAD_SCALE = 1.4826
+
+    def __init__(self, window : int = 7, n_sigmas : float = 3.0) -> None:
+        self._ring = SampleRing(window)
+        self.n_sigmas = n_sigmas
+        self.rejected_count = 0
+
+    def update(self, value : float) -> float:
+        self._ring.append(value)
+        values = self._ring.values()
+        if len(values) < 3:
+            return value
+        median = _median(values)
+        mad = _median(map(abs, map(median.__rsub__, values)))
+        if abs(value - median) > self.n_sigmas * self._MAD_SCALE * mad:
+            self.rejected_count += 1
+            return median
+        return value
+
+    def reset(self) -> None:
+        self._ring.clear()
+
+
+class EmaFilter:
+    '''
+    Exponential moving average; alpha in (0, 1], larger follows faster
+    '''
+    def __init__(self, alpha : float = 0.3) -> None:
+        if not 0 < alpha <= 1:
+            raise ValueError(f"EMA alpha must be in (0, 1]: {alpha}")
+        self.alpha = alpha
+        self._value = None
+
+    def update(self, value : float) -> float:
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self.alpha * (value - self._value)
+        return self._value
+
+    def reset(self) -> None:
+        self._value = None
+
+
+class KalmanFilter1D:
+    '''
+    Scalar Kalman filter for a slowly drifting level (random walk model).
+    process_variance: expected drift per sample; measurement_variance: sensor noise.
+    '''
+    def __init__(self, process_variance : float = 1e-3, measurement_variance : float = 1e-2) -> None:
+        if process_variance < 0 or measurement_variance <= 0:
+            raise ValueError(f"Invalid Kalman variances: process={process_variance}, measurement={measurement_variance}")
+        self.process_variance = process_variance
+        self.measurement_variance = measurement_variance
+        self.reset()
+
+    def update(self, value : float) -> float:
+        if self._estimate is None:
+            self._estimate = value
+            self._error_variance = self.measurement_variance
+            return self._estimate
+        # Predict
+        self._error_variance += self.process_variance
+        # Correct
+        gain = self._error_variance / (self._error_variance + self.measurement_variance)
+        self._estimate += gain * (value - self._estimate)
+        self._error_variance *= (1.0 - gain)
+        return self._estimate
+
+    def reset(self) -> None:
+        self._estimate = None
+        self._error_variance = None
+
+
+class FilterChain:
+    '''
+    Filters applied in order; None / NaN samples pass through without touching the filters
+    '''
+    def __init__(self, filters : list) -> None:
+        self.filters = filters
+
+    def update(self, value):
+        if value is None or math.isnan(value):
+            return value
+        for signal_filter in self.filters:
+            value = signal_filter.update(value)
+        return value
+
+    def reset(self) -> None:
+        for signal_filter in self.filters:
+            signal_filter.reset()
+
+
+_FILTER_TYPES = {"median": (MedianFilter, ("window",)),
+                 "hampel": (HampelFilter, ("window", "n_sigmas")),
+                 "ema": (EmaFilter, ("alpha",)),
+                 "kalman": (KalmanFilter1D, ("process_variance", "measurement_variance"))}
+# Filter type -> names of its config parameters
+FILTER_PARAMETERS = {filter_type: parameter_names for (filter_type, (_, parameter_names)) in _FILTER_TYPES.items()}
+
+'''
+Build a chain from compiled filter configs (config.FilterConfig: type and parameter
+attributes, None where the filter's default applies)
+'''
+def build_filter_chain(chain_config) -> FilterChain:
+    filters = list()
+    for filter_config in chain_config:
+        filter_type = filter_config.type
+        if filter_type not in _FILTER_TYPES:
+            raise ValueError(f"Unknown filter type '{filter_type}' (use one of {list(_FILTER_TYPES)})")
+        filter_class, parameter_names = _FILTER_TYPES[filter_type]
+        parameters = {name: getattr(filter_config, name) for name in parameter_names if getattr(filter_config, name) is not None}
+        filters.append(filter_class(**parameters))
+    return FilterChain(filters)
+
+
+class FieldFilterBank:
+    '''
+    One filter chain per field; fields without a chain pass through unchanged.
+    '''
+    def __init__(self, filters_config = None) -> None:
+        self._chains = dict()
+        if filters_config is not None:
+            for field, chain_config in filters_config.items():
+                self._chains[field] = build_filter_chain(chain_config)
+
+    def update(self, field : str, value):
+        chain = self._chains.get(field)
+        if chain is None:
+            return value
+        return chain.update(value)
+
+    def get_chain(self, field : str) -> FilterChain:
+        return self._chains.get(field)
+
+    def reset(self) -> None:
+        for chain in self._chains.values():
+            chain.reset()
@@ -0,0 +1,1335 @@
+'''
+Register-level simulated I2C and GPIO devices.
+
+Lets the monitors and drivers run on a Linux build box without a Raspberry Pi
+attached. Each simulated device implements the same register / command map as
+the real part so the drivers exercise their real byte-level protocol, and every
+device carries a SimDeviceProfile for latency, noise and fault injection.
+'''
+import math
+import random
+import threading
+import time
+
+
+'''
+Errno raised by the Linux I2C stack when a device does not acknowledge.
+'''
+I2C_NACK_ERRNO = 121
+
+
+class SimDeviceProfile:
+    '''
+    Latency, noise and fault injection settings for a simulated device.
+        latency_seconds     - extra delay added to every bus transaction
+        noise_std           - std. deviation of the gaussian noise on the measured quantity
+        nack_probability    - probability a transaction fails with a remote I/O error
+        corrupt_probability - probability a read returns one flipped bit
+        disconnected        - device never acknowledges its address
+    '''
+    def __init__(self,
+                 latency_seconds : float = 0.0,
+                 noise_std : float = 0.0,
+                 nack_probability : float = 0.0,
+                 corrupt_probability : float = 0.0,
+                 disconnected : bool = False) -> None:
+        self.latency_seconds = latency_seconds
+        self.noise_std = noise_std
+        self.nack_probability = nack_probability
+        self.corrupt_probability = corrupt_probability
+        self.disconnected = disconnected
+
+
+def _nack(i2c_addr : int) -> OSError:
+    return OSError(I2C_NACK_ERRNO, f"Remote I/O error (simulated NACK from 0x{i2c_addr:02x})")
+
+
+def _sensirion_crc8(data) -> int:
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x31) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+    return crc
+
+
+class SimI2CDeviceModel:
+    '''
+    Base class for a simulated I2C target. Sub-classes implement write() and read().
+    '''
+    def __init__(self, i2c_addr : int, profile : SimDeviceProfile = None) -> None:
+        self.i2c_addr = i2c_addr
+        self.profile = profile if profile is not None else SimDeviceProfile()
+
+    '''
+    Handle a write transaction (START, address + W, data..., STOP)
+    '''
+    def write(self, data : bytes) -> None:
+        raise _nack(self.i2c_addr)
+
+    '''
+    Handle a read transaction (START, address + R, length bytes, STOP)
+    '''
+    def read(self, length : int) -> bytes:
+        raise _nack(self.i2c_addr)
+
+    '''
+    Handle a combined write then repeated-start read transaction
+    '''
+    def write_then_read(self, data : bytes, length : int) -> bytes:
+        self.write(data)
+        return self.read(length)
+
+    '''
+    Apply the configured measurement noise to a value
+    '''
+    def _noisy(self, value : float) -> float:
+        if self.profile.noise_std > 0:
+            return value + random.gauss(0, self.profile.noise_std)
+        return value
+
+
+class SimI2CBus:
+    '''
+    Stand-in for busio.I2C that routes transactions to simulated device models.
+    Transfer time at the configured bus frequency is modelled so bus occupancy
+    is comparable to the real hardware.
+    '''
+    def __init__(self, bus_number : int = 1, frequency : int = 100000) -> None:
+        self.bus_number = bus_number
+        self.frequency = frequency
+        self.transaction_count = 0
+        self.bytes_transferred = 0
+        self._devices = dict()
+        self._bus_lock = threading.RLock()
+        self._user_lock = threading.Lock()
+
+    def attach(self, device : SimI2CDeviceModel) -> SimI2CDeviceModel:
+        self._devices[device.i2c_addr] = device
+        return device
+
+    def detach(self, i2c_addr : int) -> None:
+        self._devices.pop(i2c_addr, None)
+
+    def get_device(self, i2c_addr : int) -> SimI2CDeviceModel:
+        return self._devices.get(i2c_addr)
+
+    def scan(self) -> list:
+        return sorted(addr for addr, dev in self._devices.items() if not dev.profile.disconnected)
+
+    def try_lock(self) -> bool:
+        return self._user_lock.acquire(blocking=False)
+
+    def unlock(self) -> None:
+        self._user_lock.release()
+
+    def deinit(self) -> None:
+        pass
+
+    def writeto(self, address : int, buffer, *, start : int = 0, end : int = None) -> None:
+        data = bytes(buffer[start:end])
+        with self._bus_lock:
+            device = self._begin(address, len(data))
+            device.write(data)
+
+    def readfrom_into(self, address : int, buffer, *, start : int = 0, end : int = None) -> None:
+        end = len(buffer) if end is None else end
+        with self._bus_lock:
+            device = self._begin(address, end - start)
+            data = self._finish_read(device, device.read(end - start))
+            buffer[start:end] = data
+
+    def writeto_then_readfrom(self, address : int, buffer_out, buffer_in, *,
+                              out_start : int = 0, out_end : int = None,
+                              in_start : int = 0, in_end : int = None) -> None:
+        data_out = bytes(buffer_out[out_start:out_end])
+        in_end = len(buffer_in) if in_end is None else in_end
+        with self._bus_lock:
+            device = self._begin(address, len(data_out) + in_end - in_start)
+            data_in = self._finish_read(device, device.write_then_read(data_out, in_end - in_start))
+            buffer_in[in_start:in_end] = data_in
+
+    '''
+    Address the device: apply transfer time, latency and NACK injection
+    '''
+    def _begin(self, address : int, payload_len : int) -> SimI2CDeviceModel:
+        self.transaction_count += 1
+        self.bytes_transferred += payload_len + 1
+        device = self._devices.get(address)
+        if device is None or device.profile.disconnected:
+            raise _nack(address)
+        delay = device.profile.latency_seconds
+        if self.frequency > 0:
+            # 9 clocks per byte (8 data + ACK) including the address byte
+            delay += (payload_len + 1) * 9 / self.frequency
+        if delay > 0:
+            time.sleep(delay)
+        if device.profile.nack_probability > 0 and random.random() < device.profile.nack_probability:
+            raise _nack(address)
+        return device
+
+    '''
+    Apply bit-flip corruption to read data
+    '''
+    def _finish_read(self, device : SimI2CDeviceModel, data : bytes) -> bytes:
+        data = bytearray(data)
+        if len(data) > 0 and device.profile.corrupt_probability > 0 and random.random() < device.profile.corrupt_probability:
+            data[random.randrange(len(data))] ^= (1 << random.randrange(8))
+        return data
+
+
+class SimI2CDevice:
+    '''
+    Stand-in for adafruit_bus_device.i2c_device.I2CDevice on a simulated bus.
+    Like the real one it probes the address on creation (probe=False skips it).
+    '''
+    def __init__(self, i2c : SimI2CBus, device_address : int, probe : bool = True) -> None:
+        self.i2c = i2c
+        self.device_address = device_address
+        if probe and device_address not in i2c.scan():
+            raise ValueError(f"No I2C device at address: 0x{device_address:x}")
+
+    def readinto(self, buf, *, start : int = 0, end : int = None) -> None:
+        self.i2c.readfrom_into(self.device_address, buf, start=start, end=end)
+
+    def write(self, buf, *, start : int = 0, end : int = None) -> None:
+        self.i2c.writeto(self.device_address, buf, start=start, end=end)
+
+    def write_then_readinto(self, out_buffer, in_buffer, *,
+                            out_start : int = 0, out_end : int = None,
+                            in_start : int = 0, in_end : int = None) -> None:
+        self.i2c.writeto_then_readfrom(self.device_address, out_buffer, in_buffer,
+                                       out_start=out_start, out_end=out_end,
+                                       in_start=in_start, in_end=in_end)
+
+    def __enter__(self):
+        while not self.i2c.try_lock():
+            time.sleep(0)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self.i2c.unlock()
+        return False
+
+
+class SimSMBus:
+    '''
+    Stand-in for smbus2.SMBus on a simulated bus.
+    '''
+    def __init__(self, i2c : SimI2CBus) -> None:
+        self.i2c = i2c
+        self.closed = False
+
+    def write_byte(self, i2c_addr : int, value : int) -> None:
+        self.i2c.writeto(i2c_addr, bytes([value & 0xFF]))
+
+    def read_byte(self, i2c_addr : int) -> int:
+        buf = bytearray(1)
+        self.i2c.readfrom_into(i2c_addr, buf)
+        return buf[0]
+
+    def write_byte_data(self, i2c_addr : int, register : int, value : int) -> None:
+        self.i2c.writeto(i2c_addr, bytes([register & 0xFF, value & 0xFF]))
+
+    def read_byte_data(self, i2c_addr : int, register : int) -> int:
+        return self.read_i2c_block_data(i2c_addr, register, 1)[0]
+
+    def write_i2c_block_data(self, i2c_addr : int, register : int, data : list) -> None:
+        self.i2c.writeto(i2c_addr, bytes([register & 0xFF]) + bytes(data))
+
+    def read_i2c_block_data(self, i2c_addr : int, register : int, length : int) -> list:
+        buf = bytearray(length)
+        self.i2c.writeto_then_readfrom(i2c_addr, bytes([register & 0xFF]), buf)
+        return list(buf)
+
+    '''
+    Combined transfer; a write immediately followed by a read of the same
+    device is issued with a repeated start
+    '''
+    def i2c_rdwr(self, *i2c_msgs) -> None:
+        index = 0
+        while index < len(i2c_msgs):
+            msg = i2c_msgs[index]
+            next_msg = i2c_msgs[index + 1] if index + 1 < len(i2c_msgs) else None
+            if msg.is_read():
+                self.i2c.readfrom_into(msg.addr, msg.buf)
+            elif next_msg is not None and next_msg.is_read() and next_msg.addr == msg.addr:
+                self.i2c.writeto_then_readfrom(msg.addr, msg.buf, next_msg.buf)
+                index += 1
+            else:
+                self.i2c.writeto(msg.addr, msg.buf)
+            index += 1
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class SimI2CMsg:
+    '''
+    Stand-in for smbus2.i2c_msg
+    '''
+    I2C_M_RD = 0x0001
+
+    def __init__(self, addr : int, flags : int, buf : bytearray) -> None:
+        self.addr = addr
+        self.flags = flags
+        self.buf = buf
+        self.len = len(buf)
+
+    @staticmethod
+    def read(address : int, length : int) -> 'SimI2CMsg':
+        return SimI2CMsg(address, SimI2CMsg.I2C_M_RD, bytearray(length))
+
+    @staticmethod
+    def write(address : int, buf) -> 'SimI2CMsg':
+        if isinstance(buf, str):
+            buf = buf.encode()
+        return SimI2CMsg(address, 0, bytearray(buf))
+
+    def is_read(self) -> bool:
+        return bool(self.flags & SimI2CMsg.I2C_M_RD)
+
+    def __iter__(self):
+        return iter(self.buf)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.buf)
+
+    def __len__(self) -> int:
+        return self.len
+
+
+''' ------ Device Models ------'''
+
+class SimSHT31(SimI2CDeviceModel):
+    '''
+    Sensirion SHT31 temperature / humidity sensor (command based, CRC-8 protected).
+    Clock-stretching commands hold the bus until the conversion completes; the
+    non-stretching variants NACK reads until the result is ready.
+    In periodic acquisition mode the fetch command (0xE000) returns the newest
+    measurement once; reads NACK until the next one completes. Single shot
+    commands are ignored (NACKed) until a break (0x3093).
+    '''
+    # Command -> conversion time (seconds)
+    _STRETCH_COMMANDS = {0x2C06: 0.0155, 0x2C0D: 0.0065, 0x2C10: 0.0045}
+    _NO_STRETCH_COMMANDS = {0x2400: 0.0155, 0x240B: 0.0065, 0x2416: 0.0045}
+    # Periodic command (high repeatability) -> measurements per second
+    _PERIODIC_COMMANDS = {0x2032: 0.5, 0x2130: 1.0, 0x2236: 2.0, 0x2334: 4.0, 0x2737: 10.0}
+    _CMD_FETCH_DATA = 0xE000
+    _CMD_BREAK = 0x3093
+    _CMD_SOFT_RESET = 0x30A2
+    _CMD_READ_STATUS = 0xF32D
+    _CMD_CLEAR_STATUS = 0x3041
+
+    def __init__(self, i2c_addr : int = 0x44,
+                 temperature_c : float = 22.0,
+                 humidity : float = 55.0,
+                 profile : SimDeviceProfile = None) -> None:
+        super().__init__(i2c_addr, profile)
+        self.temperature_c = temperature_c
+        self.humidity = humidity
+        self.measurement_count = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._ready_at = None
+        self._stretch = False
+        self._output = None
+        self._periodic_since = None
+        self._periodic_period = None
+        self._fetched_index = -1
+
+    def write(self, data : bytes) -> None:
+        if len(data) < 2:
+            raise _nack(self.i2c_addr)
+        command = (data[0] << 8) | data[1]
+        if self._periodic_since is not None:
+            self._write_periodic_command(command)
+        elif command in self._PERIODIC_COMMANDS:
+            self._periodic_since = time.monotonic()
+            self._periodic_period = 1.0 / self._PERIODIC_COMMANDS[command]
+            self._fetched_index = -1
+            self._output = None
+        elif command in self._STRETCH_COMMANDS:
+            self._start_measurement(self._STRETCH_COMMANDS[command], True)
+        elif command in self._NO_STRETCH_COMMANDS:
+            self._start_measurement(self._NO_STRETCH_COMMANDS[command], False)
+        elif command == self._CMD_SOFT_RESET:
+            self._reset()
+        elif command == self._CMD_READ_STATUS:
+            self._output = self._with_crc([0x80, 0x10])
+        elif command == self._CMD_CLEAR_STATUS:
+            pass
+        else:
+            raise _nack(self.i2c_addr)
+
+    def read(self, length : int) -> bytes:
+        if self._ready_at is not None:
+            remaining = self._ready_at - time.monotonic()
+            if remaining > 0:
+                if not self._stretch:
+                    raise _nack(self.i2c_addr)
+                # Clock stretching: the device holds SCL low until the conversion completes
+                time.sleep(remaining)
+            self._ready_at = None
+            self._output = self._sample()
+        if self._output is None:
+            raise _nack(self.i2c_addr)
+        data = self._output[:length]
+        self._output = None
+        return bytes(data)
+
+    def _write_periodic_command(self, command : int) -> None:
+        if command == self._CMD_FETCH_DATA:
+            # Measurement k completes one conversion time after start plus k periods
+            elapsed = time.monotonic() - self._periodic_since - self._NO_STRETCH_COMMANDS[0x2400]
+            index = int(elapsed / self._periodic_period) if elapsed >= 0 else -1
+            if index > self._fetched_index:
+                self._fetched_index = index
+                self._output = self._sample()
+            else:
+                self._output = None
+        elif command == self._CMD_BREAK:
+            self._periodic_since = None
+            self._output = None
+        elif command == self._CMD_SOFT_RESET:
+            self._reset()
+        else:
+            raise _nack(self.i2c_addr)
+
+    def _start_measurement(self, duration : float, stretch : bool) -> None:
+        self._ready_at = time.monotonic() + duration
+        self._stretch = stretch
+        self._output = None
+
+    def _sample(self) -> bytes:
+        self.measurement_count += 1
+        temperature_c = self._noisy(self.temperature_c)
+        humidity = min(100.0, max(0.0, self._noisy(self.humidity)))
+        raw_t = min(0xFFFF, max(0, round((temperature_c + 45.0) * 65535.0 / 175.0)))
+        raw_rh = min(0xFFFF, max(0, round(humidity * 65535.0 / 100.0)))
+        return self._with_crc([raw_t >> 8, raw_t & 0xFF]) + self._with_crc([raw_rh >> 8, raw_rh & 0xFF])
+
+    def _with_crc(self, word : list) -> bytes:
+        return bytes(word + [_sensirion_crc8(word)])
+
+
+class SimHTS221(SimI2CDeviceModel):
+    '''
+    ST HTS221 temperature / humidity sensor (register map with factory calibration).
+    Multi-byte reads auto-increment when bit 7 of the register address is set.
+    '''
+    REG_WHO_AM_I = 0x0F
+    REG_CTRL_REG1 = 0x20
+    REG_CTRL_REG2 = 0x21
+    REG_STATUS = 0x27
+    REG_HUMIDITY_OUT_L = 0x28
+    REG_TEMP_OUT_L = 0x2A
+    WHO_AM_I = 0xBC
+
+    # Calibration: T0 = 10 degC -> 0, T1 = 40 degC -> 3000; H0 = 20 %rH -> 0, H1 = 80 %rH -> 6000
+    _T0_DEGC, _T1_DEGC, _T0_OUT, _T1_OUT = 10.0, 40.0, 0, 3000
+    _H0_RH, _H1_RH, _H0_OUT, _H1_OUT = 20.0, 80.0, 0, 6000
+
+    def __init__(self, i2c_addr : int = 0x5F,
+                 temperature_c : float = 21.0,
+                 humidity : float = 45.0,
+                 profile : SimDeviceProfile = None) -> None:
+        super().__init__(i2c_addr, profile)
+        self.temperature_c = temperature_c
+        self.humidity = humidity
+        self._registers = bytearray(0x40)
+        self._registers[self.REG_WHO_AM_I] = self.WHO_AM_I
+        self._registers[0x30] = int(self._H0_RH * 2)
+        self._registers[0x31] = int(self._H1_RH * 2)
+        t0_x8 = int(self._T0_DEGC * 8)
+        t1_x8 = int(self._T1_DEGC * 8)
+        self._registers[0x32] = t0_x8 & 0xFF
+        self._registers[0x33] = t1_x8 & 0xFF
+        self._registers[0x35] = ((t1_x8 >> 8) & 0x03) << 2 | ((t0_x8 >> 8) & 0x03)
+        self._set_int16(0x36, self._H0_OUT)
+        self._set_int16(0x3A, self._H1_OUT)
+        self._set_int16(0x3C, self._T0_OUT)
+        self._set_int16(0x3E, self._T1_OUT)
+        self._pointer = 0
+        self._auto_increment = False
+
+    def write(self, data : bytes) -> None:
+        if len(data) < 1:
+            raise _nack(self.i2c_addr)
+        self._pointer = data[0] & 0x7F
+        self._auto_increment = bool(data[0] & 0x80)
+        for offset, value in enumerate(data[1:]):
+            register = self._pointer + (offset if self._auto_increment else 0)
+            if register in (self.REG_CTRL_REG1, self.REG_CTRL_REG2, 0x10):
+                self._registers[register] = value
+
+    def read(self, length : int) -> bytes:
+        self._update_outputs()
+        data = bytearray(length)
+        for offset in range(length):
+            register = (self._pointer + (offset if self._auto_increment else 0)) % len(self._registers)
+            data[offset] = self._registers[register]
+        return bytes(data)
+
+    def _update_outputs(self) -> None:
+        powered = self._registers[self.REG_CTRL_REG1] & 0x80
+        one_shot = self._registers[self.REG_CTRL_REG2] & 0x01
+        if not powered:
+            return
+        if one_shot or (self._registers[self.REG_CTRL_REG1] & 0x03):
+            temperature_c = self._noisy(self.temperature_c)
+            humidity = min(100.0, max(0.0, self._noisy(self.humidity)))
+            t_out = self._T0_OUT + (temperature_c - self._T0_DEGC) * (self._T1_OUT - self._T0_OUT) / (self._T1_DEGC - self._T0_DEGC)
+            h_out = self._H0_OUT + (humidity - self._H0_RH) * (self._H1_OUT - self._H0_OUT) / (self._H1_RH - self._H0_RH)
+            self._set_int16(self.REG_TEMP_OUT_L, round(t_out))
+            self._set_int16(self.REG_HUMIDITY_OUT_L, round(h_out))
+            self._registers[self.REG_STATUS] = 0x03
+            self._registers[self.REG_CTRL_REG2] &= 0xFE
+
+    def _set_int16(self, register : int, value : int) -> None:
+        value = max(-32768, min(32767, value)) & 0xFFFF
+        self._registers[register] = value & 0xFF
+        self._registers[register + 1] = value >> 8
+
+
+class SimMCP3421(SimI2CDeviceModel):
+    '''
+    Microchip MCP3421 delta-sigma ADC with a thermistor divider on its input.
+    The configuration byte selects resolution (12/14/16/18-bit), gain and
+    continuous / one-shot mode. The RDY bit of the returned configuration byte
+    is cleared only when a conversion finished since the last read.
+    '''
+    _SAMPLE_RATES = {12: 240.0, 14: 60.0, 16: 15.0, 18: 3.75}
+    _RESOLUTION_BITS = {0: 12, 1: 14, 2: 16, 3: 18}
+
+    def __init__(self, i2c_addr : int = 0x68,
+                 temperature_f : float = 68.0,
+                 v_in : float = 3.3,
+                 shunt_resistor : float = 32020,
+                 profile : SimDeviceProfile = None) -> None:
+        super().__init__(i2c_addr, profile)
+        self.temperature_f = temperature_f
+        self.v_in = v_in
+        self.shunt_resistor = shunt_resistor
+        self.conversion_count = 0
+        self._config = 0x90    # power-on default: continuous, 12-bit, gain 1
+        self._epoch = time.monotonic()
+        self._last_read_index = -1
+        self._one_shot_ready_at = None
+        self._one_shot_code = None
+
+    @property
+    def resolution(self) -> int:
+        return self._RESOLUTION_BITS[(self._config >> 2) & 0x03]
+
+    @property
+    def continuous(self) -> bool:
+        return bool(self._config & 0x10)
+
+    @property
+    def gain(self) -> int:
+        return 1 << (self._config & 0x03)
+
+    def conversion_period(self) -> float:
+        return 1.0 / self._SAMPLE_RATES[self.resolution]
+
+    def write(self, data : bytes) -> None:
+        if len(data) < 1:
+            raise _nack(self.i2c_addr)
+        self._config = data[0] & 0x7F
+        self._epoch = time.monotonic()
+        self._last_read_index = -1
+        if not self.continuous and (data[0] & 0x80):
+            self._one_shot_ready_at = self._epoch + self.conversion_period()
+            self._one_shot_code = None
+
+    def read(self, length : int) -> bytes:
+        now = time.monotonic()
+        ready = False
+        if self.continuous:
+            index = int((now - self._epoch) / self.conversion_period()) - 1
+            if index > self._last_read_index:
+                self._last_read_index = index
+                self._one_shot_code = self._convert()
+                ready = True
+        elif self._one_shot_ready_at is not None and now >= self._one_shot_ready_at:
+            self._one_shot_ready_at = None
+            self._one_shot_code = self._convert()
+            ready = True
+        code = self._one_shot_code if self._one_shot_code is not None else 0
+        config = self._config | (0x00 if ready else 0x80)
+        if self.resolution == 18:
+            raw = code & 0x3FFFF
+            out = [(raw >> 16) & 0xFF | (0xFC if code < 0 else 0), (raw >> 8) & 0xFF, raw & 0xFF, config]
+        else:
+            raw = code & 0xFFFF
+            out = [(raw >> 8) & 0xFF, raw & 0xFF, config]
+        out += [config] * max(0, length - len(out))
+        return bytes(out[:length])
+
+    def _convert(self) -> int:
+        self.conversion_count += 1
+        temperature_f = self._noisy(self.temperature_f)
+        r_thermistor = math.exp((493.17 - temperature_f) / 44.91)
+        v_out = self.v_in * r_thermistor / (self.shunt_resistor + r_thermistor)
+        full_scale = 1 << (self.resolution - 1)
+        code = round(v_out * self.gain / 2.048 * full_scale)
+        return max(-full_scale, min(full_scale - 1, code))
+
+
+class SimVL53L1X(SimI2CDeviceModel):
+    '''
+    ST VL53L1X / VL53L4CD time-of-flight ranging sensor (16-bit register index).
+    A range result is latched only after a full timing budget (or the
+    inter-measurement period, if longer) has elapsed since ranging started;
+    reads that stop ranging early see the previous result.
+    Timing budget and inter-measurement registers hold plain milliseconds
+    rather than the device's encoded macro-period values.
+    '''
+    REG_GPIO_HV_MUX_CTRL = 0x0030
+    REG_GPIO_TIO_HV_STATUS = 0x0031
+    REG_PHASECAL_CONFIG_TIMEOUT = 0x004B
+    REG_RANGE_CONFIG_TIMEOUT_A = 0x005E
+    REG_INTERMEASUREMENT_MS = 0x006C
+    REG_SYSTEM_INTERRUPT_CLEAR = 0x0086
+    REG_SYSTEM_MODE_START = 0x0087
+    REG_RESULT_RANGE_STATUS = 0x0089
+    REG_RESULT_DISTANCE_MM = 0x0096
+    REG_FIRMWARE_SYSTEM_STATUS = 0x00E5
+    REG_MODEL_ID = 0x010F
+    MODEL_ID = 0xEACC
+
+    DISTANCE_MODE_SHORT = 0x14
+    DISTANCE_MODE_LONG = 0x0A
+    _MAX_RANGE_MM = {DISTANCE_MODE_SHORT: 1300, DISTANCE_MODE_LONG: 4000}
+
+    def __init__(self, i2c_addr : int = 0x29,
+                 distance_mm : float = 250.0,
+                 profile : SimDeviceProfile = None) -> None:
+        super().__init__(i2c_addr, profile)
+        self.distance_mm = distance_mm
+        self.timing_budget_ms = 100
+        self.inter_measurement_ms = 100
+        self.distance_mode = self.DISTANCE_MODE_LONG
+        self.measurement_count = 0
+        self._pointer = 0
+        self._ranging_since = None
+        self._completed_index = -1
+        self._cleared_index = -1
+        self._result_mm = 0
+        self._result_status = 0
+
+    def write(self, data : bytes) -> None:
+        if len(data) < 2:
+            raise _nack(self.i2c_addr)
+        self._pointer = (data[0] << 8) | data[1]
+        payload = bytes(data[2:])
+        if len(payload) == 0:
+            return
+        register = self._pointer
+        value = int.from_bytes(payload, "big")
+        if register == self.REG_SYSTEM_MODE_START:
+            if value & 0x40:
+                self._ranging_since = time.monotonic()
+                self._completed_index = -1
+                self._cleared_index = -1
+            else:
+                self._latch_results()
+                self._ranging_since = None
+        elif register == self.REG_SYSTEM_INTERRUPT_CLEAR:
+            self._latch_results()
+            self._cleared_index = self._completed_index
+        elif register == self.REG_RANGE_CONFIG_TIMEOUT_A:
+            self.timing_budget_ms = value
+        elif register == self.REG_INTERMEASUREMENT_MS:
+            self.inter_measurement_ms = value
+        elif register == self.REG_PHASECAL_CONFIG_TIMEOUT:
+            self.distance_mode = value
+
+    def read(self, length : int) -> bytes:
+        self._latch_results()
+        register = self._pointer
+        if register == self.REG_MODEL_ID:
+            value = self.MODEL_ID
+        elif register == self.REG_FIRMWARE_SYSTEM_STATUS:
+            value = 0x01
+        elif register == self.REG_GPIO_HV_MUX_CTRL:
+            value = 0x01    # interrupt active high
+        elif register == self.REG_GPIO_TIO_HV_STATUS:
+            value = 0x01 if self._completed_index > self._cleared_index else 0x00
+        elif register == self.REG_RESULT_RANGE_STATUS:
+            value = self._result_status
+        elif register == self.REG_RESULT_DISTANCE_MM:
+            value = self._result_mm
+        elif register == self.REG_RANGE_CONFIG_TIMEOUT_A:
+            value = self.timing_budget_ms
+        elif register == self.REG_INTERMEASUREMENT_MS:
+            value = self.inter_measurement_ms
+        elif register == self.REG_PHASECAL_CONFIG_TIMEOUT:
+            value = self.distance_mode
+        else:
+            value = 0
+        return value.to_bytes(max(length, 4), "big")[-length:]
+
+    def measurement_period(self) -> float:
+        return max(self.timing_budget_ms, self.inter_measurement_ms) / 1000.0
+
+    def _latch_results(self) -> None:
+        if self._ranging_since is None:
+            return
+        elapsed = time.monotonic() - self._ranging_since
+        if elapsed < self.timing_budget_ms / 1000.0:
+            return
+        index = int((elapsed - self.timing_budget_ms / 1000.0) / self.measurement_period())
+        # The device does not report a new result until the previous interrupt is cleared
+        index = min(index, self._cleared_index + 1)
+        if index > self._completed_index:
+            self._completed_index = index
+            self.measurement_count += 1
+            distance_mm = self._noisy(self.distance_mm)
+            max_range = self._MAX_RANGE_MM.get(self.distance_mode, 4000)
+            if distance_mm > max_range:
+                self._result_mm, self._result_status = max_range, 4
+            else:
+                self._result_mm, self._result_status = max(0, round(distance_mm)), 0
+
+
+class SimTCT40(SimI2CDeviceModel):
+    '''
+    TCT40 ultrasonic range finder (STM8L051F3 front end).
+    Write 0x01 to trigger; the result register 0x01 holds the distance in mm.
+    '''
+    _CONVERSION_SECONDS = 0.065
+
+    def __init__(self, i2c_addr : int = 0x2F,
+                 distance_mm : float = 300.0,
+                 profile : SimDeviceProfile = None) -> None:
+        super().__init__(i2c_addr, profile)
+        self.distance_mm = distance_mm
+        self.measurement_count = 0
+        self._ready_at = None
+        self._result_mm = 0
+
+    def write(self, data : bytes) -> None:
+        if len(data) == 1 and data[0] == 0x01:
+            self._ready_at = time.monotonic() + self._CONVERSION_SECONDS
+
+    def read(self, length : int) -> bytes:
+        if self._ready_at is not None and time.monotonic() >= self._ready_at:
+            self._ready_at = None
+            self.measurement_count += 1
+            self._result_mm = max(0, min(0x7FFF, round(self._noisy(self.distance_mm))))
+        out = [self._result_mm >> 8, self._result_mm & 0xFF]
+        return bytes((out * length)[:length])
+
+    '''
+    Register read (repeated start): selects the result register without re-triggering
+    '''
+    def write_then_read(self, data : bytes, length : int) -> bytes:
+        return self.read(length)
+
+
+class SimHT16K33(SimI2CDeviceModel):
+    '''
+    Holtek HT16K33 LED driver: 16 bytes of display RAM plus single byte commands
+    for oscillator, display on / blink and dimming.
+    '''
+    def __init__(self, i2c_addr : int = 0x70, profile : SimDeviceProfile = None) -> None:
+        super().__init__(i2c_addr, profile)
+        self.display_ram = bytearray(16)
+        self.oscillator_on = False
+        self.display_on = False
+        self.blink_rate = 0
+        self.brightness = 15
+        self.ram_write_count = 0
+        self.ram_bytes_written = 0
+        self._pointer = 0
+
+    def write(self, data : bytes) -> None:
+        if len(data) < 1:
+            raise _nack(self.i2c_addr)
+        command = data[0]
+        if command & 0xF0 == 0x00:
+            # Display RAM write with auto-increment
+            self._pointer = command & 0x0F
+            for offset, value in enumerate(data[1:]):
+                self.display_ram[(self._pointer + offset) % 16] = value
+            if len(data) > 1:
+                self.ram_write_count += 1
+                self.ram_bytes_written += len(data) - 1
+        elif command & 0xF0 == 0x20:
+            self.oscillator_on = bool(command & 0x01)
+        elif command & 0xF0 == 0x80:
+            self.display_on = bool(command & 0x01)
+            self.blink_rate = (command >> 1) & 0x03
+        elif command & 0xF0 == 0xE0:
+            self.brightness = command & 0x0F
+
+    def read(self, length : int) -> bytes:
+        return bytes(self.display_ram[self._pointer:self._pointer + length])
+
+
+class SimSSD1305(SimI2CDeviceModel):
+    '''
+    Solomon SSD1305 OLED controller. Each transaction starts with a control
+    byte: 0x00 for a command stream, 0x40 for GDDRAM data. Supports page and
+    horizontal addressing over 8 pages x 132 columns.
+    '''
+    _COMMAND_ARG_COUNTS = {0x20: 1, 0x21: 2, 0x22: 2, 0x81: 1, 0x82: 1, 0x91: 4, 0xA8: 1,
+                           0xD3: 1, 0xD5: 1, 0xD8: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1}
+    COLUMNS = 132
+    PAGES = 8
+
+    def __init__(self, i2c_addr : int = 0x3C, profile : SimDeviceProfile = None) -> None:
+        super().__init__(i2c_addr, profile)
+        self.gddram = [bytearray(self.COLUMNS) for _ in range(self.PAGES)]
+        self.display_on = False
+        self.contrast = 0x80
+        self.data_bytes_written = 0
+        self.command_count = 0
+        self._addressing_mode = 2    # page addressing
+        self._page = 0
+        self._column = 0
+        self._column_range = (0, self.COLUMNS - 1)
+        self._page_range = (0, self.PAGES - 1)
+        self._pending_command = b""
+
+    def write(self, data : bytes) -> None:
+        if len(data) < 1:
+            raise _nack(self.i2c_addr)
+        control = data[0]
+        if control & 0x40:
+            self._write_data(data[1:])
+        else:
+            self._write_commands(data[1:])
+
+    def read(self, length : int) -> bytes:
+        return bytes([0x00 if self.display_on else 0x40] * length)
+
+    def _write_commands(self, commands : bytes) -> None:
+        # Like the controller, a command's arguments may arrive in later transactions
+        # (adafruit_ssd1305 sends one byte per write_cmd())
+        commands = self._pending_command + bytes(commands)
+        self._pending_command = b""
+        index = 0
+        while index < len(commands):
+            command = commands[index]
+            arg_count = self._COMMAND_ARG_COUNTS.get(command, 0)
+            if index + 1 + arg_count > len(commands):
+                self._pending_command = commands[index:]
+                break
+            args = commands[index + 1:index + 1 + arg_count]
+            index += 1 + arg_count
+            self.command_count += 1
+            if command in (0xAE, 0xAF):
+                self.display_on = command == 0xAF
+            elif command == 0x81 and len(args) == 1:
+                self.contrast = args[0]
+            elif command == 0x20 and len(args) == 1:
+                self._addressing_mode = args[0] & 0x03
+            elif command == 0x21 and len(args) == 2:
+                self._column_range = (args[0], args[1])
+                self._column = args[0]
+            elif command == 0x22 and len(args) == 2:
+                self._page_range = (args[0] & 0x07, args[1] & 0x07)
+                self._page = args[0] & 0x07
+            elif 0xB0 <= command <= 0xB7:
+                self._page = command & 0x07
+            elif command <= 0x0F:
+                self._column = (self._column & 0xF0) | command
+            elif command <= 0x1F:
+                self._column = (self._column & 0x0F) | ((command & 0x0F) << 4)
+
+    def _write_data(self, data : bytes) -> None:
+        for value in data:
+            if self._column < self.COLUMNS:
+                self.gddram[self._page][self._column] = value
+            self.data_bytes_written += 1
+            if self._addressing_mode == 2:
+                self._column = min(self._column + 1, self.COLUMNS - 1)
+            elif self._column >= self._column_range[1]:
+                self._column = self._column_range[0]
+                self._page = self._page + 1 if self._page < self._page_range[1] else self._page_range[0]
+            else:
+                self._column += 1
+
+
+''' ------ Host Side Adapters (library API over the simulated bus) ------'''
+
+class SimHTS221Driver:
+    '''
+    Minimal adafruit_hts221.HTS221 equivalent talking to a SimHTS221 over the bus.
+    '''
+    def __init__(self, i2c : SimI2CBus, i2c_addr : int = 0x5F) -> None:
+        self._device = SimI2CDevice(i2c, i2c_addr)
+        if self._read(SimHTS221.REG_WHO_AM_I, 1)[0] != SimHTS221.WHO_AM_I:
+            raise RuntimeError("Failed to find HTS221 - check your wiring!")
+        # Power on, block data update, 1 Hz output data rate
+        self._device.write(bytes([SimHTS221.REG_CTRL_REG1, 0x85]))
+        cal = self._read(0x30, 16)
+        self._h0_rh = cal[0] / 2.0
+        self._h1_rh = cal[1] / 2.0
+        self._t0_degc = (((cal[5] & 0x03) << 8) | cal[2]) / 8.0
+        self._t1_degc = (((cal[5] & 0x0C) << 6) | cal[3]) / 8.0
+        self._h0_t0_out = int.from_bytes(cal[6:8], "little", signed=True)
+        self._h1_t0_out = int.from_bytes(cal[10:12], "little", signed=True)
+        self._t0_out = int.from_bytes(cal[12:14], "little", signed=True)
+        self._t1_out = int.from_bytes(cal[14:16], "little", signed=True)
+
+    @property
+    def data_rate(self) -> int:
+        return self._read(SimHTS221.REG_CTRL_REG1, 1)[0] & 0x03
+
+    @property
+    def temperature(self) -> float:
+        raw = int.from_bytes(self._read(SimHTS221.REG_TEMP_OUT_L, 2), "little", signed=True)
+        return self._t0_degc + (raw - self._t0_out) * (self._t1_degc - self._t0_degc) / (self._t1_out - self._t0_out)
+
+    @property
+    def relative_humidity(self) -> float:
+        raw = int.from_bytes(self._read(SimHTS221.REG_HUMIDITY_OUT_L, 2), "little", signed=True)
+        humidity = self._h0_rh + (raw - self._h0_t0_out) * (self._h1_rh - self._h0_rh) / (self._h1_t0_out - self._h0_t0_out)
+        return min(100.0, max(0.0, humidity))
+
+    def _read(self, register : int, length : int) -> bytes:
+        buf = bytearray(length)
+        self._device.write_then_readinto(bytes([register | (0x80 if length > 1 else 0)]), buf)
+        return buf
+
+
+class SimVL53L1XDriver:
+    '''
+    Minimal qwiic_vl53l1x.QwiicVL53L1X equivalent talking to a SimVL53L1X.
+    '''
+    def __init__(self, i2c : SimI2CBus, i2c_addr : int = 0x29) -> None:
+        self._device = SimI2CDevice(i2c, i2c_addr)
+        self.address = i2c_addr
+
+    def init_sensor(self, address : int = None) -> bool:
+        if self._read(SimVL53L1X.REG_MODEL_ID, 2) != SimVL53L1X.MODEL_ID:
+            return False
+        return self._read(SimVL53L1X.REG_FIRMWARE_SYSTEM_STATUS, 1) == 0x01
+
+    def start_ranging(self) -> None:
+        self._write(SimVL53L1X.REG_SYSTEM_MODE_START, 0x40, 1)
+
+    def stop_ranging(self) -> None:
+        self._write(SimVL53L1X.REG_SYSTEM_MODE_START, 0x00, 1)
+
+    def check_for_data_ready(self) -> bool:
+        polarity = 0 if self._read(SimVL53L1X.REG_GPIO_HV_MUX_CTRL, 1) & 0x10 else 1
+        return (self._read(SimVL53L1X.REG_GPIO_TIO_HV_STATUS, 1) & 0x01) == polarity
+
+    def clear_interrupt(self) -> None:
+        self._write(SimVL53L1X.REG_SYSTEM_INTERRUPT_CLEAR, 0x01, 1)
+
+    def get_distance(self) -> int:
+        return self._read(SimVL53L1X.REG_RESULT_DISTANCE_MM, 2)
+
+    def get_range_status(self) -> int:
+        return self._read(SimVL53L1X.REG_RESULT_RANGE_STATUS, 1) & 0x1F
+
+    def set_timing_budget_in_ms(self, timing_budget_ms : int) -> None:
+        self._write(SimVL53L1X.REG_RANGE_CONFIG_TIMEOUT_A, timing_budget_ms, 2)
+
+    def get_timing_budget_in_ms(self) -> int:
+        return self._read(SimVL53L1X.REG_RANGE_CONFIG_TIMEOUT_A, 2)
+
+    def set_inter_measurement_in_ms(self, inter_measurement_ms : int) -> None:
+        self._write(SimVL53L1X.REG_INTERMEASUREMENT_MS, inter_measurement_ms, 4)
+
+    def get_inter_measurement_in_ms(self) -> int:
+        return self._read(SimVL53L1X.REG_INTERMEASUREMENT_MS, 4)
+
+    '''
+    1 = short, 2 = long (qwiic_vl53l1x convention)
+    '''
+    def set_distance_mode(self, distance_mode : int) -> None:
+        if distance_mode not in (1, 2):
+            raise ValueError(f"Invalid distance mode: {distance_mode}")
+        code = SimVL53L1X.DISTANCE_MODE_SHORT if distance_mode == 1 else SimVL53L1X.DISTANCE_MODE_LONG
+        self._write(SimVL53L1X.REG_PHASECAL_CONFIG_TIMEOUT, code, 1)
+
+    def get_distance_mode(self) -> int:
+        code = self._read(SimVL53L1X.REG_PHASECAL_CONFIG_TIMEOUT, 1)
+        return 1 if code == SimVL53L1X.DISTANCE_MODE_SHORT else 2
+
+    def _write(self, register : int, value : int, length : int) -> None:
+        self._device.write(register.to_bytes(2, "big") + value.to_bytes(length, "big"))
+
+    def _read(self, register : int, length : int) -> int:
+        buf = bytearray(length)
+        self._device.write_then_readinto(register.to_bytes(2, "big"), buf)
+        return int.from_bytes(buf, "big")
+
+
+class SimHT16K33Segment14:
+    '''
+    Minimal ht16k33.HT16K33Segment14 equivalent talking to a SimHT16K33.
+    Uses the Adafruit RAM layout: two bytes (little endian) per digit.
+    '''
+    _CHARSET = {
+        '0': 0x0C3F, '1': 0x0006, '2': 0x00DB, '3': 0x008F, '4': 0x00E6,
+        '5': 0x2069, '6': 0x00FD, '7': 0x0007, '8': 0x00FF, '9': 0x00EF,
+        'A': 0x00F7, 'B': 0x128F, 'C': 0x0039, 'D': 0x120F, 'E': 0x00F9,
+        'F': 0x0071, '-': 0x00C0, ' ': 0x0000,
+    }
+
+    def __init__(self, i2c : SimI2CBus, i2c_address : int = 0x70) -> None:
+        self._device = SimI2CDevice(i2c, i2c_address)
+        self.buffer = bytearray(16)
+        self._device.write(bytes([0x21]))
+        self._device.write(bytes([0x81]))
+
+    def set_brightness(self, brightness : int = 15) -> None:
+        self._device.write(bytes([0xE0 | (brightness & 0x0F)]))
+
+    def set_blink_rate(self, rate : int = 0) -> None:
+        self._device.write(bytes([0x81 | ((rate & 0x03) << 1)]))
+
+    def clear(self) -> "SimHT16K33Segment14":
+        for index in range(len(self.buffer)):
+            self.buffer[index] = 0
+        return self
+
+    def set_glyph(self, glyph : int, digit : int = 0) -> "SimHT16K33Segment14":
+        self.buffer[digit * 2] = glyph & 0xFF
+        self.buffer[digit * 2 + 1] = (glyph >> 8) & 0xFF
+        return self
+
+    def set_character(self, char : str, digit : int = 0, has_dot : bool = False) -> "SimHT16K33Segment14":
+        glyph = self._CHARSET.get(str(char).upper(), 0x0000)
+        if has_dot:
+            glyph |= 0x4000
+        return self.set_glyph(glyph, digit)
+
+    def draw(self) -> None:
+        self._device.write(bytes([0x00]) + bytes(self.buffer))
+
+    '''
+    Write bytes to display RAM at address (the buffer is the RAM image in this layout)
+    '''
+    def write_ram(self, address : int, data : bytes) -> None:
+        self._device.write(bytes([address & 0x0F]) + bytes(data))
+
+
+class SimSSD1305Driver:
+    '''
+    Minimal adafruit_ssd1305.SSD1305_I2C equivalent talking to a SimSSD1305.
+    The framebuffer is vertical LSB first (one byte = 8 rows of one column).
+    '''
+    _COLUMN_OFFSET = 4
+
+    def __init__(self, width : int, height : int, i2c : SimI2CBus, i2c_addr : int = 0x3C) -> None:
+        self._device = SimI2CDevice(i2c, i2c_addr)
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        self.buffer = bytearray(width * self.pages)
+        self._write_commands([0xAE, 0xD5, 0x80, 0xA8, height - 1, 0xD3, 0x00, 0x40,
+                              0xA1, 0xC8, 0xDA, 0x12, 0x81, 0x32, 0xD9, 0xF1, 0xDB, 0x40,
+                              0xA4, 0xA6, 0x20, 0x02, 0xAF])
+
+    def fill(self, color : int) -> None:
+        value = 0xFF if color else 0x00
+        for index in range(len(self.buffer)):
+            self.buffer[index] = value
+
+    def pixel(self, x : int, y : int, color : int = None) -> int:
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        index = (y // 8) * self.width + x
+        mask = 1 << (y & 0x07)
+        if color is None:
+            return 1 if self.buffer[index] & mask else 0
+        if color:
+            self.buffer[index] |= mask
+        else:
+            self.buffer[index] &= ~mask & 0xFF
+        return None
+
+    def image(self, img) -> None:
+        if img.mode != "1":
+            raise ValueError("Image must be in mode 1.")
+        if img.size != (self.width, self.height):
+            raise ValueError(f"Image must be same dimensions as display ({self.width}x{self.height}).")
+        pixels = img.load()
+        self.fill(0)
+        for page in range(self.pages):
+            for x in range(self.width):
+                bits = 0
+                for bit in range(8):
+                    if pixels[x, page * 8 + bit]:
+                        bits |= 1 << bit
+                self.buffer[page * self.width + x] = bits
+
+    def show(self) -> None:
+        for page in range(self.pages):
+            column = self._COLUMN_OFFSET
+            self._write_commands([0xB0 | page, column & 0x0F, 0x10 | (column >> 4)])
+            start = page * self.width
+            self._device.write(bytes([0x40]) + bytes(self.buffer[start:start + self.width]))
+
+    '''
+    Write bytes to one page of GDDRAM starting at column (buffer layout, no framebuffer update)
+    '''
+    def write_region(self, page : int, column : int, data : bytes) -> None:
+        column += self._COLUMN_OFFSET
+        self._write_commands([0xB0 | page, column & 0x0F, 0x10 | (column >> 4)])
+        self._device.write(bytes([0x40]) + bytes(data))
+
+    def poweroff(self) -> None:
+        self._write_commands([0xAE])
+
+    def poweron(self) -> None:
+        self._write_commands([0xAF])
+
+    def _write_commands(self, commands : list) -> None:
+        self._device.write(bytes([0x00] + list(commands)))
+
+
+''' ------ GPIO ------'''
+
+class SimFan:
+    '''
+    PWM controlled fan with an open-collector tach output.
+    The PWM input is driven through an inverting transistor, so a 0 % GPIO duty
+    cycle is full speed.
+    '''
+    def __init__(self, pwm_pin : int, tach_pin : int,
+                 max_rpm : float = 3000.0,
+                 pulses_per_rev : int = 1,
+                 inverted_drive : bool = True,
+                 profile : SimDeviceProfile = None) -> None:
+        self.pwm_pin = pwm_pin
+        self.tach_pin = tach_pin
+        self.max_rpm = max_rpm
+        self.pulses_per_rev = pulses_per_rev
+        self.inverted_drive = inverted_drive
+        self.profile = profile if profile is not None else SimDeviceProfile()
+        self.stalled = False
+        self.edge_count = 0
+        self._phase = 0.0
+
+    def rpm(self, gpio_duty_cycle : float) -> float:
+        if self.stalled or self.profile.disconnected:
+            return 0.0
+        duty = 100.0 - gpio_duty_cycle if self.inverted_drive else gpio_duty_cycle
+        rpm = self.max_rpm * max(0.0, min(100.0, duty)) / 100.0
+        if rpm > 0 and self.profile.noise_std > 0:
+            rpm = max(0.0, rpm + random.gauss(0, self.profile.noise_std))
+        return rpm
+
+
+class SimPWM:
+    '''
+    Stand-in for RPi.GPIO.PWM
+    '''
+    def __init__(self, gpio : "SimGPIO", pin : int, frequency : float) -> None:
+        self._gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0.0
+        self.running = False
+
+    def start(self, duty_cycle : float) -> None:
+        self.running = True
+        self.ChangeDutyCycle(duty_cycle)
+
+    def ChangeDutyCycle(self, duty_cycle : float) -> None:
+        if duty_cycle < 0 or duty_cycle > 100:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty_cycle = duty_cycle
+        self._gpio._pwm_duty[self.pin] = duty_cycle
+
+    def ChangeFrequency(self, frequency : float) -> None:
+        self.frequency = frequency
+
+    def stop(self) -> None:
+        self.running = False
+
+
+class SimHardwarePwm:
+    '''
+    Stand-in for pwm_output.SysfsPwm; drives the SimFan models on its pin and
+    records every duty cycle written
+    '''
+    def __init__(self, gpio : "SimGPIO", pin : int, frequency : float, duty_cycle : float = 0.0) -> None:
+        self._gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = None
+        self.write_count = 0
+        self.history = list()
+        self.enabled = True
+        self.set_duty_cycle(duty_cycle)
+
+    def set_duty_cycle(self, duty_cycle : float) -> None:
+        if duty_cycle < 0 or duty_cycle > 100:
+            raise ValueError(f"Duty cycle must be between 0 and 100: {duty_cycle}")
+        self.duty_cycle = duty_cycle
+        self.write_count += 1
+        self.history.append((time.monotonic(), duty_cycle))
+        self._gpio._pwm_duty[self.pin] = duty_cycle
+
+    def close(self) -> None:
+        self.enabled = False
+
+
+class SimEdgeEvents:
+    '''
+    Stand-in for gpio_edge_events.GpioChipEdgeEvents: timestamped tach edges
+    queued by SimGPIO and read in batches
+    '''
+    def __init__(self, gpio : "SimGPIO", pins : list) -> None:
+        self._gpio = gpio
+        self.pins = list(pins)
+        self._events = list()
+        self._condition = threading.Condition()
+
+    def read_events(self, timeout_seconds : float) -> list:
+        with self._condition:
+            if len(self._events) == 0:
+                self._condition.wait(timeout_seconds)
+            events = self._events
+            self._events = list()
+        return events
+
+    def close(self) -> None:
+        self._gpio._edge_sources.remove(self)
+
+    def _push(self, events : list) -> None:
+        with self._condition:
+            self._events.extend(events)
+            self._condition.notify()
+
+
+class SimGPIO:
+    '''
+    Stand-in for the RPi.GPIO module. Attached SimFan models generate falling
+    edges on their tach pins from a background thread and invoke the callbacks
+    registered with add_event_detect(), or queue timestamped edges for
+    open_edge_events() sources.
+    '''
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+
+    _TACH_STEP_SECONDS = 0.002
+
+    def __init__(self) -> None:
+        self.mode = None
+        self.fans = dict()
+        self._pin_levels = dict()
+        self._pin_directions = dict()
+        self._pwm_duty = dict()
+        self._callbacks = dict()
+        self._edge_sources = list()
+        self._tach_thread = None
+        self._running = False
+
+    def attach_fan(self, fan : SimFan) -> SimFan:
+        self.fans[fan.tach_pin] = fan
+        return fan
+
+    def setwarnings(self, flag : bool) -> None:
+        pass
+
+    def setmode(self, mode : int) -> None:
+        self.mode = mode
+
+    def setup(self, pin : int, direction : int, pull_up_down : int = None, initial : int = None) -> None:
+        self._pin_directions[pin] = direction
+        self._pin_levels[pin] = initial if initial is not None else self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+
+    def output(self, pin : int, value : int) -> None:
+        self._pin_levels[pin] = value
+
+    def input(self, pin : int) -> int:
+        return self._pin_levels.get(pin, self.LOW)
+
+    def add_event_detect(self, pin : int, edge : int, callback=None, bouncetime : int = None) -> None:
+        self._callbacks[pin] = callback
+        self._start_tach_thread()
+
+    def remove_event_detect(self, pin : int) -> None:
+        self._callbacks.pop(pin, None)
+
+    def open_edge_events(self, pins : list) -> SimEdgeEvents:
+        source = SimEdgeEvents(self, pins)
+        self._edge_sources.append(source)
+        self._start_tach_thread()
+        return source
+
+    def PWM(self, pin : int, frequency : float) -> SimPWM:
+        return SimPWM(self, pin, frequency)
+
+    def cleanup(self) -> None:
+        self._running = False
+        self._callbacks.clear()
+
+    def _start_tach_thread(self) -> None:
+        if not self._running:
+            self._running = True
+            self._tach_thread = threading.Thread(target=self._tach_thread_main, daemon=True)
+            self._tach_thread.start()
+
+    def _tach_thread_main(self) -> None:
+        last_ns = time.monotonic_ns()
+        while self._running:
+            time.sleep(self._TACH_STEP_SECONDS)
+            now_ns = time.monotonic_ns()
+            elapsed_ns = now_ns - last_ns
+            for pin, fan in list(self.fans.items()):
+                callback = self._callbacks.get(pin)
+                rpm = fan.rpm(self._pwm_duty.get(fan.pwm_pin, 0.0))
+                edges_per_ns = rpm / 60.0 * fan.pulses_per_rev / 1e9
+                start_phase = fan._phase
+                fan._phase += edges_per_ns * elapsed_ns
+                edges = int(fan._phase)
+                fan._phase -= edges
+                fan.edge_count += edges
+                if callback is not None:
+                    for _ in range(edges):
+                        callback(pin)
+                if edges > 0:
+                    # Each edge at the time its phase crossed a whole number
+                    timestamps = [last_ns + int((edge - start_phase) / edges_per_ns) for edge in range(1, edges + 1)]
+                    for source in list(self._edge_sources):
+                        if pin in source.pins:
+                            source._push([(pin, timestamp_ns) for timestamp_ns in timestamps])
+            last_ns = now_ns
+
+
+class SimButton:
+    '''
+    Stand-in for gpiozero.Button; call press() / release() to simulate the user.
+    '''
+    def __init__(self, pin : int) -> None:
+        self.pin = pin
+        self.is_pressed = False
+        self.when_pressed = None
+        self.when_released = None
+
+    def press(self) -> None:
+        self.is_pressed = True
+        if self.when_pressed is not None:
+            self.when_pressed(self)
+
+    def release(self) -> None:
+        self.is_pressed = False
+        if self.when_released is not None:
+            self.when_released(self)
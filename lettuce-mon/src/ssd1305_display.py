@@ -1,14 +1,54 @@
-from board import SCL, SDA, D4
 from PIL import Image, ImageDraw, ImageFont
-import adafruit_ssd1305
-import digitalio
+import device_backend
+
+class AdafruitSsd1305Regions:
+    '''
+    Partial GDDRAM writes for an adafruit_ssd1305.SSD1305_I2C driver, which itself only
+    sends whole frames (show()). Uses the driver's horizontal addressing mode: set the
+    column and page address windows (write_cmd), then write the bytes through i2c_device.
+    '''
+    _SET_COL_ADDR = 0x21
+    _SET_PAGE_ADDR = 0x22
+    _DATA_CONTROL_BYTE = 0x40
+
+    def __init__(self, driver) -> None:
+        self._driver = driver
+        # Same panel offsets as the driver's show(): 128x32 panels start at column 4, 64 wide ones at 32
+        self._column_offset = getattr(driver, "_column_offset", 0) + (32 if driver.width == 64 else 0)
+
+    '''
+    Write bytes to one page of GDDRAM starting at column (buffer layout)
+    '''
+    def write_region(self, page : int, column : int, data : bytes) -> None:
+        first_column = column + self._column_offset
+        for command in (self._SET_COL_ADDR, first_column, first_column + len(data) - 1,
+                        self._SET_PAGE_ADDR, page, page):
+            self._driver.write_cmd(command)
+        with self._driver.i2c_device:
+            self._driver.i2c_device.write(bytes([self._DATA_CONTROL_BYTE]) + bytes(data))
 
 class Display:
-    
+    '''
+    SSD1305 128x32 OLED with frame composition.
+    Lines are staged into a 1-bit image (no I/O) and sent with commit(): the image is
+    diffed against the last frame sent, one 8-row page at a time, so only changed pages
+    are sent, each as its changed column range (drivers without write_region() are
+    wrapped in AdafruitSsd1305Regions when they expose write_cmd / i2c_device, else
+    get a full frame). Each line is rendered once per text into a cached bitmap (drawn
+    with ImageDraw.text, so the frame matches drawing the text directly); the frame is
+    the union of the staged lines, whose descenders may reach into the next line's band.
+    print_line() and clear_screen() stage and commit in one call.
+    '''
+    _LINE_PITCH = 11
+    # Rendered (line, text) bitmaps kept; values that keep changing evict the oldest
+    _LINE_CACHE_SIZE = 32
 
     def __init__(self, i2c, i2c_addr, reset_pin):
 
-        self._disp = adafruit_ssd1305.SSD1305_I2C(128, 32, i2c, reset=reset_pin)
+        self._disp = device_backend.get_backend().create_ssd1305(128, 32, i2c, i2c_addr, reset_pin)
+        self._write_region = getattr(self._disp, "write_region", None)
+        if self._write_region is None and hasattr(self._disp, "write_cmd") and hasattr(self._disp, "i2c_device"):
+            self._write_region = AdafruitSsd1305Regions(self._disp).write_region
 
         # Clear display.
         self._disp.fill(0)
@@ -18,35 +58,116 @@ class Display:
         # Make sure to create image with mode '1' for 1-bit color.
         self._width = self._disp.width
         self._height = self._disp.height
+        self._pages = self._height // 8
         self._image = Image.new("1", (self._width, self._height))
+        # Page bytes of the last frame sent (vertical LSB first, as in GDDRAM)
+        self._sent_pages = [bytes(self._width) for _ in range(self._pages)]
+        self.draw_count = 0
+        self.skipped_count = 0
 
         # Get drawing object to draw on image.
         self._draw = ImageDraw.Draw(self._image)
 
-        # Draw a black filled box to clear the image.
-        self._draw.rectangle((0, 0, self._width, self._height), outline=0, fill=0)
-
-        # Draw some shapes.
-        # First define some constants to allow easy resizing of shapes.
+        # Lines start 2 pixels above the panel to use the font's empty top rows
         padding = -2
         self._top = padding
         self._bottom = self._height - padding
-        # Move left to right keeping track of the current x position for drawing shapes.
-        x = 0
 
-        # Load default font.
+        # Load default font; line bitmaps are rendered on first use
         self._font = ImageFont.load_default()
+        # (line index, text) -> (bitmap, ink box); line index -> the staged one
+        self._line_cache = dict()
+        self._staged_lines = dict()
 
-        self._draw.text((x, self._top + 0), "Display Init...", font=self._font, fill=255)
-        self._disp.image(self._image)
-        self._disp.show()
+        self.stage_line(0, "Display Init...")
+        self.commit()
 
-    def clear_screen(self):
+    '''
+    Stage text on a line, replacing what the line showed; sent by the next commit()
+    '''
+    def stage_line(self, line_index : int, text : str) -> None:
+        old_line = self._staged_lines.get(line_index)
+        new_line = self._line_bitmap(line_index, text)
+        self._staged_lines[line_index] = new_line
+        ink_boxes = [line[1] for line in (old_line, new_line) if line is not None and line[1] is not None]
+        if len(ink_boxes) == 0:
+            return
+        # Clear the rows either version of the line inked, then repaint every line over them
+        # so the neighbours' ink in those rows is kept
+        top = min(box[1] for box in ink_boxes)
+        bottom = max(box[3] for box in ink_boxes)
+        self._draw.rectangle((0, top, self._width - 1, bottom - 1), outline=0, fill=0)
+        for (bitmap, ink_box) in self._staged_lines.values():
+            if ink_box is not None and ink_box[1] < bottom and ink_box[3] > top:
+                self._image.paste(255, (0, 0), bitmap)
+
+    '''
+    Stage a blank screen; sent by the next commit()
+    '''
+    def stage_clear(self) -> None:
         self._draw.rectangle((0, 0, self._width, self._height), outline=0, fill=0)
-        self._disp.image(self._image)
-        self._disp.show()
+        self._staged_lines.clear()
+
+    '''
+    Send the staged frame: only changed pages (and column ranges when supported);
+    returns the number of pages written
+    '''
+    def commit(self) -> int:
+        changed = list()
+        for page in range(self._pages):
+            # An 8-row strip rotated so each column packs into one byte, top row in bit 0
+            strip = self._image.crop((0, page * 8, self._width, page * 8 + 8))
+            data = strip.transpose(Image.Transpose.ROTATE_270).tobytes()
+            if data != self._sent_pages[page]:
+                changed.append((page, data))
+        if len(changed) == 0:
+            self.skipped_count += 1
+            return 0
+        if self._write_region is None:
+            self._disp.image(self._image)
+            self._disp.show()
+        else:
+            for (page, data) in changed:
+                (start, end) = self._changed_columns(self._sent_pages[page], data)
+                self._write_region(page, start, data[start:end])
+        for (page, data) in changed:
+            self._sent_pages[page] = data
+        self.draw_count += 1
+        return len(changed)
+
+    def clear_screen(self):
+        self.stage_clear()
+        self.commit()
 
     def print_line(self, line_index : int, text : str):
-        self._draw.text((0, self._top + line_index*11), text, font=self._font, fill=255)
-        self._disp.image(self._image)
-        self._disp.show()
\ No newline at end of file
+        self.stage_line(line_index, text)
+        self.commit()
+
+    '''
+    Cached panel-sized bitmap of text drawn on a line, and its ink box (None if blank)
+    '''
+    def _line_bitmap(self, line_index : int, text : str) -> tuple:
+        key = (line_index, text)
+        line = self._line_cache.pop(key, None)
+        if line is None:
+            bitmap = Image.new("1", (self._width, self._height))
+            ImageDraw.Draw(bitmap).text((0, self._top + line_index * self._LINE_PITCH), text, font=self._font, fill=255)
+            line = (bitmap, bitmap.getbbox())
+            if len(self._line_cache) >= self._LINE_CACHE_SIZE:
+                del self._line_cache[next(iter(self._line_cache))]
+        # Re-inserted so the dict stays in least recently used order
+        self._line_cache[key] = line
+        return line
+
+    '''
+    Column range [start, end) that differs between two page images of equal length
+    '''
+    @staticmethod
+    def _changed_columns(old : bytes, new : bytes) -> tuple:
+        start = 0
+        while old[start] == new[start]:
+            start += 1
+        end = len(new)
+        while old[end - 1] == new[end - 1]:
+            end -= 1
+        return (start, end)
@@ -0,0 +1,132 @@
+'''
+Streaming statistics: O(1)-memory running min / max / mean / stddev / count
+per field (Welford's algorithm), so a report can summarize every sample taken
+since the previous report instead of only the latest one. Histogram adds
+fixed buckets for distributions such as scheduler lateness and jitter.
+'''
+import bisect
+import math
+
+
+class RunningStats:
+    '''
+    Welford running statistics of one value stream.
+    '''
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value : float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    '''
+    Sample variance (0 with fewer than two samples)
+    '''
+    def variance(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+    def stddev(self) -> float:
+        return math.sqrt(self.variance())
+
+    def to_dict(self) -> dict:
+        return {"min": self.min,
+                "max": self.max,
+                "mean": self.mean if self.count > 0 else None,
+                "stddev": self.stddev(),
+                "count": self.count}
+
+
+class WindowAggregator:
+    '''
+    RunningStats per field for the current report window.
+    Non-numeric, None and NaN values are skipped.
+    '''
+    def __init__(self) -> None:
+        self._fields = dict()
+
+    def add(self, field : str, value) -> None:
+        if value is None or isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+            return
+        stats = self._fields.get(field)
+        if stats is None:
+            stats = RunningStats()
+            self._fields[field] = stats
+        stats.add(value)
+
+    '''
+    Add every numeric field of a sample dict
+    '''
+    def add_sample(self, sample : dict) -> None:
+        for field, value in sample.items():
+            self.add(field, value)
+
+    '''
+    Returns {field: {"min", "max", "mean", "stddev", "count"}} for fields with samples
+    '''
+    def snapshot(self) -> dict:
+        return {field: stats.to_dict() for field, stats in self._fields.items() if stats.count > 0}
+
+    '''
+    Start a new window; field entries are kept and reused
+    '''
+    def reset(self) -> None:
+        for stats in self._fields.values():
+            stats.reset()
+
+
+class Histogram:
+    '''
+    Fixed-bucket histogram with RunningStats of the same stream. bucket_edges are
+    ascending inclusive upper bounds; larger values count in a final overflow bucket.
+    '''
+    def __init__(self, bucket_edges : tuple) -> None:
+        if len(bucket_edges) == 0 or list(bucket_edges) != sorted(bucket_edges):
+            raise ValueError(f"Histogram bucket edges must be ascending: {bucket_edges}")
+        self.bucket_edges = tuple(bucket_edges)
+        self.stats = RunningStats()
+        self.counts = [0] * (len(self.bucket_edges) + 1)
+
+    def reset(self) -> None:
+        self.stats.reset()
+        self.counts = [0] * (len(self.bucket_edges) + 1)
+
+    def add(self, value : float) -> None:
+        self.counts[bisect.bisect_left(self.bucket_edges, value)] += 1
+        self.stats.add(value)
+
+    '''
+    Upper bound of the bucket holding the given percentile, capped at the maximum seen
+    '''
+    def percentile(self, percent : float) -> float:
+        if self.stats.count == 0:
+            return None
+        rank = percent / 100.0 * self.stats.count
+        cumulative = 0
+        for (index, count) in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count > 0:
+                return min(self.bucket_edges[index], self.stats.max) if index < len(self.bucket_edges) else self.stats.max
+        return self.stats.max
+
+    def to_dict(self) -> dict:
+        summary = self.stats.to_dict()
+        summary["p50"] = self.percentile(50)
+        summary["p99"] = self.percentile(99)
+        summary["buckets"] = {f"<={edge:g}": count for (edge, count) in zip(self.bucket_edges, self.counts)}
+        summary["buckets"][f">{self.bucket_edges[-1]:g}"] = self.counts[-1]
+        return summary
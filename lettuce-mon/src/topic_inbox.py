@@ -0,0 +1,58 @@
+'''
+Bounded, topic-coalescing inbox for received MQTT messages.
+
+Only the latest payload of each topic is kept (latest value wins), so a burst
+of set points for one topic costs one slot, and at most max_topics topics are
+held. Consumers block in wait() and are woken as soon as a message arrives.
+'''
+import collections
+import threading
+
+
+class TopicInbox:
+    '''
+    Thread-safe: put() is called from the MQTT network thread, wait() / drain() from the consumer.
+    When max_topics distinct topics are pending, the topic waiting longest is dropped.
+    '''
+    def __init__(self, max_topics : int = 64) -> None:
+        if max_topics < 1:
+            raise ValueError(f"Inbox must hold at least one topic: {max_topics}")
+        self._max_topics = max_topics
+        self._pending = collections.OrderedDict()
+        self._condition = threading.Condition()
+        self.received_count = 0
+        self.coalesced_count = 0
+        self.dropped_count = 0
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def put(self, topic : str, message) -> None:
+        with self._condition:
+            self.received_count += 1
+            if topic in self._pending:
+                self.coalesced_count += 1
+                # Latest value wins and moves to the back of the queue
+                del self._pending[topic]
+            elif len(self._pending) >= self._max_topics:
+                self._pending.popitem(last=False)
+                self.dropped_count += 1
+            self._pending[topic] = message
+            self._condition.notify_all()
+
+    '''
+    Block until a message is pending or timeout expires; returns True if one is pending
+    '''
+    def wait(self, timeout : float = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self._pending) > 0, timeout)
+
+    '''
+    Take every pending message, oldest topic first, as [(topic, message), ...]
+    '''
+    def drain(self) -> list:
+        with self._condition:
+            messages = list(self._pending.items())
+            self._pending.clear()
+            return messages